@@ -1,8 +1,22 @@
+"""
+ASGI config for config project, served by gunicorn with uvicorn workers
+(see Procfile and render.yaml). The notification stream and long-poll
+only wait for changes under ASGI.
+"""
+
 import os
 
+# Setup DATABASE_URL first (before Django loads)
+from config.render_env import run_startup_tasks, setup_render_database
+
+setup_render_database()
+
 from django.core.asgi import get_asgi_application
 
 # Use minimal settings and let Django initialize lazily
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings_minimal")
 
 application = get_asgi_application()
+
+# Run migrations AFTER Django is fully initialized (only on Render)
+run_startup_tasks()
@@ -0,0 +1,58 @@
+"""
+Builds the CACHES setting from a backend name, so both settings modules
+select the cache the same way.
+
+- ``locmem``: per-process memory, the default whenever no cache is
+  configured. The ``core.W001`` deploy check warns about it in production.
+- ``file``: shared between the processes of one machine, for single
+  process deployments only. It has no atomic ``incr``: every increment is
+  a get and a set that resets the timeout and lists the cache directory.
+- ``redis``: Django's Redis backend (needs the ``redis`` package), chosen
+  when ``CACHE_LOCATION`` or ``REDIS_URL`` is set. Any server speaking the Redis protocol works, so a
+  local redis-server or valkey instance can stand in for the production
+  cache; ``REDIS_TEST_URL`` points the cache tests at one.
+
+Cache versions are what invalidates the quiz snapshots, unread counters,
+push versions, notification preferences and the home page, and the DRM
+rate limit counts with ``incr``. With several worker processes only
+``redis`` keeps those consistent.
+"""
+
+import os
+import tempfile
+
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+
+DEFAULT_LOCATIONS = {
+    "locmem": "savvyindians-lms",
+    "file": os.path.join(tempfile.gettempdir(), "savvyindians-lms-cache"),
+    "redis": "redis://127.0.0.1:6379/1",
+}
+
+
+def default_backend(location=""):
+    """Redis once a server location is configured, locmem otherwise"""
+    return "redis" if location else "locmem"
+
+
+def build_caches(backend="locmem", location="", timeout=300, key_prefix="lms"):
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(
+            f"Unknown CACHE_BACKEND '{backend}', expected one of: "
+            + ", ".join(CACHE_BACKENDS)
+        )
+
+    cache = {
+        "BACKEND": CACHE_BACKENDS[backend],
+        "LOCATION": location or DEFAULT_LOCATIONS[backend],
+        "TIMEOUT": timeout,
+        "KEY_PREFIX": key_prefix,
+    }
+    if backend in ("locmem", "file"):
+        # Both cull a third of the entries once full; per-user keys add up
+        cache["OPTIONS"] = {"MAX_ENTRIES": 10000}
+    return {"default": cache}
@@ -69,3 +69,27 @@ def run_migrations_once():
         except Exception as e:
             print(f"⚠ Warning: Could not run migrations: {e}", file=sys.stderr, flush=True)
             # Don't fail - let the app start anyway
+
+
+def run_startup_tasks():
+    """
+    Migrate, collect static files and ensure the superuser on Render.
+    Called by both config.wsgi and config.asgi once Django is initialized.
+    """
+    if not os.environ.get('RENDER'):
+        return
+    try:
+        from django.core.management import call_command
+        print("🔄 Running migrations on Render startup...", file=sys.stderr, flush=True)
+        call_command('migrate', '--noinput', verbosity=1)
+        print("✓ Migrations completed successfully!", file=sys.stderr, flush=True)
+
+        print("🔄 Collecting static files...", file=sys.stderr, flush=True)
+        call_command('collectstatic', '--noinput', '--clear', verbosity=1)
+        print("✓ Static files collected!", file=sys.stderr, flush=True)
+
+        print("🔐 Creating/ensuring superuser exists...", file=sys.stderr, flush=True)
+        call_command('ensure_superuser')
+        print("✓ Superuser check completed!", file=sys.stderr, flush=True)
+    except Exception as e:
+        print(f"⚠ Warning: Startup tasks error: {e}", file=sys.stderr, flush=True)
@@ -16,6 +16,8 @@ import sys
 from decouple import config
 from django.core.exceptions import ImproperlyConfigured
 
+from config.caches import build_caches, default_backend
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -423,6 +425,92 @@ if not DEBUG:
     CSRF_COOKIE_SECURE = True
     X_FRAME_OPTIONS = "DENY"
 
+# Video progress heartbeats are buffered in memory and written in batches
+VIDEO_PROGRESS_FLUSH_INTERVAL = config(
+    "VIDEO_PROGRESS_FLUSH_INTERVAL", default=30, cast=int
+)  # seconds
+VIDEO_PROGRESS_FLUSH_BATCH_SIZE = config(
+    "VIDEO_PROGRESS_FLUSH_BATCH_SIZE", default=500, cast=int
+)
+# A background thread also flushes every interval; tests flush explicitly
+VIDEO_PROGRESS_FLUSH_ASYNC = (
+    config("VIDEO_PROGRESS_FLUSH_ASYNC", default=True, cast=bool)
+    and sys.argv[1:2] != ["test"]
+)
+
+# ActivityLog entries are queued and written in batches by a background
+# thread; tests write them synchronously
+ACTIVITY_LOG_ASYNC = (
+    config("ACTIVITY_LOG_ASYNC", default=True, cast=bool) and sys.argv[1:2] != ["test"]
+)
+ACTIVITY_LOG_BATCH_SIZE = config("ACTIVITY_LOG_BATCH_SIZE", default=200, cast=int)
+ACTIVITY_LOG_QUEUE_SIZE = config("ACTIVITY_LOG_QUEUE_SIZE", default=10000, cast=int)
+ACTIVITY_LOG_FLUSH_INTERVAL = config(
+    "ACTIVITY_LOG_FLUSH_INTERVAL", default=1, cast=float
+)  # seconds
+
+# Activity log entries older than this many days, per category, are
+# archived and deleted by the prune_activity_log command
+ACTIVITY_LOG_RETENTION_DAYS = {
+    "general": config("ACTIVITY_LOG_RETENTION_GENERAL", default=365, cast=int),
+    "content": config("ACTIVITY_LOG_RETENTION_CONTENT", default=365, cast=int),
+    "progress": config("ACTIVITY_LOG_RETENTION_PROGRESS", default=30, cast=int),
+    "drm": config("ACTIVITY_LOG_RETENTION_DRM", default=180, cast=int),
+}
+ACTIVITY_LOG_ARCHIVE_DIR = config(
+    "ACTIVITY_LOG_ARCHIVE_DIR", default=os.path.join(BASE_DIR, "archive", "activity_log")
+)
+
+# DRM events reported by the video player, rate limited per session and minute
+DRM_EVENTS_PER_MINUTE = config("DRM_EVENTS_PER_MINUTE", default=60, cast=int)
+DRM_DEDUPE_WINDOW = config("DRM_DEDUPE_WINDOW", default=60, cast=int)  # seconds
+DRM_MAX_BATCH_EVENTS = config("DRM_MAX_BATCH_EVENTS", default=100, cast=int)
+
+# Cache
+# CACHE_BACKEND is one of "locmem", "file" or "redis", see config/caches.py.
+# Defaults to Redis when CACHE_LOCATION (or REDIS_URL) is set and to locmem
+# otherwise, which the core.W001 deploy check flags; "file" only suits a
+# single worker process.
+CACHE_LOCATION = config("CACHE_LOCATION", default=config("REDIS_URL", default=""))
+CACHES = build_caches(
+    backend=config("CACHE_BACKEND", default=default_backend(CACHE_LOCATION)),
+    location=CACHE_LOCATION,
+    timeout=config("CACHE_TIMEOUT", default=300, cast=int),
+)
+
+# Public homepage counters, lists and anonymous page are cached this long
+HOME_CACHE_TIMEOUT = config("HOME_CACHE_TIMEOUT", default=300, cast=int)  # seconds
+QUIZ_SNAPSHOT_TIMEOUT = config("QUIZ_SNAPSHOT_TIMEOUT", default=3600, cast=int)  # seconds
+# Cached unread notification counts are recounted at least this often
+NOTIFICATION_UNREAD_COUNT_TIMEOUT = config(
+    "NOTIFICATION_UNREAD_COUNT_TIMEOUT", default=300, cast=int
+)  # seconds
+# Resolved notification preferences are cached this long per user
+NOTIFICATION_PREFERENCE_TIMEOUT = config(
+    "NOTIFICATION_PREFERENCE_TIMEOUT", default=3600, cast=int
+)  # seconds
+# Push delivery (needs the ASGI server): seconds between change checks of a
+# waiting connection without the Redis cache, lifetime of an event stream and
+# of a long-poll request
+NOTIFICATION_PUSH_POLL_INTERVAL = config(
+    "NOTIFICATION_PUSH_POLL_INTERVAL", default=5, cast=float
+)
+NOTIFICATION_STREAM_TIMEOUT = config(
+    "NOTIFICATION_STREAM_TIMEOUT", default=300, cast=int
+)
+NOTIFICATION_LONG_POLL_TIMEOUT = config(
+    "NOTIFICATION_LONG_POLL_TIMEOUT", default=25, cast=int
+)
+# Announcement jobs queued before broadcasts are finished by the
+# send_announcements command, in chunks of recipients; running jobs without
+# a heartbeat for STALE_AFTER seconds are taken over
+NOTIFICATION_FANOUT_CHUNK_SIZE = config(
+    "NOTIFICATION_FANOUT_CHUNK_SIZE", default=1000, cast=int
+)
+NOTIFICATION_FANOUT_STALE_AFTER = config(
+    "NOTIFICATION_FANOUT_STALE_AFTER", default=300, cast=int
+)  # seconds
+
 STUDENT_ID_PREFIX = config("STUDENT_ID_PREFIX", "ugr")
 LECTURER_ID_PREFIX = config("LECTURER_ID_PREFIX", "lec")
 
@@ -444,3 +532,7 @@ if "vercel" in sys.modules or os.environ.get("VERCEL"):
     # Optimize for serverless
     CONN_MAX_AGE = 0  # Don't persist database connections
     DATABASES["default"]["CONN_MAX_AGE"] = 0
+    # Background threads do not outlive the request
+    ACTIVITY_LOG_ASYNC = False
+    # Instances are frozen or discarded without running atexit handlers
+    VIDEO_PROGRESS_FLUSH_INTERVAL = 0
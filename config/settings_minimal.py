@@ -8,6 +8,8 @@ import os
 import sys
 import dj_database_url
 
+from config.caches import build_caches, default_backend
+
 # CRITICAL: Setup Render environment variables FIRST (before anything else)
 # This must run before any database configuration
 try:
@@ -228,6 +230,85 @@ LOGOUT_REDIRECT_URL = "/"
 STUDENT_ID_PREFIX = os.environ.get("STUDENT_ID_PREFIX", "STD")
 LECTURER_ID_PREFIX = os.environ.get("LECTURER_ID_PREFIX", "LECT")
 
+# Video progress heartbeats are buffered in memory and written in batches
+VIDEO_PROGRESS_FLUSH_INTERVAL = int(os.environ.get("VIDEO_PROGRESS_FLUSH_INTERVAL", "30"))
+VIDEO_PROGRESS_FLUSH_BATCH_SIZE = int(os.environ.get("VIDEO_PROGRESS_FLUSH_BATCH_SIZE", "500"))
+# A background thread also flushes every interval; tests flush explicitly
+VIDEO_PROGRESS_FLUSH_ASYNC = (
+    os.environ.get("VIDEO_PROGRESS_FLUSH_ASYNC", "True").lower() in ("1", "true", "yes")
+    and sys.argv[1:2] != ["test"]
+)
+
+# ActivityLog entries are queued and written in batches by a background
+# thread; tests write them synchronously
+ACTIVITY_LOG_ASYNC = (
+    os.environ.get("ACTIVITY_LOG_ASYNC", "True").lower() in ("1", "true", "yes")
+    and sys.argv[1:2] != ["test"]
+)
+ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get("ACTIVITY_LOG_BATCH_SIZE", "200"))
+ACTIVITY_LOG_QUEUE_SIZE = int(os.environ.get("ACTIVITY_LOG_QUEUE_SIZE", "10000"))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.environ.get("ACTIVITY_LOG_FLUSH_INTERVAL", "1"))
+
+# Activity log entries older than this many days, per category, are
+# archived and deleted by the prune_activity_log command
+ACTIVITY_LOG_RETENTION_DAYS = {
+    "general": int(os.environ.get("ACTIVITY_LOG_RETENTION_GENERAL", "365")),
+    "content": int(os.environ.get("ACTIVITY_LOG_RETENTION_CONTENT", "365")),
+    "progress": int(os.environ.get("ACTIVITY_LOG_RETENTION_PROGRESS", "30")),
+    "drm": int(os.environ.get("ACTIVITY_LOG_RETENTION_DRM", "180")),
+}
+ACTIVITY_LOG_ARCHIVE_DIR = os.environ.get(
+    "ACTIVITY_LOG_ARCHIVE_DIR", os.path.join(BASE_DIR, "archive", "activity_log")
+)
+
+# DRM events reported by the video player, rate limited per session and minute
+DRM_EVENTS_PER_MINUTE = int(os.environ.get("DRM_EVENTS_PER_MINUTE", "60"))
+DRM_DEDUPE_WINDOW = int(os.environ.get("DRM_DEDUPE_WINDOW", "60"))  # seconds
+DRM_MAX_BATCH_EVENTS = int(os.environ.get("DRM_MAX_BATCH_EVENTS", "100"))
+
+# Cache
+# CACHE_BACKEND is one of "locmem", "file" or "redis", see config/caches.py.
+# Defaults to Redis when CACHE_LOCATION (or REDIS_URL) is set and to locmem
+# otherwise, which the core.W001 deploy check flags; "file" only suits a
+# single worker process.
+CACHE_LOCATION = os.environ.get("CACHE_LOCATION", os.environ.get("REDIS_URL", ""))
+CACHES = build_caches(
+    backend=os.environ.get("CACHE_BACKEND", default_backend(CACHE_LOCATION)),
+    location=CACHE_LOCATION,
+    timeout=int(os.environ.get("CACHE_TIMEOUT", "300")),
+)
+
+# Public homepage counters, lists and anonymous page are cached this long
+HOME_CACHE_TIMEOUT = int(os.environ.get("HOME_CACHE_TIMEOUT", "300"))
+QUIZ_SNAPSHOT_TIMEOUT = int(os.environ.get("QUIZ_SNAPSHOT_TIMEOUT", "3600"))
+# Cached unread notification counts are recounted at least this often
+NOTIFICATION_UNREAD_COUNT_TIMEOUT = int(
+    os.environ.get("NOTIFICATION_UNREAD_COUNT_TIMEOUT", "300")
+)
+# Resolved notification preferences are cached this long per user
+NOTIFICATION_PREFERENCE_TIMEOUT = int(
+    os.environ.get("NOTIFICATION_PREFERENCE_TIMEOUT", "3600")
+)  # seconds
+# Push delivery (needs the ASGI server): seconds between change checks of a
+# waiting connection without the Redis cache, lifetime of an event stream and
+# of a long-poll request
+NOTIFICATION_PUSH_POLL_INTERVAL = float(
+    os.environ.get("NOTIFICATION_PUSH_POLL_INTERVAL", "5")
+)
+NOTIFICATION_STREAM_TIMEOUT = int(os.environ.get("NOTIFICATION_STREAM_TIMEOUT", "300"))
+NOTIFICATION_LONG_POLL_TIMEOUT = int(
+    os.environ.get("NOTIFICATION_LONG_POLL_TIMEOUT", "25")
+)
+# Announcement jobs queued before broadcasts are finished by the
+# send_announcements command, in chunks of recipients; running jobs without
+# a heartbeat for STALE_AFTER seconds are taken over
+NOTIFICATION_FANOUT_CHUNK_SIZE = int(
+    os.environ.get("NOTIFICATION_FANOUT_CHUNK_SIZE", "1000")
+)
+NOTIFICATION_FANOUT_STALE_AFTER = int(
+    os.environ.get("NOTIFICATION_FANOUT_STALE_AFTER", "300")
+)  # seconds
+
 # Email configuration for production
 EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
 EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
@@ -0,0 +1,153 @@
+"""
+Asynchronous writer for ActivityLog entries.
+
+Model signals log an activity line for nearly every save, which used to
+cost an extra INSERT inside the request. Entries are now put on a
+bounded in-process queue once the surrounding transaction commits, and a
+daemon thread writes them in batches with bulk_create. When the queue is
+full the entry is written synchronously instead of being dropped, and
+whatever is still queued at interpreter exit is flushed.
+
+With ``ACTIVITY_LOG_ASYNC`` off (tests, serverless deployments) entries
+are written straight away, in the caller's transaction.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_queue = None
+_thread = None
+_pid = None
+
+
+def is_async():
+    return getattr(settings, "ACTIVITY_LOG_ASYNC", True)
+
+
+def get_batch_size():
+    return getattr(settings, "ACTIVITY_LOG_BATCH_SIZE", 200)
+
+
+def get_queue_size():
+    return getattr(settings, "ACTIVITY_LOG_QUEUE_SIZE", 10000)
+
+
+def get_flush_interval():
+    return getattr(settings, "ACTIVITY_LOG_FLUSH_INTERVAL", 1)
+
+
+def _get_queue():
+    """The queue of this process, starting its writer thread on first use"""
+    global _queue, _thread, _pid
+
+    with _lock:
+        # A forked worker inherits the queue but not the thread
+        if _pid != os.getpid() or _thread is None or not _thread.is_alive():
+            if _pid != os.getpid():
+                _queue = queue.Queue(maxsize=get_queue_size())
+                _pid = os.getpid()
+            _thread = threading.Thread(
+                target=_run, name="activity-log-writer", daemon=True
+            )
+            _thread.start()
+        return _queue
+
+
+def log_activity(message, category="general"):
+    """Record an activity log line"""
+    log_activities([message], category)
+
+
+def log_activities(messages, category="general"):
+    """Record several activity log lines of one category at once"""
+    from .models import ActivityLog
+
+    entries = [
+        ActivityLog(message=str(message), category=category) for message in messages
+    ]
+    if not entries:
+        return
+
+    if not is_async():
+        _write(entries)
+        return
+
+    transaction.on_commit(lambda: _enqueue(entries))
+
+
+def _enqueue(entries):
+    log_queue = _get_queue()
+    overflow = []
+    for entry in entries:
+        try:
+            log_queue.put_nowait(entry)
+        except queue.Full:
+            overflow.append(entry)
+    if overflow:
+        # Keep memory bounded without losing entries
+        _write(overflow)
+
+
+def _write(entries):
+    from .models import ActivityLog
+
+    ActivityLog.objects.bulk_create(entries, batch_size=get_batch_size())
+
+
+def _drain(log_queue, first=None):
+    batch = [] if first is None else [first]
+    while len(batch) < get_batch_size():
+        try:
+            batch.append(log_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run():
+    log_queue = _queue
+    while True:
+        try:
+            first = log_queue.get(timeout=get_flush_interval())
+        except queue.Empty:
+            continue
+        batch = _drain(log_queue, first)
+        try:
+            _write(batch)
+        except Exception:
+            logger.exception("Could not write %d activity log entries", len(batch))
+        finally:
+            close_old_connections()
+
+
+def flush():
+    """Write every queued entry from the calling thread"""
+    if _queue is None or _pid != os.getpid():
+        return 0
+
+    written = 0
+    while True:
+        batch = _drain(_queue)
+        if not batch:
+            return written
+        _write(batch)
+        written += len(batch)
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not flush activity log entries on shutdown")
+
+
+atexit.register(_flush_at_exit)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self):
+        # Import signal handlers - they are connected via @receiver decorator
+        from . import checks, signals  # noqa: F401
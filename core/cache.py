@@ -0,0 +1,182 @@
+"""
+Namespaced access to the default cache with per-namespace statistics.
+
+Every app keeps its entries under its own prefix (``course:...``,
+``quiz:...``) and can drop all of them at once by bumping a version
+number. Hits, misses and the time spent talking to the cache are
+counted per namespace and shown on the admin cache stats page. The
+counters live in the memory of each process.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+NAMESPACES = ("core", "course", "quiz", "notifications")
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(namespace, hits=0, misses=0, writes=0, elapsed=0.0):
+    with _stats_lock:
+        stats = _stats.setdefault(
+            namespace,
+            {"hits": 0, "misses": 0, "writes": 0, "calls": 0, "time": 0.0},
+        )
+        stats["hits"] += hits
+        stats["misses"] += misses
+        stats["writes"] += writes
+        stats["calls"] += 1
+        stats["time"] += elapsed
+
+
+def get_stats():
+    """Counters of every namespace with hit ratio and average latency"""
+    with _stats_lock:
+        snapshot = {namespace: dict(stats) for namespace, stats in _stats.items()}
+
+    rows = []
+    for namespace in sorted(set(NAMESPACES) | set(snapshot)):
+        stats = snapshot.get(
+            namespace, {"hits": 0, "misses": 0, "writes": 0, "calls": 0, "time": 0.0}
+        )
+        lookups = stats["hits"] + stats["misses"]
+        rows.append(
+            {
+                "namespace": namespace,
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+                "writes": stats["writes"],
+                "calls": stats["calls"],
+                "hit_ratio": stats["hits"] / lookups * 100 if lookups else 0,
+                "avg_latency_ms": (
+                    stats["time"] / stats["calls"] * 1000 if stats["calls"] else 0
+                ),
+            }
+        )
+    return rows
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def is_shared():
+    """Whether every worker process sees the same default cache"""
+    return not settings.CACHES["default"]["BACKEND"].endswith(".LocMemCache")
+
+
+class NamespacedCache:
+    """Cache operations scoped to one namespace"""
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+
+    def make_key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key, default=None):
+        start = time.perf_counter()
+        value = cache.get(self.make_key(key), _MISSING)
+        hit = value is not _MISSING
+        _record(
+            self.namespace,
+            hits=int(hit),
+            misses=int(not hit),
+            elapsed=time.perf_counter() - start,
+        )
+        return value if hit else default
+
+    def get_many(self, keys):
+        start = time.perf_counter()
+        found = cache.get_many([self.make_key(key) for key in keys])
+        values = {
+            key: found[self.make_key(key)] for key in keys if self.make_key(key) in found
+        }
+        _record(
+            self.namespace,
+            hits=len(values),
+            misses=len(keys) - len(values),
+            elapsed=time.perf_counter() - start,
+        )
+        return values
+
+    def set(self, key, value, timeout=None):
+        start = time.perf_counter()
+        if timeout is None:
+            cache.set(self.make_key(key), value)
+        else:
+            cache.set(self.make_key(key), value, timeout)
+        _record(self.namespace, writes=1, elapsed=time.perf_counter() - start)
+
+    def set_many(self, data, timeout=None):
+        start = time.perf_counter()
+        data = {self.make_key(key): value for key, value in data.items()}
+        if timeout is None:
+            cache.set_many(data)
+        else:
+            cache.set_many(data, timeout)
+        _record(self.namespace, writes=len(data), elapsed=time.perf_counter() - start)
+
+    def add(self, key, value, timeout=None):
+        """Store the value only if the key is not cached yet"""
+        start = time.perf_counter()
+        if timeout is None:
+            added = cache.add(self.make_key(key), value)
+        else:
+            added = cache.add(self.make_key(key), value, timeout)
+        _record(self.namespace, writes=1, elapsed=time.perf_counter() - start)
+        return added
+
+    def get_or_set(self, key, default, timeout=None):
+        """Return the cached value, computing and storing it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout)
+        return value
+
+    def delete(self, key):
+        start = time.perf_counter()
+        cache.delete(self.make_key(key))
+        _record(self.namespace, writes=1, elapsed=time.perf_counter() - start)
+
+    def incr(self, key, delta=1):
+        """Increment a counter, raising ValueError when it is not cached"""
+        start = time.perf_counter()
+        try:
+            return cache.incr(self.make_key(key), delta)
+        finally:
+            _record(self.namespace, writes=1, elapsed=time.perf_counter() - start)
+
+    def get_version(self, group):
+        """Current version of a group of entries"""
+        version = self.get(f"version:{group}")
+        if version is None:
+            # Start from a fresh number so entries of an evicted version
+            # can never be served again
+            cache.add(self.make_key(f"version:{group}"), time.time_ns(), None)
+            version = cache.get(self.make_key(f"version:{group}"))
+        return version
+
+    def bump_version(self, group):
+        """Invalidate every key built with versioned_key() for the group"""
+        try:
+            self.incr(f"version:{group}")
+        except ValueError:
+            cache.set(self.make_key(f"version:{group}"), time.time_ns(), None)
+
+    def versioned_key(self, group, key):
+        return f"{group}:{self.get_version(group)}:{key}"
+
+
+_MISSING = object()
+
+core_cache = NamespacedCache("core")
+course_cache = NamespacedCache("course")
+quiz_cache = NamespacedCache("quiz")
+notifications_cache = NamespacedCache("notifications")
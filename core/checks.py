@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Cache versions and counters only hold across workers in Redis"""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG:
+        return []
+    if backend.endswith(".LocMemCache"):
+        return [
+            Warning(
+                "The default cache is local to each process, so cache "
+                "invalidations do not reach the other workers.",
+                hint="Set CACHE_BACKEND to 'redis', see config/caches.py.",
+                id="core.W001",
+            )
+        ]
+    if backend.endswith(".FileBasedCache"):
+        return [
+            Warning(
+                "The file cache has no atomic incr, so concurrent workers "
+                "lose counter updates and every write scans the directory.",
+                hint="Use it for a single process only; set CACHE_BACKEND to "
+                "'redis' for several workers, see config/caches.py.",
+                id="core.W002",
+            )
+        ]
+    return []
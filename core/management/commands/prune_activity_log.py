@@ -0,0 +1,122 @@
+"""
+Django management command to archive and delete activity log entries
+that are older than their category's retention window.
+"""
+
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from core.models import ActivityLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Archives activity log entries past their retention window to gzipped "
+        "JSON Lines files and deletes them in chunks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--category",
+            action="append",
+            choices=[category for category, _ in ActivityLog.CATEGORIES],
+            help="Only prune this category (can be repeated)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Rows archived and deleted per statement (default: 1000)",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=None,
+            help="Directory of the archive files (default: ACTIVITY_LOG_ARCHIVE_DIR)",
+        )
+        parser.add_argument(
+            "--no-archive",
+            action="store_true",
+            help="Delete expired entries without archiving them",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many entries would be pruned",
+        )
+
+    def handle(self, *args, **options):
+        retention = getattr(settings, "ACTIVITY_LOG_RETENTION_DAYS", {})
+        archive_dir = options["archive_dir"] or getattr(
+            settings, "ACTIVITY_LOG_ARCHIVE_DIR", None
+        )
+        if not options["no_archive"] and not options["dry_run"]:
+            if not archive_dir:
+                raise CommandError("Set ACTIVITY_LOG_ARCHIVE_DIR or pass --archive-dir")
+            os.makedirs(archive_dir, exist_ok=True)
+
+        now = timezone.now()
+        total = 0
+        for category in options["category"] or [c for c, _ in ActivityLog.CATEGORIES]:
+            days = retention.get(category)
+            if days is None:
+                self.stdout.write(f"{category}: no retention window, kept")
+                continue
+
+            expired = ActivityLog.objects.filter(
+                category=category, created_at__lt=now - timedelta(days=days)
+            )
+            if options["dry_run"]:
+                count = expired.count()
+            else:
+                path = None
+                if not options["no_archive"]:
+                    path = os.path.join(
+                        archive_dir,
+                        f"activity_log-{category}-{now:%Y%m%dT%H%M%S}.jsonl.gz",
+                    )
+                count = self.prune(expired, path, options["chunk_size"])
+            total += count
+            self.stdout.write(f"{category}: {count} entries older than {days} days")
+
+        verb = "Would prune" if options["dry_run"] else "Pruned"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} activity log entries."))
+
+    def prune(self, queryset, path, chunk_size):
+        """Archive and delete the rows of ``queryset`` in primary key order"""
+        archive = gzip.open(path, "at", encoding="utf-8") if path else None
+        count = 0
+        last_id = 0
+        try:
+            while True:
+                rows = list(
+                    queryset.filter(id__gt=last_id)
+                    .order_by("id")
+                    .values("id", "category", "created_at", "message")[:chunk_size]
+                )
+                if not rows:
+                    break
+                if archive is not None:
+                    archive.writelines(
+                        json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in rows
+                    )
+                    # The rows must be on disk before they leave the database
+                    archive.flush()
+                    os.fsync(archive.fileno())
+                last_id = rows[-1]["id"]
+                ActivityLog.objects.filter(
+                    id__in=[row["id"] for row in rows]
+                ).delete()
+                count += len(rows)
+        finally:
+            if archive is not None:
+                archive.close()
+                if count == 0:
+                    os.remove(path)
+        return count
@@ -0,0 +1,182 @@
+"""
+Keyset pagination over several querysets merged into one ordered stream.
+
+Each source is read in the shared order and only ``page_size + 1`` rows
+are fetched from it per page, then the sources are merged lazily with
+heapq. Pages are addressed by an opaque cursor holding the sort key of
+the last row shown, so deep pages cost the same as the first one. The
+page before a cursor is read the same way, in reverse.
+"""
+
+import base64
+import datetime
+import heapq
+import json
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class MergedPage:
+    def __init__(self, items, next_cursor=None, count=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _field_names(order_by):
+    return [field.lstrip("-") for field in order_by]
+
+
+def _key_fields(queryset, names):
+    opts = queryset.model._meta
+    fields = []
+    for name in names:
+        try:
+            fields.append(opts.pk if name == "pk" else opts.get_field(name))
+        except FieldDoesNotExist:
+            # An annotation, compared with the value as stored in the cursor
+            fields.append(None)
+    return fields
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder cuts times to milliseconds, keys need them exact
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, source):
+    data = json.dumps(list(values) + [source], cls=_CursorEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor, size=None):
+    """
+    (key values, source index) of a cursor, or None if it is invalid or
+    does not hold ``size`` key values.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values, source = data[:-1], int(data[-1])
+    except (ValueError, TypeError, IndexError, AttributeError, KeyError):
+        return None
+    if size is not None and len(values) != size:
+        return None
+    return values, source
+
+
+def _cursor_values(queryset, names, values):
+    """Key values of a cursor as python values, ValueError if they do not fit"""
+    converted = []
+    for field, value in zip(_key_fields(queryset, names), values):
+        if isinstance(value, (list, dict)):
+            raise ValueError("Cursor values must be scalars")
+        try:
+            converted.append(value if field is None else field.to_python(value))
+        except (ValidationError, TypeError) as e:
+            raise ValueError(str(e))
+    return converted
+
+
+def _after(queryset, names, values, source, cursor_source, descending):
+    """Rows of ``queryset`` that sort after the cursor"""
+    lookup = "lt" if descending else "gt"
+
+    condition = Q()
+    for i, name in enumerate(names):
+        prefix = dict(zip(names[:i], values[:i]))
+        condition |= Q(**prefix, **{f"{name}__{lookup}": values[i]})
+    # Equal keys are ordered by source index in the same direction
+    if (source < cursor_source) if descending else (source > cursor_source):
+        condition |= Q(**dict(zip(names, values)))
+    return queryset.filter(condition)
+
+
+def _keyed(rows, names, source):
+    for obj in rows:
+        yield tuple(getattr(obj, name) for name in names) + (source,), obj
+
+
+def _reversed(order_by):
+    return [field[1:] if field.startswith("-") else f"-{field}" for field in order_by]
+
+
+def merge_querysets(
+    sources, order_by, page_size, cursor=None, with_count=True, before=None
+):
+    """
+    One page of the rows of several querysets (usually of different
+    models) in a shared order.
+
+    ``order_by`` lists non-null fields or annotations present on every
+    source, all in the same direction, e.g. ``["-pk"]`` or ``["-created_at", "-pk"]``.
+    ``cursor`` is the ``next_cursor`` of the previous page, ``before`` the
+    ``previous_cursor`` of the next one; an invalid cursor gives the first
+    page. The total is computed with one COUNT query per source when
+    ``with_count`` is set.
+    """
+    names = _field_names(order_by)
+    position = before or cursor
+    decoded = decode_cursor(position, len(names)) if position else None
+    keys = {}
+    if decoded is not None:
+        try:
+            for source, queryset in enumerate(sources):
+                keys[source] = _cursor_values(queryset, names, decoded[0])
+        except ValueError:
+            decoded = None
+
+    # The rows before a cursor are read in reverse order, then flipped
+    backwards = decoded is not None and bool(before)
+    if backwards:
+        order_by = _reversed(order_by)
+    descending = order_by[0].startswith("-")
+
+    streams = []
+    for source, queryset in enumerate(sources):
+        rows = queryset.order_by(*order_by)
+        if decoded is not None:
+            rows = _after(rows, names, keys[source], source, decoded[1], descending)
+        streams.append(_keyed(rows[: page_size + 1], names, source))
+
+    merged = list(
+        islice(
+            heapq.merge(*streams, key=lambda entry: entry[0], reverse=descending),
+            page_size + 1,
+        )
+    )
+    more = len(merged) > page_size
+    merged = merged[:page_size]
+    if backwards:
+        merged.reverse()
+
+    next_cursor = previous_cursor = None
+    if merged:
+        first, last = merged[0][0], merged[-1][0]
+        if more or backwards:
+            next_cursor = encode_cursor(last[:-1], last[-1])
+        if (more and backwards) or (decoded is not None and not backwards):
+            previous_cursor = encode_cursor(first[:-1], first[-1])
+
+    count = sum(queryset.count() for queryset in sources) if with_count else None
+    return MergedPage([obj for _, obj in merged], next_cursor, count, previous_cursor)
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# Existing entries are categorised by the wording the signals used
+CATEGORY_PATTERNS = [
+    ("progress", ["started watching", "completed watching"]),
+    ("drm", ["DRM Violation"]),
+    ("content", ["The program '", "The course '", "The file '", "The video '"]),
+]
+
+
+def categorise_entries(apps, schema_editor):
+    ActivityLog = apps.get_model("core", "ActivityLog")
+    for category, patterns in CATEGORY_PATTERNS:
+        condition = models.Q()
+        for pattern in patterns:
+            condition |= models.Q(message__contains=pattern)
+        ActivityLog.objects.filter(condition, category="general").update(
+            category=category
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_remove_newsandevents_summary_en_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='category',
+            field=models.CharField(choices=[('general', 'General'), ('content', 'Content changes'), ('progress', 'Video progress'), ('drm', 'DRM violations')], default='general', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='activitylog',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(categorise_entries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['category', 'created_at'], name='core_activitylog_cat_created'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 NEWS = _("News")
@@ -85,8 +86,29 @@ class Semester(models.Model):
 
 
 class ActivityLog(models.Model):
+    GENERAL = "general"
+    CONTENT = "content"
+    PROGRESS = "progress"
+    DRM = "drm"
+    CATEGORIES = (
+        (GENERAL, _("General")),
+        (CONTENT, _("Content changes")),
+        (PROGRESS, _("Video progress")),
+        (DRM, _("DRM violations")),
+    )
+
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now=True)
+    category = models.CharField(max_length=20, choices=CATEGORIES, default=GENERAL)
+    # Set when the entry is logged, not when the background writer saves it
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["category", "created_at"],
+                name="core_activitylog_cat_created",
+            )
+        ]
 
     def __str__(self):
         return f"[{self.created_at}]{self.message}"
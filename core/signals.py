@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import User
+from course.models import Course, Program, UploadVideo
+
+from .cache import core_cache
+
+
+@receiver(post_save, sender=Program)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=UploadVideo)
+@receiver(post_delete, sender=Program)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=UploadVideo)
+@receiver(post_delete, sender=User)
+def invalidate_home_on_change(sender, **kwargs):
+    core_cache.bump_version("home")
+
+
+@receiver(post_save, sender=User)
+def invalidate_home_on_user_save(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login and do not change the homepage
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    core_cache.bump_version("home")
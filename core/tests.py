@@ -1,2 +1,436 @@
+import gzip
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from config.caches import build_caches, default_backend
+from course.models import Course, Program
+
+from . import activity
+from .cache import NamespacedCache, get_stats, reset_stats
+from .checks import check_shared_cache
+from .merge import decode_cursor, encode_cursor, merge_querysets
+from .models import ActivityLog, NewsAndEvents
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+User = get_user_model()
+
+# A Redis-protocol server (redis-server, valkey) the cache tests may flush
+REDIS_TEST_URL = os.environ.get("REDIS_TEST_URL")
+
+
+class HomeViewCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.program = Program.objects.create(title="AI Bootcamp")
+        Course.objects.create(title="ML", code="ML101", program=self.program)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_anonymous_page_is_served_from_cache(self):
+        self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "ML")
+
+    def test_cached_page_keeps_the_response_headers(self):
+        first = self.client.get(reverse("home"))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("home"))
+
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+        for response in (first, second):
+            self.assertIn("Cookie", response["Vary"])
+            self.assertIn("Accept-Language", response["Vary"])
+
+    def test_page_with_a_csrf_token_is_not_cached(self):
+        with mock.patch("core.views.render") as render:
+            render.side_effect = lambda request, *args: (
+                get_token(request) and HttpResponse("form")
+            )
+            self.client.get(reverse("home"))
+            self.client.get(reverse("home"))
+
+        self.assertEqual(render.call_count, 2)
+
+    def test_saving_a_course_invalidates_the_page(self):
+        self.client.get(reverse("home"))
+        Course.objects.create(title="Deep Learning", code="DL101", program=self.program)
+
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "Deep Learning")
+
+    def test_logins_do_not_invalidate(self):
+        user = User.objects.create_user(
+            username="student", password="password", is_student=True
+        )
+        self.client.get(reverse("home"))
+        self.client.login(username=user.username, password="password")
+        self.client.logout()
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse("home"))
+
+    def test_authenticated_users_share_cached_counters(self):
+        user = User.objects.create_user(
+            username="student", password="password", is_student=True
+        )
+        self.client.force_login(user)
+        self.client.get(reverse("home"))
+        response = self.client.get(reverse("home"))
+
+        self.assertTrue(response.context["user_authenticated"])
+        self.assertEqual(response.context["total_courses"], 1)
+
+
+class NamespacedCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.course_cache = NamespacedCache("course")
+        self.quiz_cache = NamespacedCache("quiz")
+
+    def stats(self, namespace):
+        return next(row for row in get_stats() if row["namespace"] == namespace)
+
+    def test_namespaces_are_isolated_and_counted(self):
+        self.course_cache.set("item", "course value")
+        self.assertEqual(self.course_cache.get("item"), "course value")
+        self.assertIsNone(self.quiz_cache.get("item"))
+
+        self.assertEqual(self.stats("course")["hits"], 1)
+        self.assertEqual(self.stats("course")["writes"], 1)
+        self.assertEqual(self.stats("quiz")["misses"], 1)
+        self.assertEqual(self.stats("quiz")["hit_ratio"], 0)
+
+    def test_set_many_and_get_many_use_the_namespace(self):
+        self.course_cache.set_many({"a": 1, "b": 2})
+
+        self.assertEqual(self.course_cache.get_many(["a", "b", "c"]), {"a": 1, "b": 2})
+        self.assertEqual(self.quiz_cache.get_many(["a", "b"]), {})
+        self.assertEqual(self.stats("course")["writes"], 2)
+        self.assertEqual(self.stats("course")["hits"], 2)
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 42
+
+        self.assertEqual(self.course_cache.get_or_set("answer", compute), 42)
+        self.assertEqual(self.course_cache.get_or_set("answer", compute), 42)
+        self.assertEqual(len(calls), 1)
+
+    def test_bump_version_invalidates_group(self):
+        key = self.course_cache.versioned_key("catalog", "list")
+        self.course_cache.set(key, [1, 2])
+        self.course_cache.bump_version("catalog")
+
+        new_key = self.course_cache.versioned_key("catalog", "list")
+        self.assertNotEqual(key, new_key)
+        self.assertIsNone(self.course_cache.get(new_key))
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES=build_caches("file", location)):
+                self.course_cache.set("item", {"a": 1})
+                self.assertEqual(self.course_cache.get("item"), {"a": 1})
+
+    def test_redis_only_when_configured(self):
+        self.assertEqual(default_backend(""), "locmem")
+        self.assertEqual(default_backend("redis://cache:6379/1"), "redis")
+
+    @override_settings(DEBUG=False, CACHES=build_caches("locmem"))
+    def test_locmem_in_production_is_flagged(self):
+        self.assertEqual([w.id for w in check_shared_cache(None)], ["core.W001"])
+
+    def test_file_cache_in_production_is_flagged(self):
+        caches = build_caches("file", tempfile.gettempdir())
+        with override_settings(DEBUG=False, CACHES=caches):
+            self.assertEqual([w.id for w in check_shared_cache(None)], ["core.W002"])
+        with override_settings(DEBUG=False, CACHES=build_caches("redis")):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            build_caches("memcached")
+
+
+@unittest.skipUnless(
+    REDIS_TEST_URL and redis,
+    "needs the redis package and REDIS_TEST_URL pointing at a scratch database "
+    "of a Redis-protocol server, e.g. redis://127.0.0.1:6379/15",
+)
+class RedisCacheTests(TestCase):
+    """The counters and versions against a real server; the test flushes it"""
+
+    def setUp(self):
+        override = override_settings(
+            CACHES=build_caches("redis", REDIS_TEST_URL, key_prefix="lms-test")
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        reset_stats()
+        self.course_cache = NamespacedCache("course")
+
+    def run_threads(self, target, count=8):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_increments_are_not_lost(self):
+        self.course_cache.set("hits", 0)
+
+        def bump():
+            for _ in range(50):
+                self.course_cache.incr("hits")
+
+        self.run_threads(bump)
+        self.assertEqual(self.course_cache.get("hits"), 400)
+
+    def test_incr_keeps_the_timeout(self):
+        self.course_cache.set("hits", 0, 3600)
+        self.course_cache.incr("hits")
+
+        key = cache.make_key(self.course_cache.make_key("hits"))
+        self.assertGreater(cache._cache.get_client(key).ttl(key), 300)
+
+    def test_concurrent_bumps_are_all_counted(self):
+        start = self.course_cache.get_version("catalog")
+
+        self.run_threads(lambda: self.course_cache.bump_version("catalog"))
+        self.assertEqual(self.course_cache.get_version("catalog"), start + 8)
+
+    def test_drm_allowance_is_shared_exactly(self):
+        from course import drm_ingest
+
+        granted = []
+        # One rate limit window for every thread
+        with mock.patch.object(drm_ingest, "time") as clock:
+            clock.time.return_value = 600.0
+            with override_settings(DRM_EVENTS_PER_MINUTE=100):
+                self.run_threads(
+                    lambda: granted.append(drm_ingest.take_allowance("session:a", 20))
+                )
+        self.assertEqual(sum(granted), 100)
+
+
+class CacheStatsViewTests(TestCase):
+    def test_only_admins_can_view(self):
+        user = User.objects.create_user(username="lecturer", password="password")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse("cache_stats")).status_code, 302)
+
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        self.client.force_login(admin)
+        response = self.client.get(reverse("cache_stats"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["namespace"] for row in response.context["stats"]],
+            ["core", "course", "notifications", "quiz"],
+        )
+
+
+class MergeQuerysetsTests(TestCase):
+    def setUp(self):
+        self.program = Program.objects.create(title="Program 0")
+        for i in range(1, 6):
+            Program.objects.create(title=f"Program {i}")
+            NewsAndEvents.objects.create(title=f"News {i}", posted_as="News")
+
+    def sources(self):
+        return [NewsAndEvents.objects.all(), Program.objects.all()]
+
+    def test_pages_cover_every_row_once_in_order(self):
+        seen = []
+        cursor = None
+        while True:
+            page = merge_querysets(self.sources(), ["-pk"], 4, cursor=cursor)
+            seen.extend(page)
+            self.assertEqual(page.count, 11)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(len(seen), 11)
+        self.assertEqual(len({(type(obj), obj.pk) for obj in seen}), 11)
+        pks = [obj.pk for obj in seen]
+        self.assertEqual(pks, sorted(pks, reverse=True))
+
+    def test_queries_per_page_do_not_depend_on_depth(self):
+        page = merge_querysets(self.sources(), ["-pk"], 2)
+        with self.assertNumQueries(2):
+            page = merge_querysets(
+                self.sources(), ["-pk"], 2, cursor=page.next_cursor, with_count=False
+            )
+        self.assertEqual(len(page), 2)
+
+    def test_invalid_cursor_starts_over(self):
+        first = merge_querysets(self.sources(), ["-pk"], 3)
+        first = [(type(obj), obj.pk) for obj in first]
+        for cursor in [
+            "not-a-cursor",
+            encode_cursor([], 0),
+            encode_cursor([1, 2], 0),
+            encode_cursor(["x"], 0),
+            encode_cursor([[1]], 0),
+        ]:
+            page = merge_querysets(self.sources(), ["-pk"], 3, cursor=cursor)
+            self.assertEqual([(type(obj), obj.pk) for obj in page], first)
+            self.assertFalse(page.has_previous)
+
+    def test_previous_cursor_walks_back(self):
+        pages = [merge_querysets(self.sources(), ["-pk"], 4)]
+        while pages[-1].has_next:
+            cursor = pages[-1].next_cursor
+            pages.append(merge_querysets(self.sources(), ["-pk"], 4, cursor=cursor))
+        self.assertFalse(pages[0].has_previous)
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = merge_querysets(
+                self.sources(), ["-pk"], 4, before=page.previous_cursor
+            )
+            self.assertEqual(
+                [(type(obj), obj.pk) for obj in page],
+                [(type(obj), obj.pk) for obj in expected],
+            )
+            self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+
+    def test_cursor_keeps_microseconds(self):
+        key = timezone.now().replace(microsecond=123456)
+        values, _source = decode_cursor(encode_cursor([key], 0))
+        self.assertEqual(values, [key.isoformat()])
+
+
+class ActivityLogWriterTests(TestCase):
+    def setUp(self):
+        self.queue = queue.Queue(maxsize=2)
+        patcher = mock.patch.multiple(
+            activity,
+            _get_queue=mock.Mock(return_value=self.queue),
+            _queue=self.queue,
+            _pid=os.getpid(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def messages(self):
+        return list(ActivityLog.objects.order_by("id").values_list("message", flat=True))
+
+    def test_synchronous_without_async(self):
+        with self.settings(ACTIVITY_LOG_ASYNC=False):
+            activity.log_activity("written now")
+        self.assertEqual(self.messages(), ["written now"])
+        self.assertTrue(self.queue.empty())
+
+    @override_settings(ACTIVITY_LOG_ASYNC=True)
+    def test_entries_are_queued_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            activity.log_activity("queued")
+        self.assertEqual(self.queue.qsize(), 0)
+
+        callbacks[0]()
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertEqual(self.messages(), [])
+
+        self.assertEqual(activity.flush(), 1)
+        self.assertEqual(self.messages(), ["queued"])
+
+    @override_settings(ACTIVITY_LOG_ASYNC=True)
+    def test_full_queue_writes_synchronously(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            activity.log_activities(["a", "b", "c"])
+
+        self.assertEqual(self.messages(), ["c"])
+        activity.flush()
+        self.assertEqual(sorted(self.messages()), ["a", "b", "c"])
+
+
+@override_settings(
+    ACTIVITY_LOG_RETENTION_DAYS={"general": 365, "progress": 30, "drm": 180}
+)
+class PruneActivityLogTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for category, age in [
+            ("progress", 40),
+            ("progress", 40),
+            ("progress", 5),
+            ("drm", 40),
+            ("general", 400),
+            ("content", 4000),
+        ]:
+            ActivityLog.objects.create(
+                message=f"{category} {age}",
+                category=category,
+                created_at=now - timedelta(days=age),
+            )
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+
+    def prune(self, *args):
+        call_command(
+            "prune_activity_log",
+            "--archive-dir",
+            self.archive_dir,
+            "--chunk-size",
+            "1",
+            *args,
+            stdout=io.StringIO(),
+        )
+
+    def test_expired_entries_are_archived_and_deleted(self):
+        self.prune()
+
+        self.assertEqual(
+            sorted(ActivityLog.objects.values_list("message", flat=True)),
+            ["content 4000", "drm 40", "progress 5"],
+        )
+        archived = {}
+        for name in os.listdir(self.archive_dir):
+            with gzip.open(os.path.join(self.archive_dir, name), "rt") as archive:
+                archived[name.split("-")[1]] = [json.loads(line) for line in archive]
+        self.assertEqual(sorted(archived), ["general", "progress"])
+        self.assertEqual(
+            [row["message"] for row in archived["progress"]],
+            ["progress 40", "progress 40"],
+        )
+
+    def test_dry_run_and_category_filter(self):
+        self.prune("--dry-run")
+        self.assertEqual(ActivityLog.objects.count(), 6)
+
+        self.prune("--category", "general", "--no-archive")
+        self.assertEqual(ActivityLog.objects.count(), 5)
+        self.assertEqual(os.listdir(self.archive_dir), [])
@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import (
     self_test_view,
+    cache_stats_view,
     dashboard_view,
     delete_post,
     edit_post,
@@ -22,6 +23,7 @@ urlpatterns = [
     path("", home_view, name="home"),
     path("health/self-test/", self_test_view, name="self_test"),
     path("dashboard/", dashboard_view, name="dashboard"),
+    path("dashboard/cache/", cache_stats_view, name="cache_stats"),
     # Session Management (for bootcamp batches)
     path("session/", session_list_view, name="session_list"),
     path("session/add/", session_add_view, name="add_session"),
@@ -5,11 +5,15 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from django.conf import settings
 from django.core.mail import send_mail
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import get_language
 import os
 
 from accounts.decorators import admin_required, lecturer_required
 from accounts.models import Student, User
 
+from .cache import core_cache, get_stats, reset_stats
 from .forms import NewsAndEventsForm, SemesterForm, SessionForm
 from .models import ActivityLog, NewsAndEvents, Semester, Session
 from .utils import (
@@ -23,37 +27,65 @@ from .utils import (
 # ########################################################
 # SavvyIndians AI Bootcamp & Masterclass Homepage
 # ########################################################
-def home_view(request):
-    """Public homepage for SavvyIndians AI Bootcamp & Masterclass platform"""
+def get_home_context():
+    """Counters and course/video lists shown on the homepage, cached"""
+    from django.db.models import Count
+
     from accounts.models import User
     from course.models import Course, Program, UploadVideo
 
-    # Get featured courses and videos for public viewing
-    featured_courses = Course.objects.all()[:6]
-    featured_videos = UploadVideo.objects.all().order_by("-timestamp")[:8]
-    latest_courses = Course.objects.all().order_by("-pk")[:4]
+    key = core_cache.versioned_key("home", "context")
+    context = core_cache.get(key)
+    if context is None:
+        courses = Course.objects.select_related("program").annotate(
+            video_count=Count("uploadvideo")
+        )
+        context = {
+            # Get featured courses and videos for public viewing
+            "featured_courses": list(courses[:6]),
+            "featured_videos": list(UploadVideo.objects.order_by("-timestamp")[:8]),
+            "latest_courses": list(courses.order_by("-pk")[:4]),
+            # Get statistics for hero section
+            "total_bootcamps": Program.objects.count(),
+            "total_courses": Course.objects.count(),
+            "total_participants": User.objects.filter(is_student=True).count(),
+            "total_videos": UploadVideo.objects.count(),
+        }
+        core_cache.set(key, context, settings.HOME_CACHE_TIMEOUT)
+    return context
 
-    # Get statistics for hero section
-    total_bootcamps = Program.objects.count()
-    total_courses = Course.objects.count()
-    total_participants = User.objects.filter(is_student=True).count()
-    total_videos = UploadVideo.objects.count()
 
-    # Check if user is authenticated
-    user_authenticated = request.user.is_authenticated
+def home_view(request):
+    """Public homepage for SavvyIndians AI Bootcamp & Masterclass platform"""
+    # Anonymous visitors all get the same page, serve it straight from cache
+    page_key = None
+    if not request.user.is_authenticated and not request.GET:
+        page_key = core_cache.versioned_key("home", f"page:{get_language()}")
+        cached = core_cache.get(page_key)
+        if cached is not None:
+            content, content_type = cached
+            return _vary_home_response(HttpResponse(content, content_type=content_type))
 
     context = {
         "title": "SavvyIndians - AI Bootcamps & Masterclasses",
-        "featured_courses": featured_courses,
-        "featured_videos": featured_videos,
-        "latest_courses": latest_courses,
-        "total_bootcamps": total_bootcamps,
-        "total_courses": total_courses,
-        "total_participants": total_participants,
-        "total_videos": total_videos,
-        "user_authenticated": user_authenticated,
+        "user_authenticated": request.user.is_authenticated,
+        **get_home_context(),
     }
-    return render(request, "core/bootcamp_home.html", context)
+    response = render(request, "core/bootcamp_home.html", context)
+    # A page that embeds a CSRF token belongs to one visitor and is not shared
+    if page_key and not request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+        core_cache.set(
+            page_key,
+            (response.content, response["Content-Type"]),
+            settings.HOME_CACHE_TIMEOUT,
+        )
+    return _vary_home_response(response)
+
+
+def _vary_home_response(response):
+    """The page differs by login state and language, on hits and misses alike"""
+    patch_vary_headers(response, ("Cookie", "Accept-Language"))
+    return response
 
 
 @login_required
@@ -72,6 +104,23 @@ def dashboard_view(request):
     return render(request, "core/dashboard.html", context)
 
 
+@login_required
+@admin_required
+def cache_stats_view(request):
+    """Hit/miss counters of the cache namespaces in this process"""
+    if request.method == "POST":
+        reset_stats()
+        messages.success(request, "Cache statistics have been reset.")
+        return redirect("cache_stats")
+
+    context = {
+        "title": "Cache Statistics",
+        "stats": get_stats(),
+        "backend": settings.CACHES["default"]["BACKEND"].rsplit(".", 1)[-1],
+    }
+    return render(request, "core/cache_stats.html", context)
+
+
 @login_required
 def post_add(request):
     return handle_form_submission(
@@ -1,9 +1,15 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.db.models import Count, Sum
+from django.utils import timezone
 from django.utils.html import format_html
 
 from .models import (
     Course,
     CourseAllocation,
+    CourseProgressSummary,
+    DRMViolationRollup,
     Program,
     Upload,
     UploadVideo,
@@ -174,6 +180,66 @@ class VideoProgressAdmin(admin.ModelAdmin):
     )
 
 
+class CourseProgressSummaryAdmin(admin.ModelAdmin):
+    list_display = [
+        "student",
+        "course",
+        "videos_completed",
+        "videos_total",
+        "watch_time",
+        "last_activity",
+        "completed_at",
+    ]
+    list_filter = ["course"]
+    search_fields = ["student__username", "course__title"]
+    readonly_fields = [
+        "videos_total",
+        "videos_started",
+        "videos_completed",
+        "watch_time",
+        "last_activity",
+        "completed_at",
+    ]
+
+
+class RecentLogFilter(admin.SimpleListFilter):
+    """Limit the raw DRM log to recent rows unless all time is asked for"""
+
+    title = "time"
+    parameter_name = "recent"
+    default = "24h"
+    periods = {
+        "24h": timedelta(hours=24),
+        "7d": timedelta(days=7),
+        "30d": timedelta(days=30),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ("24h", "Last 24 hours"),
+            ("7d", "Last 7 days"),
+            ("30d", "Last 30 days"),
+            ("all", "All time"),
+        )
+
+    def queryset(self, request, queryset):
+        period = self.periods.get(self.value() or self.default)
+        if period is None:
+            return queryset
+        return queryset.filter(timestamp__gte=timezone.now() - period)
+
+    def choices(self, changelist):
+        value = self.value() or self.default
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": value == lookup,
+                "query_string": changelist.get_query_string(
+                    {self.parameter_name: lookup}
+                ),
+                "display": title,
+            }
+
+
 class VideoDRMLogAdmin(admin.ModelAdmin):
     list_display = [
         "timestamp",
@@ -181,13 +247,19 @@ class VideoDRMLogAdmin(admin.ModelAdmin):
         "user",
         "video",
         "violation_type",
+        "occurrences",
         "ip_address",
         "colored_log_type",
     ]
-    list_filter = ["log_type", "violation_type", "timestamp"]
-    search_fields = ["user__username", "video__title", "ip_address", "user_agent"]
+    list_filter = [RecentLogFilter, "log_type", "violation_type"]
+    # Searching user_agent meant a full scan of a very large table
+    search_fields = ["user__username", "video__title", "ip_address"]
+    list_select_related = ["user", "video"]
+    show_full_result_count = False
     readonly_fields = [
         "timestamp",
+        "last_seen",
+        "occurrences",
         "log_type",
         "violation_type",
         "user",
@@ -200,7 +272,18 @@ class VideoDRMLogAdmin(admin.ModelAdmin):
     ]
 
     fieldsets = (
-        ("Log Information", {"fields": ("log_type", "violation_type", "timestamp")}),
+        (
+            "Log Information",
+            {
+                "fields": (
+                    "log_type",
+                    "violation_type",
+                    "timestamp",
+                    "occurrences",
+                    "last_seen",
+                )
+            },
+        ),
         ("User & Video", {"fields": ("user", "video")}),
         (
             "Technical Details",
@@ -243,6 +326,52 @@ class VideoDRMLogAdmin(admin.ModelAdmin):
         return False
 
 
+class DRMViolationRollupAdmin(admin.ModelAdmin):
+    change_list_template = "admin/course/drmviolationrollup/change_list.html"
+    list_display = [
+        "period_start",
+        "period",
+        "video",
+        "user",
+        "violation_type",
+        "count",
+        "first_seen",
+        "last_seen",
+    ]
+    list_filter = ["period", "violation_type"]
+    search_fields = ["user__username", "video__title"]
+    list_select_related = ["user", "video"]
+    date_hierarchy = "period_start"
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, "context_data", {}).get("cl")
+        if changelist is None:
+            return response
+
+        # Hourly and daily rollups count the same violations twice
+        rollups = changelist.queryset.filter(
+            period=request.GET.get("period__exact", DRMViolationRollup.DAY)
+        ).order_by()
+        response.context_data["violation_totals"] = (
+            rollups.values("violation_type")
+            .annotate(total=Sum("count"), viewers=Count("user", distinct=True))
+            .order_by("-total")
+        )
+        response.context_data["top_videos"] = (
+            rollups.values("video__title")
+            .annotate(total=Sum("count"))
+            .order_by("-total")[:10]
+        )
+        return response
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Register bootcamp-related models only
 admin.site.register(Program, ProgramAdmin)
 admin.site.register(Course, CourseAdmin)
@@ -250,7 +379,9 @@ admin.site.register(CourseAllocation)
 admin.site.register(Upload, UploadAdmin)
 admin.site.register(UploadVideo, UploadVideoAdmin)
 admin.site.register(VideoProgress, VideoProgressAdmin)
+admin.site.register(CourseProgressSummary, CourseProgressSummaryAdmin)
 admin.site.register(VideoDRMLog, VideoDRMLogAdmin)
+admin.site.register(DRMViolationRollup, DRMViolationRollupAdmin)
 
 # Unregister translation models if modeltranslation was previously used
 try:
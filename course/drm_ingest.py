@@ -0,0 +1,202 @@
+"""
+Ingest pipeline for DRM events reported by the video player.
+
+The player reports an access event per page load and a violation for
+every right-click, shortcut or devtools heuristic, so a single browser
+can send hundreds of events a minute. Events arrive in batches and go
+through three steps before anything is written:
+
+- a per-session rate limit drops events above ``DRM_EVENTS_PER_MINUTE``;
+- identical events of one viewer (same video, log type and violation
+  type) within ``DRM_DEDUPE_WINDOW`` seconds are folded into the first
+  row's ``occurrences`` counter;
+- the remaining new rows are written with one bulk_create, and one
+  activity log entry is queued per new violation.
+
+Every violation that passes the rate limit is also counted into the
+hourly and daily DRMViolationRollup rows the admin reads.
+"""
+
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from core.activity import log_activities
+from core.cache import course_cache
+from core.models import ActivityLog
+
+from .models import DRMViolationRollup, UploadVideo, VideoDRMLog
+
+# Names the player uses for violations, mapped to VideoDRMLog choices
+VIOLATION_TYPE_MAP = {
+    "DevTools opened": "devtools_open",
+    "Screen recording detected": "screen_recording",
+    "Screen recording attempt detected": "screen_recording",
+    "Video source tampering attempt": "video_tampering",
+}
+VIOLATION_TYPES = {choice for choice, _label in VideoDRMLog.VIOLATION_TYPE_CHOICES}
+LOG_TYPES = {choice for choice, _label in VideoDRMLog.LOG_TYPE_CHOICES}
+
+
+def get_rate_limit():
+    return getattr(settings, "DRM_EVENTS_PER_MINUTE", 60)
+
+
+def get_dedupe_window():
+    return getattr(settings, "DRM_DEDUPE_WINDOW", 60)
+
+
+def get_max_batch_events():
+    return getattr(settings, "DRM_MAX_BATCH_EVENTS", 100)
+
+
+def parse_event(log_type, data):
+    """
+    Normalise one event from the player into a dict of VideoDRMLog field
+    values. Raises ValueError for events that cannot be stored.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Event data must be an object")
+    # A list or object as log_type would otherwise fail the set lookup
+    if not isinstance(log_type, str) or log_type not in LOG_TYPES:
+        raise ValueError(f"Unknown log type {log_type!r}")
+    try:
+        video_id = int(data["video_id"])
+    except (KeyError, OverflowError, TypeError, ValueError):
+        raise ValueError("video_id is required")
+
+    violation_type = None
+    if log_type == "violation":
+        raw_violation_type = data.get("violation_type") or "other"
+        if not isinstance(raw_violation_type, str):
+            raw_violation_type = "other"
+        violation_type = VIOLATION_TYPE_MAP.get(raw_violation_type, raw_violation_type)
+        if violation_type not in VIOLATION_TYPES:
+            violation_type = "other"
+
+    return {
+        "video_id": video_id,
+        "log_type": log_type,
+        "violation_type": violation_type,
+        "user_agent": str(data.get("user_agent") or ""),
+        "screen_resolution": str(data.get("screen_resolution") or "")[:50],
+        "platform": str(data.get("platform") or "")[:100],
+        "url": str(data.get("url") or "")[:500],
+    }
+
+
+def take_allowance(identity, requested):
+    """How many of ``requested`` events the session may still send this minute"""
+    key = f"drm:rate:{identity}:{int(time.time() // 60)}"
+    if course_cache.add(key, requested, 60):
+        used = requested
+    else:
+        try:
+            used = course_cache.incr(key, requested)
+        except ValueError:
+            # Expired in between
+            course_cache.set(key, requested, 60)
+            used = requested
+    return max(0, min(requested, get_rate_limit() - (used - requested)))
+
+
+def _dedupe_key(identity, event):
+    return "drm:seen:{}:{}:{}:{}".format(
+        identity, event["video_id"], event["log_type"], event["violation_type"] or ""
+    )
+
+
+def ingest(events, user=None, identity="", ip_address=None):
+    """
+    Store a batch of parsed events for one viewer. ``identity`` names the
+    viewer's session for rate limiting and deduplication.
+
+    Returns a dict with the number of events ``stored`` as new rows,
+    ``deduplicated`` into existing rows, ``throttled`` by the rate limit
+    and ``rejected`` for unknown videos.
+    """
+    result = {"stored": 0, "deduplicated": 0, "throttled": 0, "rejected": 0}
+
+    allowed = take_allowance(identity, len(events))
+    result["throttled"] = len(events) - allowed
+    events = events[:allowed]
+    if not events:
+        return result
+
+    titles = dict(
+        UploadVideo.objects.filter(
+            id__in={event["video_id"] for event in events}
+        ).values_list("id", "title")
+    )
+    valid = [event for event in events if event["video_id"] in titles]
+    result["rejected"] = len(events) - len(valid)
+
+    # Fold identical events of the batch together, keeping the first one
+    counts = Counter()
+    first_events = {}
+    for event in valid:
+        key = _dedupe_key(identity, event)
+        counts[key] += 1
+        first_events.setdefault(key, event)
+
+    now = timezone.now()
+    seen = course_cache.get_many(list(first_events))
+    fresh = []
+    with transaction.atomic():
+        for key, event in first_events.items():
+            log_id = seen.get(key)
+            if log_id is not None and VideoDRMLog.objects.filter(id=log_id).update(
+                occurrences=F("occurrences") + counts[key], last_seen=now
+            ):
+                result["deduplicated"] += counts[key]
+            else:
+                fresh.append(key)
+
+        rows = [
+            VideoDRMLog(
+                user=user,
+                ip_address=ip_address,
+                occurrences=counts[key],
+                last_seen=now,
+                **first_events[key],
+            )
+            for key in fresh
+        ]
+        VideoDRMLog.objects.bulk_create(rows)
+
+        user_id = user.id if user is not None else None
+        DRMViolationRollup.objects.add(
+            Counter(
+                (event["video_id"], user_id, event["violation_type"])
+                for event in valid
+                if event["log_type"] == "violation"
+            ),
+            now,
+        )
+
+    result["stored"] = len(rows)
+    result["deduplicated"] += sum(counts[key] for key in fresh) - len(rows)
+
+    window = get_dedupe_window()
+    for key, row in zip(fresh, rows):
+        # Backends that cannot return ids only deduplicate within a batch
+        if row.pk is not None and window:
+            course_cache.set(key, row.pk, window)
+
+    user_info = user.username if user is not None else "Unknown user"
+    log_activities(
+        [
+            _(
+                f"DRM Violation: {user_info} attempted {row.violation_type} on video '{titles[row.video_id]}'"
+            )
+            for row in rows
+            if row.log_type == "violation"
+        ],
+        category=ActivityLog.DRM,
+    )
+    return result
@@ -0,0 +1,37 @@
+"""
+Django management command to recompute the DRM violation rollups from the
+raw DRM log, e.g. to backfill them for existing rows.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from course.models import DRMViolationRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the hourly and daily DRM violation rollups from VideoDRMLog"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Only rebuild rollups of the last DAYS days (default: all time)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rollups written per statement (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["days"] is not None:
+            since = timezone.now() - timedelta(days=options["days"])
+        count = DRMViolationRollup.objects.rebuild(
+            since=since, batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} DRM violation rollups."))
@@ -0,0 +1,26 @@
+"""
+Django management command to recompute course progress summaries from the
+stored video progress.
+"""
+
+from django.core.management.base import BaseCommand
+
+from course.models import CourseProgressSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per-student course progress summaries from VideoProgress"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--student", type=int, help="Only rebuild summaries of this user id"
+        )
+        parser.add_argument(
+            "--course", type=int, help="Only rebuild summaries of this course id"
+        )
+
+    def handle(self, *args, **options):
+        count = CourseProgressSummary.objects.rebuild(
+            student_id=options["student"], course_id=options["course"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} progress summaries."))
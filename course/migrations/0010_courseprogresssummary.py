@@ -0,0 +1,83 @@
+# Generated by Django 4.2.16 on 2026-10-18 13:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_summaries(apps, schema_editor):
+    CourseProgressSummary = apps.get_model("course", "CourseProgressSummary")
+    UploadVideo = apps.get_model("course", "UploadVideo")
+    VideoProgress = apps.get_model("course", "VideoProgress")
+    Count, Max, Q, Sum = models.Count, models.Max, models.Q, models.Sum
+
+    totals = dict(
+        UploadVideo.objects.order_by()
+        .values("course_id")
+        .annotate(total=Count("id"))
+        .values_list("course_id", "total")
+    )
+    rows = (
+        VideoProgress.objects.order_by()
+        .values("student_id", "video__course_id")
+        .annotate(
+            started=Count("id"),
+            completed=Count("id", filter=Q(is_completed=True)),
+            watched=Sum("watch_time"),
+            last_activity=Max("last_watched"),
+        )
+    )
+
+    summaries = []
+    for row in rows.iterator():
+        total = totals.get(row["video__course_id"], 0)
+        summaries.append(
+            CourseProgressSummary(
+                student_id=row["student_id"],
+                course_id=row["video__course_id"],
+                videos_total=total,
+                videos_started=row["started"],
+                videos_completed=row["completed"],
+                watch_time=row["watched"] or 0,
+                last_activity=row["last_activity"],
+                # Courses finished before summaries existed are not notified again
+                completed_at=(
+                    row["last_activity"] if 0 < total <= row["completed"] else None
+                ),
+            )
+        )
+    CourseProgressSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('course', '0009_videodrmlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseProgressSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('videos_total', models.PositiveIntegerField(default=0)),
+                ('videos_started', models.PositiveIntegerField(default=0)),
+                ('videos_completed', models.PositiveIntegerField(default=0)),
+                ('watch_time', models.PositiveIntegerField(default=0, help_text='Watch time in seconds')),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_summaries', to='course.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_progress_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_activity'],
+                'indexes': [models.Index(fields=['student', '-last_activity'], name='course_cour_student_59422e_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='courseprogresssummary',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_course_progress_summary'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0010_courseprogresssummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videodrmlog',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='videodrmlog',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
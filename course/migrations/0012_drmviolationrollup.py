@@ -0,0 +1,42 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('course', '0011_videodrmlog_occurrences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DRMViolationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('violation_type', models.CharField(choices=[('screen_recording', 'Screen Recording Detected'), ('devtools_open', 'Developer Tools Opened'), ('right_click', 'Right-Click Attempt'), ('keyboard_shortcut', 'Keyboard Shortcut Blocked'), ('video_tampering', 'Video Source Tampering'), ('download_attempt', 'Download Attempt'), ('inspect_element', 'Inspect Element Attempt'), ('other', 'Other Violation')], max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='drm_rollups', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drm_rollups', to='course.uploadvideo')),
+            ],
+            options={
+                'ordering': ['-period_start', '-count'],
+                'indexes': [models.Index(fields=['period', '-period_start'], name='course_drmrollup_period')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='drmviolationrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('period', 'period_start', 'video', 'user', 'violation_type'), name='unique_drm_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='drmviolationrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('period', 'period_start', 'video', 'violation_type'), name='unique_drm_rollup_anonymous'),
+        ),
+    ]
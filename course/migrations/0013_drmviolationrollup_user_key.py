@@ -0,0 +1,59 @@
+# Generated by Django 4.2.16 on 2026-10-18 16:10
+
+from django.db import migrations, models
+from django.db.models import F, Max, Min, Sum
+
+
+def fill_user_key(apps, schema_editor):
+    DRMViolationRollup = apps.get_model("course", "DRMViolationRollup")
+    DRMViolationRollup.objects.filter(user__isnull=False).update(user_key=F("user_id"))
+
+    # Backends that ignored the partial constraints may hold duplicates
+    key = ["period", "period_start", "video_id", "user_key", "violation_type"]
+    duplicates = (
+        DRMViolationRollup.objects.order_by()
+        .values(*key)
+        .annotate(
+            rows=models.Count("id"),
+            keep=Min("id"),
+            total=Sum("count"),
+            first=Min("first_seen"),
+            last=Max("last_seen"),
+        )
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        DRMViolationRollup.objects.filter(pk=row["keep"]).update(
+            count=row["total"], first_seen=row["first"], last_seen=row["last"]
+        )
+        DRMViolationRollup.objects.filter(**{field: row[field] for field in key}).exclude(
+            pk=row["keep"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0012_drmviolationrollup'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='drmviolationrollup',
+            name='unique_drm_rollup',
+        ),
+        migrations.RemoveConstraint(
+            model_name='drmviolationrollup',
+            name='unique_drm_rollup_anonymous',
+        ),
+        migrations.AddField(
+            model_name='drmviolationrollup',
+            name='user_key',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_user_key, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='drmviolationrollup',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'video', 'user_key', 'violation_type'), name='unique_drm_rollup'),
+        ),
+    ]
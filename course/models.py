@@ -7,6 +7,7 @@ from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
+from core.activity import log_activity
 from core.models import ActivityLog
 
 # project import
@@ -122,12 +123,16 @@ class Program(models.Model):
 @receiver(post_save, sender=Program)
 def log_save_program(sender, instance, created, **kwargs):
     verb = "created" if created else "updated"
-    ActivityLog.objects.create(message=_(f"The program '{instance}' has been {verb}."))
+    log_activity(
+        _(f"The program '{instance}' has been {verb}."), category=ActivityLog.CONTENT
+    )
 
 
 @receiver(post_delete, sender=Program)
 def log_delete_program(sender, instance, **kwargs):
-    ActivityLog.objects.create(message=_(f"The program '{instance}' has been deleted."))
+    log_activity(
+        _(f"The program '{instance}' has been deleted."), category=ActivityLog.CONTENT
+    )
 
 
 class CourseManager(models.Manager):
@@ -273,12 +278,16 @@ pre_save.connect(course_pre_save_receiver, sender=Course)
 @receiver(post_save, sender=Course)
 def log_save_course(sender, instance, created, **kwargs):
     verb = "created" if created else "updated"
-    ActivityLog.objects.create(message=_(f"The course '{instance}' has been {verb}."))
+    log_activity(
+        _(f"The course '{instance}' has been {verb}."), category=ActivityLog.CONTENT
+    )
 
 
 @receiver(post_delete, sender=Course)
 def log_delete_course(sender, instance, **kwargs):
-    ActivityLog.objects.create(message=_(f"The course '{instance}' has been deleted."))
+    log_activity(
+        _(f"The course '{instance}' has been deleted."), category=ActivityLog.CONTENT
+    )
 
 
 class CourseAllocation(models.Model):
@@ -351,25 +360,28 @@ class Upload(models.Model):
 @receiver(post_save, sender=Upload)
 def log_save_upload(sender, instance, created, **kwargs):
     if created:
-        ActivityLog.objects.create(
-            message=_(
+        log_activity(
+            _(
                 f"The file '{instance.title}' has been uploaded to the course '{instance.course}'."
-            )
+            ),
+            category=ActivityLog.CONTENT,
         )
     else:
-        ActivityLog.objects.create(
-            message=_(
+        log_activity(
+            _(
                 f"The file '{instance.title}' of the course '{instance.course}' has been updated."
-            )
+            ),
+            category=ActivityLog.CONTENT,
         )
 
 
 @receiver(post_delete, sender=Upload)
 def log_delete_upload(sender, instance, **kwargs):
-    ActivityLog.objects.create(
-        message=_(
+    log_activity(
+        _(
             f"The file '{instance.title}' of the course '{instance.course}' has been deleted."
-        )
+        ),
+        category=ActivityLog.CONTENT,
     )
 
 
@@ -479,25 +491,28 @@ pre_save.connect(video_pre_save_receiver, sender=UploadVideo)
 @receiver(post_save, sender=UploadVideo)
 def log_save_uploadvideo(sender, instance, created, **kwargs):
     if created:
-        ActivityLog.objects.create(
-            message=_(
+        log_activity(
+            _(
                 f"The video '{instance.title}' has been uploaded to the course {instance.course}."
-            )
+            ),
+            category=ActivityLog.CONTENT,
         )
     else:
-        ActivityLog.objects.create(
-            message=_(
+        log_activity(
+            _(
                 f"The video '{instance.title}' of the course '{instance.course}' has been updated."
-            )
+            ),
+            category=ActivityLog.CONTENT,
         )
 
 
 @receiver(post_delete, sender=UploadVideo)
 def log_delete_uploadvideo(sender, instance, **kwargs):
-    ActivityLog.objects.create(
-        message=_(
+    log_activity(
+        _(
             f"The video '{instance.title}' of the course '{instance.course}' has been deleted."
-        )
+        ),
+        category=ActivityLog.CONTENT,
     )
 
 
@@ -549,7 +564,11 @@ class VideoProgress(models.Model):
     def __str__(self):
         return f"{self.student.username} - {self.video.title} ({self.completion_percentage:.1f}%)"
 
-    def save(self, *args, **kwargs):
+    def refresh_completion(self):
+        """
+        Recalculate completion percentage and status from the watch time.
+        Returns True when this call marked the video as completed.
+        """
         # Calculate completion percentage
         if self.total_duration > 0:
             self.completion_percentage = min(
@@ -563,9 +582,35 @@ class VideoProgress(models.Model):
                 from django.utils import timezone
 
                 self.completed_at = timezone.now()
+            return True
+        return False
 
+    def save(self, *args, **kwargs):
+        self.refresh_completion()
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_summary_state()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_summary_state()
+
+    # Fields folded into the CourseProgressSummary of the row
+    SUMMARY_FIELDS = ("student_id", "video_id", "watch_time", "is_completed")
+
+    def remember_summary_state(self):
+        """Keep the values the summary counts, to save only the difference"""
+        if self.get_deferred_fields() & set(self.SUMMARY_FIELDS):
+            self._summary_state = None
+        else:
+            self._summary_state = tuple(
+                getattr(self, field) for field in self.SUMMARY_FIELDS
+            )
+
     @property
     def progress_display(self):
         """Human readable progress display"""
@@ -589,17 +634,307 @@ class VideoProgress(models.Model):
 @receiver(post_save, sender=VideoProgress)
 def log_video_progress(sender, instance, created, **kwargs):
     if created:
-        ActivityLog.objects.create(
-            message=_(
+        log_activity(
+            _(
                 f"Student '{instance.student.username}' started watching '{instance.video.title}'."
-            )
+            ),
+            category=ActivityLog.PROGRESS,
         )
     elif instance.is_completed and instance.completion_percentage >= 90:
-        ActivityLog.objects.create(
-            message=_(
+        log_activity(
+            _(
                 f"Student '{instance.student.username}' completed watching '{instance.video.title}'."
+            ),
+            category=ActivityLog.PROGRESS,
+        )
+
+
+class CourseProgressSummaryManager(models.Manager):
+    def apply_deltas(self, deltas):
+        """
+        Fold progress changes into the summaries without re-reading the
+        VideoProgress rows. ``deltas`` maps (student_id, course_id) to a
+        tuple of (watch_time, videos_started, videos_completed) increments.
+        """
+        from django.db import IntegrityError, transaction
+        from django.utils import timezone
+
+        now = timezone.now()
+        missing = [key for key, delta in deltas.items() if not self._add(key, delta, now)]
+
+        # First activity of a student in a course: build the row from scratch
+        for key in missing:
+            try:
+                with transaction.atomic():
+                    self.rebuild(student_id=key[0], course_id=key[1], notify=False)
+            except IntegrityError:
+                # Created concurrently by a rebuild that could not see our rows
+                self._add(key, deltas[key], now)
+
+        self.complete(deltas.keys())
+
+    def _add(self, key, delta, now):
+        student_id, course_id = key
+        watched, started, completed = delta
+        return self.filter(student_id=student_id, course_id=course_id).update(
+            watch_time=models.F("watch_time") + watched,
+            videos_started=models.F("videos_started") + started,
+            videos_completed=models.F("videos_completed") + completed,
+            last_activity=now,
+        )
+
+    def rebuild(self, student_id=None, course_id=None, notify=True):
+        """
+        Recompute summaries from VideoProgress, optionally limited to one
+        student and/or course. Returns the number of summaries written.
+        """
+        from django.db.models import Count, Max, Sum
+        from django.db.models.functions import Coalesce
+
+        progress = VideoProgress.objects.all()
+        summaries = self.all()
+        videos = UploadVideo.objects.all()
+        if student_id is not None:
+            progress = progress.filter(student_id=student_id)
+            summaries = summaries.filter(student_id=student_id)
+        if course_id is not None:
+            progress = progress.filter(video__course_id=course_id)
+            summaries = summaries.filter(course_id=course_id)
+            videos = videos.filter(course_id=course_id)
+
+        totals = dict(
+            videos.order_by()
+            .values("course_id")
+            .annotate(total=Count("id"))
+            .values_list("course_id", "total")
+        )
+        rows = (
+            progress.order_by()
+            .values("student_id", "video__course_id")
+            .annotate(
+                started=Count("id"),
+                completed=Count("id", filter=Q(is_completed=True)),
+                watched=Coalesce(Sum("watch_time"), 0),
+                last_activity=Max("last_watched"),
+            )
+        )
+
+        existing = {
+            (summary.student_id, summary.course_id): summary for summary in summaries
+        }
+        to_create, to_update = [], []
+        for row in rows:
+            key = (row["student_id"], row["video__course_id"])
+            summary = existing.pop(key, None)
+            if summary is None:
+                summary = self.model(student_id=key[0], course_id=key[1])
+                to_create.append(summary)
+            else:
+                to_update.append(summary)
+            summary.videos_total = totals.get(key[1], 0)
+            summary.videos_started = row["started"]
+            summary.videos_completed = row["completed"]
+            summary.watch_time = row["watched"]
+            summary.last_activity = row["last_activity"]
+
+        self.bulk_create(to_create)
+        self.bulk_update(
+            to_update,
+            [
+                "videos_total",
+                "videos_started",
+                "videos_completed",
+                "watch_time",
+                "last_activity",
+            ],
+        )
+        # Summaries left over have no progress rows behind them anymore
+        if existing:
+            self.filter(pk__in=[s.pk for s in existing.values()]).delete()
+
+        if notify:
+            self.complete([(s.student_id, s.course_id) for s in to_create + to_update])
+        return len(to_create) + len(to_update)
+
+    def sync_videos_total(self, course_id):
+        """Refresh the video count of every summary of a course"""
+        return self.filter(course_id=course_id).update(
+            videos_total=UploadVideo.objects.filter(course_id=course_id).count()
+        )
+
+    def complete(self, keys):
+        """
+        Stamp ``completed_at`` on summaries among ``keys`` whose every video
+        is now completed and send the course completion notification. Each
+        summary is completed at most once.
+        """
+        from django.db import transaction
+        from django.utils import timezone
+
+        keys = set(keys)
+        if not keys:
+            return []
+
+        with transaction.atomic():
+            finished = [
+                summary
+                for summary in self.select_for_update()
+                .filter(
+                    student_id__in={student_id for student_id, _ in keys},
+                    course_id__in={course_id for _, course_id in keys},
+                    completed_at__isnull=True,
+                    videos_total__gt=0,
+                    videos_completed__gte=models.F("videos_total"),
+                )
+                .select_related("student", "course")
+                if (summary.student_id, summary.course_id) in keys
+            ]
+            if not finished:
+                return []
+
+            now = timezone.now()
+            for summary in finished:
+                summary.completed_at = now
+            self.bulk_update(finished, ["completed_at"])
+            transaction.on_commit(lambda: _notify_course_completion(finished))
+        return finished
+
+
+def _notify_course_completion(summaries):
+    from notifications import preferences
+    from notifications.models import create_course_completion_notification
+
+    # Resolve every student's preferences with one query up front
+    preferences.resolve(summary.student_id for summary in summaries)
+    for summary in summaries:
+        create_course_completion_notification(summary.student, summary.course)
+
+
+class CourseProgressSummary(models.Model):
+    """
+    Denormalized video progress of a student in a course, kept up to date
+    as VideoProgress rows and course videos change.
+    """
+
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="course_progress_summaries",
+    )
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name="progress_summaries"
+    )
+    videos_total = models.PositiveIntegerField(default=0)
+    videos_started = models.PositiveIntegerField(default=0)
+    videos_completed = models.PositiveIntegerField(default=0)
+    watch_time = models.PositiveIntegerField(
+        default=0, help_text=_("Watch time in seconds")
+    )
+    last_activity = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = CourseProgressSummaryManager()
+
+    class Meta:
+        ordering = ["-last_activity"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["student", "course"], name="unique_course_progress_summary"
             )
+        ]
+        indexes = [models.Index(fields=["student", "-last_activity"])]
+
+    def __str__(self):
+        return f"{self.student} - {self.course} ({self.videos_completed}/{self.videos_total})"
+
+    @property
+    def completion_percentage(self):
+        if self.videos_total > 0:
+            return min(self.videos_completed / self.videos_total * 100, 100.0)
+        return 0
+
+
+@receiver(post_save, sender=VideoProgress)
+def update_summary_on_progress_save(sender, instance, created, **kwargs):
+    # Bulk flushes bypass signals and update summaries with deltas instead
+    previous = None if created else getattr(instance, "_summary_state", None)
+    key = (instance.student_id, instance.video.course_id)
+    if created:
+        CourseProgressSummary.objects.apply_deltas(
+            {key: (instance.watch_time, 1, int(instance.is_completed))}
         )
+    elif previous is not None and previous[:2] == (
+        instance.student_id,
+        instance.video_id,
+    ):
+        _, _, watched, completed = previous
+        CourseProgressSummary.objects.apply_deltas(
+            {
+                key: (
+                    instance.watch_time - watched,
+                    0,
+                    int(instance.is_completed) - int(completed),
+                )
+            }
+        )
+    else:
+        # Moved to another student or video, or the counted values are
+        # unknown: recount what the row left and where it is now
+        if previous is not None:
+            student_id, video_id = previous[:2]
+            old_course_id = (
+                UploadVideo.objects.filter(pk=video_id)
+                .values_list("course_id", flat=True)
+                .first()
+            )
+            if (student_id, old_course_id) != key and old_course_id is not None:
+                CourseProgressSummary.objects.rebuild(
+                    student_id=student_id, course_id=old_course_id
+                )
+        CourseProgressSummary.objects.rebuild(student_id=key[0], course_id=key[1])
+    instance.remember_summary_state()
+
+
+@receiver(post_delete, sender=VideoProgress)
+def update_summary_on_progress_delete(sender, instance, origin=None, **kwargs):
+    from django.contrib.auth import get_user_model
+
+    # Cascades from a video are rebuilt once per course by the video
+    # receiver, cascades from a course or student drop the summaries too
+    if isinstance(origin, (UploadVideo, Course, get_user_model())):
+        return
+    CourseProgressSummary.objects.rebuild(
+        student_id=instance.student_id, course_id=instance.video.course_id
+    )
+
+
+@receiver(pre_save, sender=UploadVideo)
+def remember_video_course(sender, instance, **kwargs):
+    instance._previous_course_id = (
+        UploadVideo.objects.filter(pk=instance.pk)
+        .values_list("course_id", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=UploadVideo)
+def update_summaries_on_video_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_course_id", None)
+    if previous is None:
+        CourseProgressSummary.objects.sync_videos_total(instance.course_id)
+    elif previous != instance.course_id:
+        # The progress rows moved along with the video
+        CourseProgressSummary.objects.rebuild(course_id=previous)
+        CourseProgressSummary.objects.rebuild(course_id=instance.course_id)
+
+
+@receiver(post_delete, sender=UploadVideo)
+def update_summaries_on_video_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Course):
+        return
+    CourseProgressSummary.objects.rebuild(course_id=instance.course_id)
 
 
 class VideoDRMLog(models.Model):
@@ -649,6 +984,11 @@ class VideoDRMLog(models.Model):
     # Timestamps
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    # Identical events repeated within the dedupe window are counted on
+    # the first row instead of being stored again, see course.drm_ingest
+    occurrences = models.PositiveIntegerField(default=1)
+    last_seen = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ["-timestamp"]
         indexes = [
@@ -663,14 +1003,181 @@ class VideoDRMLog(models.Model):
             return f"DRM Violation: {user_info} - {self.violation_type} on {self.video.title}"
         return f"Video Access: {user_info} - {self.video.title}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
 
-        # Create activity log for violations
-        if self.log_type == "violation":
-            user_info = self.user.username if self.user else "Unknown user"
-            ActivityLog.objects.create(
-                message=_(
-                    f"DRM Violation: {user_info} attempted {self.violation_type} on video '{self.video.title}'"
+class DRMViolationRollupManager(models.Manager):
+    def period_start(self, period, when):
+        """Start of the hour or day containing ``when``, in local time"""
+        from django.utils import timezone
+
+        start = timezone.localtime(when).replace(minute=0, second=0, microsecond=0)
+        if period == self.model.DAY:
+            start = start.replace(hour=0)
+        return start
+
+    def add(self, counts, when):
+        """
+        Count violations seen at ``when`` into the hourly and daily rollups.
+        ``counts`` maps (video_id, user_id, violation_type) to a number of
+        occurrences.
+        """
+        from django.db import IntegrityError, transaction
+
+        for period, _label in self.model.PERIOD_CHOICES:
+            period_start = self.period_start(period, when)
+            for (video_id, user_id, violation_type), count in counts.items():
+                rollup = self.filter(
+                    period=period,
+                    period_start=period_start,
+                    video_id=video_id,
+                    user_key=user_id or 0,
+                    violation_type=violation_type,
                 )
-            )
+                if self._add(rollup, count, when):
+                    continue
+                try:
+                    with transaction.atomic():
+                        self.create(
+                            period=period,
+                            period_start=period_start,
+                            video_id=video_id,
+                            user_id=user_id,
+                            user_key=user_id or 0,
+                            violation_type=violation_type,
+                            count=count,
+                            first_seen=when,
+                            last_seen=when,
+                        )
+                except IntegrityError:
+                    # Created concurrently by another request
+                    self._add(rollup, count, when)
+
+    def _add(self, rollup, count, when):
+        return rollup.update(count=models.F("count") + count, last_seen=when)
+
+    def rebuild(self, since=None, batch_size=1000):
+        """
+        Recompute the rollups from VideoDRMLog, from the start of the day
+        of ``since`` or for all time. Repeats folded into a log row are
+        counted in the hour of the row. Returns the number of rollups
+        written.
+        """
+        from django.db import transaction
+        from django.db.models import Max, Min, Sum
+        from django.db.models.functions import Coalesce, TruncDay, TruncHour
+
+        logs = VideoDRMLog.objects.filter(
+            log_type="violation", violation_type__isnull=False
+        )
+        rollups = self.all()
+        if since is not None:
+            since = self.period_start(self.model.DAY, since)
+            logs = logs.filter(timestamp__gte=since)
+            rollups = rollups.filter(period_start__gte=since)
+
+        truncs = {self.model.HOUR: TruncHour, self.model.DAY: TruncDay}
+        written = 0
+        with transaction.atomic():
+            rollups.delete()
+            for period, trunc in truncs.items():
+                rows = (
+                    logs.order_by()
+                    .values(
+                        "video_id",
+                        "user_id",
+                        "violation_type",
+                        bucket=trunc("timestamp"),
+                    )
+                    .annotate(
+                        total=Sum("occurrences"),
+                        first=Min("timestamp"),
+                        last=Max(Coalesce("last_seen", "timestamp")),
+                    )
+                )
+                batch = []
+                for row in rows.iterator(chunk_size=batch_size):
+                    batch.append(
+                        self.model(
+                            period=period,
+                            period_start=row["bucket"],
+                            video_id=row["video_id"],
+                            user_id=row["user_id"],
+                            user_key=row["user_id"] or 0,
+                            violation_type=row["violation_type"],
+                            count=row["total"],
+                            first_seen=row["first"],
+                            last_seen=row["last"],
+                        )
+                    )
+                    if len(batch) == batch_size:
+                        self.bulk_create(batch)
+                        written += len(batch)
+                        batch = []
+                self.bulk_create(batch)
+                written += len(batch)
+        return written
+
+
+class DRMViolationRollup(models.Model):
+    """
+    DRM violations counted per hour and per day for each video, viewer and
+    violation type, kept up to date as events are ingested so the admin
+    does not have to aggregate the raw log.
+    """
+
+    HOUR = "hour"
+    DAY = "day"
+    PERIOD_CHOICES = (
+        (HOUR, _("Hourly")),
+        (DAY, _("Daily")),
+    )
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateTimeField()
+    video = models.ForeignKey(
+        UploadVideo, on_delete=models.CASCADE, related_name="drm_rollups"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="drm_rollups",
+    )
+    # user_id, or 0 for anonymous viewers: NULLs are distinct in unique keys
+    # and partial constraints are ignored by MySQL
+    user_key = models.PositiveIntegerField(default=0, editable=False)
+    violation_type = models.CharField(
+        max_length=50, choices=VideoDRMLog.VIOLATION_TYPE_CHOICES
+    )
+    count = models.PositiveIntegerField(default=0)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    objects = DRMViolationRollupManager()
+
+    class Meta:
+        ordering = ["-period_start", "-count"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "period",
+                    "period_start",
+                    "video",
+                    "user_key",
+                    "violation_type",
+                ],
+                name="unique_drm_rollup",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["period", "-period_start"], name="course_drmrollup_period"
+            ),
+        ]
+
+    def __str__(self):
+        user_info = self.user.username if self.user else "Anonymous"
+        return (
+            f"{self.get_violation_type_display()}: {user_info} on {self.video.title} "
+            f"x{self.count} ({self.period} of {self.period_start:%Y-%m-%d %H:%M})"
+        )
@@ -0,0 +1,548 @@
+"""
+Write-behind buffer for video progress heartbeats.
+
+The video player reports its position every few seconds. Instead of
+writing a VideoProgress row per heartbeat, heartbeats are coalesced in
+memory per (student, video) and flushed to the database in periodic
+bulk batches.
+
+Every worker process keeps its own buffer, and the heartbeats of one
+player are spread across them. A worker remembers the first and latest
+position it saw since its last flush, and adds up the forward movement
+from one sample to the next as they arrive, so a rewind between flushes
+does not cancel the time watched before it. On flush the step up to the
+first sample is measured against the locked row's ``last_position``
+instead, and samples older than the row's ``last_watched`` (another
+worker flushed a newer one) are left out, so no span is counted twice.
+A new row starts at the first heartbeat's position with no watch time,
+as the unbuffered view did.
+
+Besides the flushes heartbeats trigger, a daemon thread per process
+flushes every ``VIDEO_PROGRESS_FLUSH_INTERVAL`` seconds, so a buffered
+sample reaches the database within one interval even when its worker
+receives no further heartbeats. With ``VIDEO_PROGRESS_FLUSH_ASYNC`` off
+(tests) there is no thread and samples wait for the next heartbeat.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from accounts.models import User
+from core.activity import log_activities
+from core.models import ActivityLog
+
+from .models import CourseProgressSummary, UploadVideo, VideoProgress
+
+logger = logging.getLogger(__name__)
+
+# Fields written back to VideoProgress on every flush
+PROGRESS_FIELDS = [
+    "watch_time",
+    "total_duration",
+    "last_position",
+    "is_completed",
+    "completion_percentage",
+    "completed_at",
+    "last_watched",
+]
+
+# Entries that have been flushed and not touched for this long are dropped
+IDLE_ENTRY_TTL = 600
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_entries = {}
+# Number of dirty entries, so heartbeats need not scan the buffer
+_dirty_count = 0
+_last_flush = time.monotonic()
+_thread = None
+_pid = None
+
+
+def get_flush_interval():
+    return getattr(settings, "VIDEO_PROGRESS_FLUSH_INTERVAL", 30)
+
+
+def get_flush_batch_size():
+    return getattr(settings, "VIDEO_PROGRESS_FLUSH_BATCH_SIZE", 500)
+
+
+def is_async():
+    return getattr(settings, "VIDEO_PROGRESS_FLUSH_ASYNC", True)
+
+
+class ProgressEntry:
+    """Coalesced progress of one student on one video since the last flush"""
+
+    def __init__(self, base):
+        # Last known database state of the VideoProgress row
+        self.base = base
+        self.position = base["last_position"]
+        self.duration = base["total_duration"]
+        # First sample since the last flush, and the forward movement after it
+        self.first_position = None
+        self.watched = 0
+        self.sampled_at = None
+        self.dirty = False
+        self.touched = time.monotonic()
+
+    def add_sample(self, current_time, duration):
+        if self.base["last_position"] is None:
+            # No row yet: it starts at the first heartbeat, without watch time
+            self.base = dict(self.base, last_position=current_time)
+        if self.first_position is None:
+            self.first_position = current_time
+        else:
+            # Only count watch time when moving forward
+            self.watched += max(current_time - self.position, 0)
+        self.position = current_time
+        self.duration = max(self.duration, duration)
+        self.sampled_at = timezone.now()
+        self.touched = time.monotonic()
+
+    def snapshot(self):
+        """Progress as it will look once the pending samples are flushed"""
+        watched = self.watched
+        if self.first_position is not None:
+            watched += max(self.first_position - self.base["last_position"], 0)
+        progress = VideoProgress(
+            watch_time=self.base["watch_time"] + watched,
+            total_duration=max(self.base["total_duration"], self.duration),
+            last_position=self.position,
+            is_completed=self.base["is_completed"],
+            completion_percentage=self.base["completion_percentage"],
+        )
+        progress.refresh_completion()
+        return progress
+
+
+def _load_bases(student_id, video_ids):
+    """
+    Last stored progress of a student for the given videos, keyed by video
+    id. Videos that do not exist are left out.
+    """
+    bases = {
+        row.pop("video_id"): row
+        for row in VideoProgress.objects.filter(
+            student_id=student_id, video_id__in=video_ids
+        ).values(
+            "video_id",
+            "watch_time",
+            "total_duration",
+            "last_position",
+            "is_completed",
+            "completion_percentage",
+        )
+    }
+    unseen = set(video_ids) - set(bases)
+    if unseen:
+        for video_id in UploadVideo.objects.filter(id__in=unseen).values_list(
+            "id", flat=True
+        ):
+            # last_position is set by the first sample, see ProgressEntry
+            bases[video_id] = {
+                "watch_time": 0,
+                "total_duration": 0,
+                "last_position": None,
+                "is_completed": False,
+                "completion_percentage": 0.0,
+            }
+    return bases
+
+
+def _mark_dirty(entry):
+    """Flag an entry for the next flush; the caller holds _lock"""
+    global _dirty_count
+
+    if not entry.dirty:
+        entry.dirty = True
+        _dirty_count += 1
+
+
+def clear():
+    """Drop every buffered entry without writing it"""
+    global _dirty_count
+
+    with _lock:
+        _entries.clear()
+        _dirty_count = 0
+
+
+def _get_entries(student_id, video_ids):
+    with _lock:
+        entries = {
+            video_id: _entries[(student_id, video_id)]
+            for video_id in video_ids
+            if (student_id, video_id) in _entries
+        }
+
+    missing = [video_id for video_id in video_ids if video_id not in entries]
+    if missing:
+        bases = _load_bases(student_id, missing)
+        with _lock:
+            for video_id, base in bases.items():
+                entries[video_id] = _entries.setdefault(
+                    (student_id, video_id), ProgressEntry(base)
+                )
+    return entries
+
+
+def record_heartbeat(student_id, video_id, current_time, duration):
+    """
+    Buffer a progress sample and return the provisional VideoProgress
+    (unsaved) reflecting it. Raises UploadVideo.DoesNotExist for unknown
+    videos.
+    """
+    entry = _get_entries(student_id, [video_id]).get(video_id)
+    if entry is None:
+        raise UploadVideo.DoesNotExist
+
+    with _lock:
+        entry.add_sample(current_time, duration)
+        _mark_dirty(entry)
+        progress = entry.snapshot()
+
+    if is_async():
+        _start_flusher()
+    maybe_flush()
+    return progress
+
+
+def record_samples(student_id, samples):
+    """
+    Apply a batch of (video_id, current_time, duration) samples, in the
+    order given, and write them straight away in a single flush.
+
+    Returns a dict mapping video id to its updated (unsaved) VideoProgress.
+    Samples for unknown videos are skipped.
+    """
+    entries = _get_entries(student_id, list({sample[0] for sample in samples}))
+
+    with _lock:
+        for video_id, current_time, duration in samples:
+            if video_id in entries:
+                entries[video_id].add_sample(current_time, duration)
+                _mark_dirty(entries[video_id])
+        snapshots = {
+            video_id: entry.snapshot() for video_id, entry in entries.items()
+        }
+
+    flush(keys=[(student_id, video_id) for video_id in entries])
+    return snapshots
+
+
+def _start_flusher():
+    """Start this process's periodic flush thread unless it is running"""
+    global _thread, _pid
+
+    if get_flush_interval() <= 0:
+        # Every heartbeat flushes already
+        return
+    with _lock:
+        # A forked worker inherits the buffer but not the thread
+        if _pid != os.getpid() or _thread is None or not _thread.is_alive():
+            _pid = os.getpid()
+            _thread = threading.Thread(
+                target=_run, name="video-progress-flush", daemon=True
+            )
+            _thread.start()
+
+
+def _run():
+    while True:
+        time.sleep(get_flush_interval())
+        try:
+            flush()
+        except Exception:
+            logger.exception("Could not flush buffered video progress")
+        finally:
+            close_old_connections()
+
+
+def maybe_flush():
+    """Flush the buffer when the interval has elapsed or it grew too large"""
+    with _lock:
+        dirty = _dirty_count
+        due = time.monotonic() - _last_flush >= get_flush_interval()
+
+    if dirty and (due or dirty >= get_flush_batch_size()):
+        flush()
+
+
+def flush(keys=None):
+    """
+    Write pending heartbeats to the database. When ``keys`` is given only
+    those (student_id, video_id) pairs are flushed. Returns the number of
+    progress rows written.
+    """
+    global _dirty_count, _last_flush
+
+    # Only one thread writes at a time, the others keep buffering
+    if not _flush_lock.acquire(blocking=keys is not None):
+        return 0
+
+    try:
+        updates = {}
+        with _lock:
+            if keys is None:
+                _last_flush = time.monotonic()
+                candidates = list(_entries.items())
+            else:
+                candidates = [(key, _entries[key]) for key in keys if key in _entries]
+
+            for key, entry in candidates:
+                if entry.dirty:
+                    updates[key] = (
+                        entry.position,
+                        entry.duration,
+                        entry.sampled_at,
+                        entry.first_position,
+                        entry.watched,
+                    )
+                    entry.first_position = None
+                    entry.watched = 0
+                    entry.dirty = False
+            if keys is None:
+                # Every entry was looked at, so the count is exact again
+                _dirty_count = 0
+            else:
+                _dirty_count -= len(updates)
+            _evict_idle_entries()
+
+        if not updates:
+            return 0
+
+        written = []
+        items = list(updates.items())
+        batch_size = get_flush_batch_size()
+        for start in range(0, len(items), batch_size):
+            batch = dict(items[start : start + batch_size])
+            try:
+                written.extend(apply_progress_updates(batch))
+            except Exception:
+                logger.exception("Could not flush buffered video progress")
+                _requeue(batch)
+
+        with _lock:
+            for progress in written:
+                entry = _entries.get((progress.student_id, progress.video_id))
+                if entry is not None:
+                    entry.base = {
+                        field: getattr(progress, field)
+                        for field in (
+                            "watch_time",
+                            "total_duration",
+                            "last_position",
+                            "is_completed",
+                            "completion_percentage",
+                        )
+                    }
+        return len(written)
+    finally:
+        _flush_lock.release()
+
+
+def flush_student(student_id):
+    """Flush every buffered entry of one student"""
+    with _lock:
+        keys = [key for key in _entries if key[0] == student_id]
+    return flush(keys=keys) if keys else 0
+
+
+def _requeue(updates):
+    """Mark the entries of a failed flush so the next flush retries them"""
+    with _lock:
+        for key, (position, duration, _sampled_at, first, watched) in updates.items():
+            entry = _entries.get(key)
+            if entry is not None:
+                # A newer sample, if any, has replaced the position already
+                entry.duration = max(entry.duration, duration)
+                if entry.first_position is not None:
+                    watched += max(entry.first_position - position, 0)
+                entry.first_position = first
+                entry.watched += watched
+                _mark_dirty(entry)
+
+
+def _evict_idle_entries():
+    cutoff = time.monotonic() - IDLE_ENTRY_TTL
+    for key in [
+        key
+        for key, entry in _entries.items()
+        if not entry.dirty and entry.touched < cutoff
+    ]:
+        del _entries[key]
+
+
+def apply_progress_updates(updates, retry=True):
+    """
+    Apply coalesced samples to VideoProgress rows in one transaction.
+
+    ``updates`` maps (student_id, video_id) to a tuple of
+    (last_position, duration, sampled_at, first, watched), where ``first``
+    is the first buffered position and ``watched`` the forward movement
+    from it to ``last_position``. A row created by this flush starts at
+    ``first``. Returns the written rows.
+    """
+    now = timezone.now()
+    started = []
+    completed = []
+    watched = {}
+
+    with transaction.atomic():
+        student_ids = {student_id for student_id, _ in updates}
+        video_ids = {video_id for _, video_id in updates}
+        existing = {
+            (progress.student_id, progress.video_id): progress
+            for progress in VideoProgress.objects.select_for_update().filter(
+                student_id__in=student_ids, video_id__in=video_ids
+            )
+            if (progress.student_id, progress.video_id) in updates
+        }
+
+        new_keys = [key for key in updates if key not in existing]
+        valid_video_ids = valid_student_ids = set()
+        if new_keys:
+            valid_video_ids = set(
+                UploadVideo.objects.filter(
+                    id__in={video_id for _, video_id in new_keys}
+                ).values_list("id", flat=True)
+            )
+            valid_student_ids = set(
+                User.objects.filter(
+                    id__in={student_id for student_id, _ in new_keys}
+                ).values_list("id", flat=True)
+            )
+
+        new_rows = []
+        for key in new_keys:
+            student_id, video_id = key
+            if video_id not in valid_video_ids or student_id not in valid_student_ids:
+                # Deleted while its heartbeats were buffered
+                continue
+            position, duration, sampled_at, _first, watched[key] = updates[key]
+            progress = VideoProgress(
+                student_id=student_id,
+                video_id=video_id,
+                watch_time=watched[key],
+                total_duration=duration,
+                last_position=position,
+                first_watched=now,
+                last_watched=sampled_at or now,
+            )
+            if progress.refresh_completion():
+                completed.append(progress)
+            started.append(progress)
+            new_rows.append(progress)
+
+        try:
+            with transaction.atomic():
+                VideoProgress.objects.bulk_create(new_rows)
+        except IntegrityError:
+            if not retry:
+                raise
+            # Another process created some of these rows in the meantime;
+            # retry them as updates against the rows it wrote.
+            return apply_progress_updates(updates, retry=False)
+
+        for key, progress in existing.items():
+            position, duration, sampled_at, first, forward = updates[key]
+            sampled_at = sampled_at or now
+            progress.total_duration = max(progress.total_duration, duration)
+            if progress.last_watched and sampled_at <= progress.last_watched:
+                # Another worker already wrote a newer sample
+                watched[key] = 0
+            else:
+                watched[key] = forward + max(first - progress.last_position, 0)
+                progress.watch_time += watched[key]
+                progress.last_position = position
+                progress.last_watched = sampled_at
+            if progress.refresh_completion():
+                completed.append(progress)
+
+        VideoProgress.objects.bulk_update(existing.values(), PROGRESS_FIELDS)
+
+        if started or completed:
+            log_progress_events(started, completed)
+
+        written = new_rows + list(existing.values())
+        update_course_summaries(watched, written, started, completed)
+
+    return written
+
+
+def update_course_summaries(watched, written, started, completed):
+    """
+    Fold the written progress into the per-course summaries. ``watched``
+    maps (student_id, video_id) to the seconds added to each row.
+    """
+    if not written:
+        return
+
+    course_ids = dict(
+        UploadVideo.objects.filter(id__in={p.video_id for p in written}).values_list(
+            "id", "course_id"
+        )
+    )
+    started = {id(p) for p in started}
+    completed = {id(p) for p in completed}
+
+    deltas = {}
+    for progress in written:
+        key = (progress.student_id, course_ids[progress.video_id])
+        watch_time, started_count, completed_count = deltas.get(key, (0, 0, 0))
+        deltas[key] = (
+            watch_time + watched[(progress.student_id, progress.video_id)],
+            started_count + (id(progress) in started),
+            completed_count + (id(progress) in completed),
+        )
+    CourseProgressSummary.objects.apply_deltas(deltas)
+
+
+def log_progress_events(started, completed):
+    """Write the activity log entries the per-row post_save signal used to"""
+    rows = started + completed
+    usernames = dict(
+        User.objects.filter(id__in={p.student_id for p in rows}).values_list(
+            "id", "username"
+        )
+    )
+    titles = dict(
+        UploadVideo.objects.filter(id__in={p.video_id for p in rows}).values_list(
+            "id", "title"
+        )
+    )
+
+    log_activities(
+        [
+            _(
+                f"Student '{usernames.get(p.student_id)}' started watching '{titles.get(p.video_id)}'."
+            )
+            for p in started
+        ]
+        + [
+            _(
+                f"Student '{usernames.get(p.student_id)}' completed watching '{titles.get(p.video_id)}'."
+            )
+            for p in completed
+        ],
+        category=ActivityLog.PROGRESS,
+    )
+
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Could not flush buffered video progress on shutdown")
+
+
+atexit.register(_flush_at_exit)
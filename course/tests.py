@@ -1,2 +1,677 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Student
+from core.models import ActivityLog
+from notifications.models import Notification
+
+from . import drm_ingest, progress_buffer
+from .models import (
+    Course,
+    CourseProgressSummary,
+    DRMViolationRollup,
+    Program,
+    UploadVideo,
+    VideoDRMLog,
+    VideoProgress,
+)
+
+User = get_user_model()
+
+
+class CourseTestMixin:
+    """A student and a course with ``video_count`` videos, on clean caches"""
+
+    video_count = 1
+
+    def setUp(self):
+        cache.clear()
+        progress_buffer.clear()
+        self.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="password",
+            is_student=True,
+        )
+        program = Program.objects.create(title="AI Bootcamp")
+        self.course = Course.objects.create(title="ML", code="ML101", program=program)
+        self.videos = [self.add_video(i) for i in range(self.video_count)]
+        self.video = self.videos[0] if self.videos else None
+
+    def tearDown(self):
+        cache.clear()
+        progress_buffer.clear()
+
+    def add_video(self, i):
+        return UploadVideo.objects.create(
+            title=f"Lecture {i}",
+            course=self.course,
+            youtube_url="https://youtu.be/abcdefghijk",
+        )
+
+
+class VideoProgressBufferTests(CourseTestMixin, TestCase):
+    def test_dirty_entries_are_counted(self):
+        with self.settings(VIDEO_PROGRESS_FLUSH_INTERVAL=3600):
+            for video in [self.video, self.add_video(1)]:
+                progress_buffer.record_heartbeat(self.student.id, video.id, 10, 100)
+                progress_buffer.record_heartbeat(self.student.id, video.id, 20, 100)
+            self.assertEqual(progress_buffer._dirty_count, 2)
+
+            progress_buffer.flush_student(self.student.id)
+            self.assertEqual(progress_buffer._dirty_count, 0)
+
+        with self.settings(
+            VIDEO_PROGRESS_FLUSH_INTERVAL=3600, VIDEO_PROGRESS_FLUSH_BATCH_SIZE=1
+        ):
+            progress_buffer.record_heartbeat(self.student.id, self.video.id, 30, 100)
+        # Reaching the batch size flushed straight away
+        self.assertEqual(progress_buffer._dirty_count, 0)
+        row = VideoProgress.objects.get(student=self.student, video=self.video)
+        self.assertEqual(row.last_position, 30)
+
+    def test_heartbeats_are_coalesced_until_flush(self):
+        with self.settings(VIDEO_PROGRESS_FLUSH_INTERVAL=3600):
+            progress_buffer.record_heartbeat(self.student.id, self.video.id, 10, 100)
+            with self.assertNumQueries(0):
+                progress = progress_buffer.record_heartbeat(
+                    self.student.id, self.video.id, 40, 100
+                )
+
+        # Watch time counts from the first heartbeat
+        self.assertEqual(progress.watch_time, 30)
+        self.assertFalse(VideoProgress.objects.exists())
+
+        self.assertEqual(progress_buffer.flush(), 1)
+        row = VideoProgress.objects.get(student=self.student, video=self.video)
+        self.assertEqual(row.watch_time, 30)
+        self.assertEqual(row.last_position, 40)
+        self.assertEqual(row.total_duration, 100)
+
+    def test_completion_is_logged_once(self):
+        with self.settings(VIDEO_PROGRESS_FLUSH_INTERVAL=3600):
+            progress_buffer.record_heartbeat(self.student.id, self.video.id, 0, 100)
+            progress_buffer.flush()
+            progress_buffer.record_heartbeat(self.student.id, self.video.id, 95, 100)
+            progress_buffer.flush()
+            progress_buffer.record_heartbeat(self.student.id, self.video.id, 100, 100)
+            progress_buffer.flush()
+
+        row = VideoProgress.objects.get(student=self.student, video=self.video)
+        self.assertTrue(row.is_completed)
+        self.assertIsNotNone(row.completed_at)
+        self.assertEqual(
+            ActivityLog.objects.filter(message__contains="completed watching").count(),
+            1,
+        )
+
+    def test_workers_do_not_count_the_same_span_twice(self):
+        key = (self.student.id, self.video.id)
+        start = timezone.now()
+        # Two workers saw alternate heartbeats of one player
+        progress_buffer.apply_progress_updates({key: (20, 100, start, 0, 20)})
+        progress_buffer.apply_progress_updates(
+            {key: (40, 100, start + timedelta(seconds=20), 30, 10)}
+        )
+        # A slower worker flushes an older sample after the newer one
+        progress_buffer.apply_progress_updates(
+            {key: (30, 100, start + timedelta(seconds=10), 10, 20)}
+        )
+
+        row = VideoProgress.objects.get(student=self.student, video=self.video)
+        self.assertEqual((row.watch_time, row.last_position), (40, 40))
+        summary = CourseProgressSummary.objects.get(student=self.student)
+        self.assertEqual(summary.watch_time, 40)
+
+    def test_rewind_within_a_batch_keeps_watch_time(self):
+        progress_buffer.record_samples(self.student.id, [(self.video.id, 0, 100)])
+        snapshots = progress_buffer.record_samples(
+            self.student.id,
+            [
+                (self.video.id, 30, 100),
+                (self.video.id, 55, 100),
+                (self.video.id, 5, 100),
+            ],
+        )
+
+        self.assertEqual(snapshots[self.video.id].watch_time, 55)
+        row = VideoProgress.objects.get(student=self.student, video=self.video)
+        self.assertEqual((row.watch_time, row.last_position), (55, 5))
+        summary = CourseProgressSummary.objects.get(student=self.student)
+        self.assertEqual(summary.watch_time, 55)
+
+    def test_first_heartbeat_after_seeking_is_not_watch_time(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            progress_buffer.record_samples(self.student.id, [(self.video.id, 95, 100)])
+
+        row = VideoProgress.objects.get(student=self.student, video=self.video)
+        self.assertEqual((row.watch_time, row.last_position), (0, 95))
+        self.assertFalse(row.is_completed)
+        self.assertFalse(
+            ActivityLog.objects.filter(message__contains="completed watching").exists()
+        )
+
+    @override_settings(VIDEO_PROGRESS_FLUSH_ASYNC=True, VIDEO_PROGRESS_FLUSH_INTERVAL=5)
+    def test_idle_worker_flushes_within_one_interval(self):
+        self.addCleanup(setattr, progress_buffer, "_thread", None)
+        with mock.patch.object(progress_buffer.threading, "Thread") as thread:
+            thread.return_value.is_alive.return_value = True
+            progress_buffer.record_heartbeat(self.student.id, self.video.id, 10, 100)
+            progress_buffer.record_heartbeat(self.student.id, self.video.id, 20, 100)
+        thread.assert_called_once()
+        self.assertFalse(VideoProgress.objects.exists())
+
+        # The flush thread sleeps one interval, then flushes what is buffered
+        with mock.patch.object(
+            progress_buffer.time, "sleep", side_effect=[None, SystemExit]
+        ) as sleep, mock.patch.object(progress_buffer, "close_old_connections"):
+            with self.assertRaises(SystemExit):
+                progress_buffer._run()
+        sleep.assert_called_with(5)
+        row = VideoProgress.objects.get(student=self.student, video=self.video)
+        self.assertEqual(row.last_position, 20)
+
+    def test_update_view_buffers_heartbeat(self):
+        self.client.force_login(self.student)
+        with self.settings(VIDEO_PROGRESS_FLUSH_INTERVAL=3600):
+            response = self.client.post(
+                reverse("update_video_progress"),
+                json.dumps(
+                    {"video_id": self.video.id, "current_time": 30, "duration": 60}
+                ),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["progress"]["watch_time"], 0)
+        self.assertFalse(VideoProgress.objects.exists())
+
+        response = self.client.get(
+            reverse("get_video_progress", kwargs={"video_id": self.video.id})
+        )
+        self.assertEqual(response.json()["progress"]["last_position"], 30)
+
+    def test_update_view_unknown_video(self):
+        self.client.force_login(self.student)
+        response = self.client.post(
+            reverse("update_video_progress"),
+            json.dumps({"video_id": 9999, "current_time": 30, "duration": 60}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class VideoProgressBatchTests(CourseTestMixin, TestCase):
+    video_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+
+    def post_samples(self, samples):
+        return self.client.post(
+            reverse("update_video_progress_batch"),
+            json.dumps({"samples": samples}),
+            content_type="application/json",
+        )
+
+    def test_batch_is_applied_in_sequence_order(self):
+        first, second = self.videos
+        response = self.post_samples(
+            [
+                {"video_id": first.id, "current_time": 20, "duration": 100, "seq": 2},
+                {"video_id": first.id, "current_time": 10, "duration": 100, "seq": 1},
+                {"video_id": second.id, "current_time": 5, "duration": 50, "seq": 3},
+                {"video_id": 9999, "current_time": 5, "duration": 50, "seq": 4},
+                {"current_time": 5},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["accepted"], 3)
+        self.assertEqual(response.json()["rejected"], 2)
+        rows = {
+            p.video_id: p for p in VideoProgress.objects.filter(student=self.student)
+        }
+        # Counted from the first sample in sequence order
+        self.assertEqual(rows[first.id].watch_time, 10)
+        self.assertEqual(rows[first.id].last_position, 20)
+        self.assertEqual(rows[second.id].watch_time, 0)
+
+    def test_replayed_batch_does_not_double_count(self):
+        samples = [
+            {"video_id": self.videos[0].id, "current_time": 0, "duration": 60},
+            {"video_id": self.videos[0].id, "current_time": 30, "duration": 60},
+        ]
+        self.post_samples(samples)
+        self.post_samples(samples)
+
+        row = VideoProgress.objects.get(student=self.student, video=self.videos[0])
+        self.assertEqual(row.watch_time, 30)
+
+    def test_rejects_empty_batch(self):
+        self.assertEqual(self.post_samples([]).status_code, 400)
+
+    def test_rejects_non_finite_and_negative_times(self):
+        video_id = self.videos[0].id
+        response = self.post_samples(
+            [
+                {"video_id": video_id, "current_time": float("inf"), "duration": 60},
+                {"video_id": video_id, "current_time": 10, "duration": float("nan")},
+                {"video_id": float("inf"), "current_time": 10, "duration": 60},
+                {"video_id": video_id, "current_time": -5, "duration": 60},
+                {"video_id": video_id, "current_time": 15, "duration": 60},
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["accepted"], 1)
+        self.assertEqual(response.json()["rejected"], 4)
+        row = VideoProgress.objects.get(student=self.student, video=self.videos[0])
+        self.assertEqual(row.last_position, 15)
+
+    def test_single_heartbeat_rejects_infinity(self):
+        response = self.client.post(
+            reverse("update_video_progress"),
+            json.dumps({"video_id": self.videos[0].id, "current_time": float("inf")}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CourseSingleQueryTests(CourseTestMixin, TestCase):
+    video_count = 0
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+
+    def add_videos(self, count):
+        for i in range(count):
+            video = self.add_video(i)
+            VideoProgress.objects.create(
+                student=self.student, video=video, watch_time=50, total_duration=100
+            )
+
+    def count_queries(self):
+        url = reverse("course_detail", kwargs={"slug": self.course.slug})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_videos(self):
+        self.add_videos(2)
+        baseline = self.count_queries()
+
+        self.add_videos(20)
+        self.assertEqual(self.count_queries(), baseline)
+
+    def test_progress_is_attached_to_videos(self):
+        self.add_videos(3)
+        response = self.client.get(
+            reverse("course_detail", kwargs={"slug": self.course.slug})
+        )
+        videos = response.context["videos"]
+        self.assertEqual(len(videos), 3)
+        self.assertTrue(all(video.progress.watch_time == 50 for video in videos))
+
+
+class CourseProgressSummaryTests(CourseTestMixin, TestCase):
+    video_count = 2
+
+    def watch(self, video, current_time, duration=100):
+        samples = [(video.id, current_time, duration)]
+        if not VideoProgress.objects.filter(student=self.student, video=video).exists():
+            # Playback of a new video starts at the beginning
+            samples.insert(0, (video.id, 0, duration))
+        with self.captureOnCommitCallbacks(execute=True):
+            progress_buffer.record_samples(self.student.id, samples)
+
+    def summary(self):
+        return CourseProgressSummary.objects.get(
+            student=self.student, course=self.course
+        )
+
+    def test_flush_updates_summary(self):
+        self.watch(self.videos[0], 30)
+        self.watch(self.videos[0], 50)
+        self.watch(self.videos[1], 20)
+
+        summary = self.summary()
+        self.assertEqual(summary.videos_total, 2)
+        self.assertEqual(summary.videos_started, 2)
+        self.assertEqual(summary.videos_completed, 0)
+        self.assertEqual(summary.watch_time, 70)
+
+    def test_course_completion_is_notified_once(self):
+        self.watch(self.videos[0], 100)
+        self.assertIsNone(self.summary().completed_at)
+
+        self.watch(self.videos[1], 100)
+        self.watch(self.videos[1], 100)
+
+        summary = self.summary()
+        self.assertEqual(summary.videos_completed, 2)
+        self.assertIsNotNone(summary.completed_at)
+        self.assertEqual(
+            Notification.objects.filter(
+                recipient=self.student, related_course=self.course
+            ).count(),
+            1,
+        )
+
+    def test_adding_and_removing_videos(self):
+        self.watch(self.videos[0], 100)
+        self.watch(self.videos[1], 10)
+        video = self.add_video(2)
+        self.assertEqual(self.summary().videos_total, 3)
+
+        self.videos[0].delete()
+        summary = self.summary()
+        self.assertEqual(summary.videos_total, 2)
+        self.assertEqual(summary.videos_completed, 0)
+        self.assertEqual(summary.watch_time, 10)
+
+        video.delete()
+        self.assertEqual(self.summary().videos_total, 1)
+
+    def test_saving_progress_applies_the_difference(self):
+        self.watch(self.videos[0], 30)
+        progress = VideoProgress.objects.get(student=self.student, video=self.videos[0])
+        progress.watch_time = 95
+
+        with CaptureQueriesContext(connection) as queries:
+            progress.save()
+
+        self.assertFalse(any("SUM(" in q["sql"] for q in queries.captured_queries))
+        summary = self.summary()
+        self.assertEqual(summary.watch_time, 95)
+        self.assertEqual(summary.videos_started, 1)
+        self.assertEqual(summary.videos_completed, 1)
+
+    def test_moving_a_video_resyncs_both_courses(self):
+        self.watch(self.videos[0], 100)
+        self.watch(self.videos[1], 10)
+        other = Course.objects.create(
+            title="NLP", code="NLP101", program=self.course.program
+        )
+
+        video = UploadVideo.objects.get(pk=self.videos[0].pk)
+        video.course = other
+        video.save()
+
+        summary = self.summary()
+        self.assertEqual(summary.videos_total, 1)
+        self.assertEqual(summary.videos_completed, 0)
+        self.assertEqual(summary.watch_time, 10)
+        moved = CourseProgressSummary.objects.get(student=self.student, course=other)
+        self.assertEqual(moved.videos_total, 1)
+        self.assertEqual(moved.videos_completed, 1)
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.watch(self.videos[0], 95)
+        self.watch(self.videos[1], 40)
+        expected = self.summary()
+
+        CourseProgressSummary.objects.all().delete()
+        CourseProgressSummary.objects.rebuild()
+
+        summary = self.summary()
+        self.assertEqual(summary.videos_started, expected.videos_started)
+        self.assertEqual(summary.videos_completed, expected.videos_completed)
+        self.assertEqual(summary.watch_time, expected.watch_time)
+
+    def test_dashboard_reads_summaries(self):
+        Student.objects.get_or_create(student=self.student)
+        self.watch(self.videos[0], 100)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse("student_progress_dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        course_progress = response.context["course_progress"][self.course.title]
+        self.assertEqual(course_progress["completed"], 1)
+        self.assertEqual(course_progress["total"], 2)
+        self.assertEqual(course_progress["completion_percentage"], 50)
+
+    def test_dashboard_shows_watch_hours_with_one_decimal(self):
+        Student.objects.get_or_create(student=self.student)
+        self.watch(self.videos[0], 50)
+        CourseProgressSummary.objects.update(watch_time=5400)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse("student_progress_dashboard"))
+
+        self.assertContains(response, "1.5h", count=2)
+
+
+class DRMEventIngestTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.student)
+
+    def violation(self, violation_type="DevTools opened", **extra):
+        return dict(
+            log_type="violation",
+            video_id=self.video.id,
+            violation_type=violation_type,
+            **extra,
+        )
+
+    def post_events(self, events):
+        return self.client.post(
+            reverse("log_drm_event"), {"events": json.dumps(events)}
+        )
+
+    def test_batch_is_stored_with_one_insert(self):
+        events = [
+            {"log_type": "access", "video_id": self.video.id},
+            self.violation(),
+            self.violation("Screen recording detected"),
+            {"log_type": "access", "video_id": 9999},
+            {"log_type": "bogus", "video_id": self.video.id},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post_events(events)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["stored"], data["rejected"]), (3, 2))
+        inserts = [
+            query
+            for query in queries
+            if query["sql"].startswith('INSERT INTO "course_videodrmlog"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            set(VideoDRMLog.objects.values_list("violation_type", flat=True)),
+            {None, "devtools_open", "screen_recording"},
+        )
+
+    def test_repeated_violations_are_counted_on_one_row(self):
+        self.post_events([self.violation(), self.violation()])
+        response = self.post_events([self.violation()])
+
+        self.assertEqual(response.json()["deduplicated"], 1)
+        log = VideoDRMLog.objects.get()
+        self.assertEqual(log.occurrences, 3)
+        self.assertEqual(log.user, self.student)
+        self.assertEqual(
+            ActivityLog.objects.filter(category=ActivityLog.DRM).count(), 1
+        )
+
+    @override_settings(DRM_DEDUPE_WINDOW=0)
+    def test_no_deduplication_across_batches_without_window(self):
+        self.post_events([self.violation()])
+        self.post_events([self.violation()])
+
+        self.assertEqual(VideoDRMLog.objects.count(), 2)
+
+    @override_settings(DRM_EVENTS_PER_MINUTE=3)
+    def test_events_over_rate_limit_are_throttled(self):
+        first = self.post_events(
+            [
+                self.violation("DevTools opened"),
+                self.violation("Screen recording detected"),
+            ]
+        ).json()
+        second = self.post_events(
+            [
+                self.violation("Video source tampering attempt"),
+                self.violation("other"),
+            ]
+        ).json()
+
+        self.assertEqual((first["stored"], first["throttled"]), (2, 0))
+        self.assertEqual((second["stored"], second["throttled"]), (1, 1))
+        self.assertEqual(drm_ingest.take_allowance("session:other", 2), 2)
+
+    def test_legacy_single_event(self):
+        response = self.client.post(
+            reverse("log_drm_event"),
+            {
+                "log_type": "violation",
+                "data": json.dumps(self.violation("Unknown thing", platform="Linux")),
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        log = VideoDRMLog.objects.get()
+        self.assertEqual((log.violation_type, log.platform), ("other", "Linux"))
+
+    def test_rejects_invalid_batches(self):
+        self.assertEqual(self.post_events([]).status_code, 400)
+        self.assertEqual(
+            self.client.post(reverse("log_drm_event"), {"events": "{"}).status_code,
+            400,
+        )
+        with override_settings(DRM_MAX_BATCH_EVENTS=1):
+            response = self.post_events([self.violation(), self.violation()])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(VideoDRMLog.objects.exists())
+
+    def test_malformed_event_fields_are_skipped(self):
+        response = self.post_events(
+            [
+                {"log_type": ["violation"], "video_id": self.video.id},
+                self.violation(["DevTools opened"]),
+                {"log_type": "access", "video_id": 1e400},
+                "not an event",
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["stored"], data["rejected"]), (1, 3))
+        self.assertEqual(VideoDRMLog.objects.get().violation_type, "other")
+
+    def test_legacy_single_event_with_invalid_data_is_rejected(self):
+        for log_type, data in [("access", '"text"'), ("access", "[1, 2]")]:
+            response = self.client.post(
+                reverse("log_drm_event"), {"log_type": log_type, "data": data}
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(VideoDRMLog.objects.exists())
+
+
+class DRMViolationRollupTests(CourseTestMixin, TestCase):
+    def ingest(self, *violation_types, user=None, identity="session:a"):
+        events = [
+            drm_ingest.parse_event(
+                "violation", {"video_id": self.video.id, "violation_type": name}
+            )
+            for name in violation_types
+        ]
+        return drm_ingest.ingest(events, user, identity)
+
+    def rollups(self, period):
+        return {
+            (rollup.user_id, rollup.violation_type): rollup.count
+            for rollup in DRMViolationRollup.objects.filter(period=period)
+        }
+
+    def test_ingest_updates_hourly_and_daily_rollups(self):
+        self.ingest("DevTools opened", "DevTools opened", user=self.student)
+        self.ingest("DevTools opened", "other", user=self.student)
+        self.ingest("other", identity="session:b")
+
+        expected = {
+            (self.student.id, "devtools_open"): 3,
+            (self.student.id, "other"): 1,
+            (None, "other"): 1,
+        }
+        self.assertEqual(self.rollups(DRMViolationRollup.HOUR), expected)
+        self.assertEqual(self.rollups(DRMViolationRollup.DAY), expected)
+
+    def test_concurrent_adds_share_one_rollup(self):
+        now = timezone.now()
+        key = (self.video.id, None, "other")
+        DRMViolationRollup.objects.add({key: 1}, now)
+        real_add = DRMViolationRollup.objects._add
+        calls = []
+
+        def stale_first_look(rollup, count, when):
+            # Another request creates the row between the update and insert
+            calls.append(count)
+            return 0 if len(calls) % 2 else real_add(rollup, count, when)
+
+        with mock.patch.object(
+            DRMViolationRollup.objects, "_add", side_effect=stale_first_look
+        ):
+            DRMViolationRollup.objects.add({key: 2}, now)
+
+        self.assertEqual(self.rollups(DRMViolationRollup.HOUR), {(None, "other"): 3})
+        self.assertEqual(self.rollups(DRMViolationRollup.DAY), {(None, "other"): 3})
+
+    def test_access_events_are_not_rolled_up(self):
+        drm_ingest.ingest(
+            [drm_ingest.parse_event("access", {"video_id": self.video.id})]
+        )
+        self.assertFalse(DRMViolationRollup.objects.exists())
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.ingest("DevTools opened", "DevTools opened", user=self.student)
+        self.ingest("other", identity="session:b")
+        expected = self.rollups(DRMViolationRollup.DAY)
+
+        DRMViolationRollup.objects.all().delete()
+        call_command("rebuild_drm_rollups", days=1, stdout=StringIO())
+
+        self.assertEqual(self.rollups(DRMViolationRollup.DAY), expected)
+        self.assertEqual(self.rollups(DRMViolationRollup.HOUR), expected)
+
+    def test_raw_log_admin_defaults_to_recent_rows(self):
+        self.ingest("DevTools opened")
+        old = VideoDRMLog.objects.create(video=self.video, log_type="access")
+        VideoDRMLog.objects.filter(pk=old.pk).update(
+            timestamp=timezone.now() - timedelta(days=3)
+        )
+        admin_user = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        self.client.force_login(admin_user)
+        url = reverse("admin:course_videodrmlog_changelist")
+
+        response = self.client.get(url)
+        self.assertEqual(response.context["cl"].result_count, 1)
+        response = self.client.get(url, {"recent": "all"})
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+        response = self.client.get(
+            reverse("admin:course_drmviolationrollup_changelist")
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context["violation_totals"]),
+            [{"violation_type": "devtools_open", "total": 1, "viewers": 0}],
+        )
@@ -25,6 +25,7 @@ from .views import (
     course_drop,
     user_course_list,
     update_video_progress,
+    update_video_progress_batch,
     get_video_progress,
     student_progress_dashboard,
     log_drm_event,
@@ -104,6 +105,11 @@ urlpatterns = [
         update_video_progress,
         name="update_video_progress",
     ),
+    path(
+        "api/video/progress/batch/",
+        update_video_progress_batch,
+        name="update_video_progress_batch",
+    ),
     path(
         "api/video/<int:video_id>/progress/",
         get_video_progress,
@@ -8,12 +8,14 @@ from django.utils.decorators import method_decorator
 from django.views.generic import CreateView
 from django_filters.views import FilterView
 import json
+import math
 
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from .models import VideoProgress
+from . import drm_ingest, progress_buffer
+from .models import CourseProgressSummary, VideoProgress
 
 from accounts.decorators import lecturer_required, student_required
 from accounts.models import Student, User
@@ -136,27 +138,29 @@ def program_delete(request, pk):
 # ########################################################
 @login_required
 def course_single(request, slug):
-    course = Course.objects.get(slug=slug)
-    files = Upload.objects.filter(course__slug=slug)
-    videos = list(UploadVideo.objects.filter(course__slug=slug))
+    course = get_object_or_404(Course.objects.select_related("program"), slug=slug)
+    files = course.upload_set.all()
+    # Fetched through the reverse relation so video.course needs no query
+    videos = list(course.uploadvideo_set.all())
 
     # lecturers = User.objects.filter(allocated_lecturer__pk=course.id)
     lecturers = CourseAllocation.objects.filter(courses__pk=course.id)
 
-    # Annotate each video with student's progress
+    # Annotate each video with student's progress, fetched in a single query
     if (
         request.user.is_authenticated
         and hasattr(request.user, "is_student")
         and request.user.is_student
     ):
-        from .models import VideoProgress
-
+        progress_buffer.flush_student(request.user.id)
+        progress_by_video = {
+            progress.video_id: progress
+            for progress in VideoProgress.objects.filter(
+                student=request.user, video__course=course
+            )
+        }
         for video in videos:
-            try:
-                progress = VideoProgress.objects.get(student=request.user, video=video)
-                video.progress = progress
-            except VideoProgress.DoesNotExist:
-                video.progress = None
+            video.progress = progress_by_video.get(video.id)
 
     return render(
         request,
@@ -594,6 +598,15 @@ def user_course_list(request):
 # ########################################################
 
 
+def _parse_progress_time(value):
+    """Return a playback time in whole seconds, or raise ``ValueError``."""
+    seconds = float(value or 0)
+    # json.loads accepts Infinity and NaN, neither of which is a valid time
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError("Progress times must be finite and non-negative")
+    return int(seconds)
+
+
 @csrf_exempt
 @login_required
 @student_required
@@ -603,41 +616,23 @@ def update_video_progress(request):
     try:
         data = json.loads(request.body)
         video_id = data.get("video_id")
-        current_time = data.get("current_time", 0)
-        duration = data.get("duration", 0)
 
         if not video_id:
             return JsonResponse({"error": "Video ID is required"}, status=400)
 
-        # Get the video object
         try:
-            video = UploadVideo.objects.get(id=video_id)
-        except UploadVideo.DoesNotExist:
-            return JsonResponse({"error": "Video not found"}, status=404)
-
-        # Get student
-        student = Student.objects.get(student__pk=request.user.id)
+            current_time = _parse_progress_time(data.get("current_time"))
+            duration = _parse_progress_time(data.get("duration"))
+        except (OverflowError, TypeError, ValueError):
+            return JsonResponse({"error": "Invalid progress values"}, status=400)
 
-        # Get or create progress record
-        progress, created = VideoProgress.objects.get_or_create(
-            student=request.user,
-            video=video,
-            defaults={
-                "total_duration": duration,
-                "watch_time": 0,
-                "last_position": current_time,
-            },
-        )
-
-        # Update progress
-        progress.last_position = current_time
-        progress.total_duration = max(progress.total_duration, duration)
-
-        # Only increment watch time if moving forward
-        if current_time > progress.last_position:
-            progress.watch_time += current_time - progress.last_position
-
-        progress.save()
+        # Heartbeats are buffered and written to VideoProgress in batches
+        try:
+            progress = progress_buffer.record_heartbeat(
+                request.user.id, int(video_id), current_time, duration
+            )
+        except (UploadVideo.DoesNotExist, OverflowError, TypeError, ValueError):
+            return JsonResponse({"error": "Video not found"}, status=404)
 
         return JsonResponse(
             {
@@ -657,6 +652,75 @@ def update_video_progress(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+# Upper bound on the number of samples accepted in one batch request
+MAX_PROGRESS_BATCH_SAMPLES = 500
+
+
+@csrf_exempt
+@login_required
+@student_required
+@require_http_methods(["POST"])
+def update_video_progress_batch(request):
+    """
+    API endpoint to apply many queued progress samples at once.
+
+    Expects ``{"samples": [{"video_id", "current_time", "duration", "seq"}]}``.
+    Samples are applied in ``seq`` order per video and written in one
+    transaction.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON data"}, status=400)
+
+    raw_samples = data.get("samples") if isinstance(data, dict) else data
+    if not isinstance(raw_samples, list) or not raw_samples:
+        return JsonResponse({"error": "A list of samples is required"}, status=400)
+    if len(raw_samples) > MAX_PROGRESS_BATCH_SAMPLES:
+        return JsonResponse(
+            {"error": f"At most {MAX_PROGRESS_BATCH_SAMPLES} samples per request"},
+            status=400,
+        )
+
+    samples = {}
+    rejected = 0
+    for index, sample in enumerate(raw_samples):
+        try:
+            video_id = int(sample["video_id"])
+            seq = int(sample.get("seq", index))
+            current_time = _parse_progress_time(sample.get("current_time"))
+            duration = _parse_progress_time(sample.get("duration"))
+        except (AttributeError, KeyError, OverflowError, TypeError, ValueError):
+            rejected += 1
+            continue
+        # A replayed sample with the same sequence number replaces the earlier one
+        samples[(video_id, seq)] = (video_id, current_time, duration)
+
+    ordered = [samples[key] for key in sorted(samples)]
+    try:
+        progress_by_video = progress_buffer.record_samples(request.user.id, ordered)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    accepted = sum(1 for sample in ordered if sample[0] in progress_by_video)
+    return JsonResponse(
+        {
+            "success": True,
+            "accepted": accepted,
+            "rejected": rejected + len(ordered) - accepted,
+            "progress": {
+                str(video_id): {
+                    "completion_percentage": progress.completion_percentage,
+                    "is_completed": progress.is_completed,
+                    "watch_time": progress.watch_time,
+                    "last_position": progress.last_position,
+                }
+                for video_id, progress in progress_by_video.items()
+            },
+        }
+    )
+
+
 @login_required
 @student_required
 def get_video_progress(request, video_id):
@@ -664,6 +728,9 @@ def get_video_progress(request, video_id):
     try:
         video = UploadVideo.objects.get(id=video_id)
 
+        # Make sure buffered heartbeats are visible before reading
+        progress_buffer.flush(keys=[(request.user.id, video.id)])
+
         try:
             progress = VideoProgress.objects.get(student=request.user, video=video)
 
@@ -710,43 +777,33 @@ def student_progress_dashboard(request):
     """View to show student's overall video progress"""
     try:
         student = Student.objects.get(student__pk=request.user.id)
+        progress_buffer.flush_student(request.user.id)
 
-        # Get all progress records for this student
-        progress_records = VideoProgress.objects.filter(
+        summaries = CourseProgressSummary.objects.filter(
             student=request.user
-        ).select_related("video", "video__course")
+        ).select_related("course")
 
         # Calculate statistics
-        total_videos = progress_records.count()
-        completed_videos = progress_records.filter(is_completed=True).count()
-        total_watch_time = sum(p.watch_time for p in progress_records)
+        total_videos = sum(summary.videos_started for summary in summaries)
+        completed_videos = sum(summary.videos_completed for summary in summaries)
+        total_watch_time = sum(summary.watch_time for summary in summaries)
 
         # Group by course
-        course_progress = {}
-        for progress in progress_records:
-            course_title = progress.video.course.title
-            if course_title not in course_progress:
-                course_progress[course_title] = {
-                    "videos": [],
-                    "completed": 0,
-                    "total": 0,
-                    "total_watch_time": 0,
-                }
-
-            course_progress[course_title]["videos"].append(progress)
-            course_progress[course_title]["total"] += 1
-            course_progress[course_title]["total_watch_time"] += progress.watch_time
-
-            if progress.is_completed:
-                course_progress[course_title]["completed"] += 1
+        course_progress = {
+            summary.course.title: {
+                "completed": summary.videos_completed,
+                "total": summary.videos_total,
+                "total_watch_time": summary.watch_time,
+                "watch_hours": summary.watch_time / 3600,
+                "completion_percentage": summary.completion_percentage,
+            }
+            for summary in summaries
+        }
 
-        # Calculate course completion percentages
-        for course in course_progress.values():
-            course["completion_percentage"] = (
-                (course["completed"] / course["total"]) * 100
-                if course["total"] > 0
-                else 0
-            )
+        # Only the most recent records are listed
+        progress_records = VideoProgress.objects.filter(
+            student=request.user
+        ).select_related("video", "video__course")[:10]
 
         context = {
             "student": student,
@@ -755,6 +812,7 @@ def student_progress_dashboard(request):
             "total_videos": total_videos,
             "completed_videos": completed_videos,
             "total_watch_time": total_watch_time,
+            "total_watch_hours": total_watch_time / 3600,
             "overall_completion": (
                 (completed_videos / total_videos * 100) if total_videos > 0 else 0
             ),
@@ -771,81 +829,69 @@ def student_progress_dashboard(request):
         return redirect("user_course_list")
 
 
-@require_http_methods(["POST"])
-def log_drm_event(request):
-    """API endpoint to log DRM protection events and violations"""
-    try:
-        import json
-
-        # Get the client's IP address
-        def get_client_ip(request):
-            x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(",")[0]
-            else:
-                ip = request.META.get("REMOTE_ADDR")
-            return ip
-
-        # Parse data from request
-        log_type = request.POST.get("log_type", "access")
-        data_json = request.POST.get("data", "{}")
-
-        try:
-            data = json.loads(data_json)
-        except json.JSONDecodeError:
-            return JsonResponse({"error": "Invalid JSON data"}, status=400)
-
-        # Extract video_id
-        video_id = data.get("video_id")
-        if not video_id:
-            return JsonResponse({"error": "video_id is required"}, status=400)
+def get_client_ip(request):
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if x_forwarded_for:
+        return x_forwarded_for.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR")
 
-        try:
-            video = UploadVideo.objects.get(id=video_id)
-        except UploadVideo.DoesNotExist:
-            return JsonResponse({"error": "Video not found"}, status=404)
 
-        # Map violation types
-        violation_type_map = {
-            "DevTools opened": "devtools_open",
-            "Screen recording detected": "screen_recording",
-            "Screen recording attempt detected": "screen_recording",
-            "Video source tampering attempt": "video_tampering",
-        }
+@require_http_methods(["POST"])
+def log_drm_event(request):
+    """
+    API endpoint to log DRM protection events and violations.
 
-        violation_type = None
-        if log_type == "violation":
-            raw_violation_type = data.get("violation_type", "other")
-            violation_type = violation_type_map.get(
-                raw_violation_type, "other"
-            )  # Default to 'other' if not found
-
-        # Create DRM log entry
-        from .models import VideoDRMLog
-
-        drm_log = VideoDRMLog.objects.create(
-            video=video,
-            user=request.user if request.user.is_authenticated else None,
-            log_type=log_type,
-            violation_type=violation_type,
-            ip_address=get_client_ip(request),
-            user_agent=data.get("user_agent", ""),
-            screen_resolution=data.get("screen_resolution", ""),
-            platform=data.get("platform", ""),
-            url=data.get("url", ""),
-        )
+    Accepts a batch as an ``events`` field (or JSON body) holding a list of
+    ``{"log_type": ..., "video_id": ..., ...}`` objects, or a single event
+    as ``log_type`` and ``data`` form fields.
+    """
+    try:
+        if request.content_type == "application/json":
+            payload = json.loads(request.body)
+            if isinstance(payload, dict):
+                payload = payload.get("events")
+            raw_events = payload
+        elif "events" in request.POST:
+            raw_events = json.loads(request.POST["events"])
+        else:
+            raw_events = [
+                dict(
+                    json.loads(request.POST.get("data", "{}")),
+                    log_type=request.POST.get("log_type", "access"),
+                )
+            ]
+    except (TypeError, ValueError):
+        # ValueError covers JSONDecodeError and ``data`` that is not an object
+        return JsonResponse({"error": "Invalid JSON data"}, status=400)
 
+    if not isinstance(raw_events, list) or not raw_events:
+        return JsonResponse({"error": "A list of events is required"}, status=400)
+    max_events = drm_ingest.get_max_batch_events()
+    if len(raw_events) > max_events:
         return JsonResponse(
-            {
-                "success": True,
-                "message": "DRM event logged successfully",
-                "log_id": drm_log.id,
-            }
+            {"error": f"At most {max_events} events per request"}, status=400
         )
 
-    except Exception as e:
-        import traceback
+    events = []
+    for raw_event in raw_events:
+        try:
+            events.append(
+                drm_ingest.parse_event(raw_event.get("log_type", "access"), raw_event)
+            )
+        except (AttributeError, TypeError, ValueError):
+            continue
+    if not events:
+        return JsonResponse({"error": "No valid events"}, status=400)
+
+    user = request.user if request.user.is_authenticated else None
+    ip_address = get_client_ip(request)
+    if request.session.session_key:
+        identity = f"session:{request.session.session_key}"
+    elif user is not None:
+        identity = f"user:{user.id}"
+    else:
+        identity = f"ip:{ip_address}"
 
-        print(f"DRM logging error: {str(e)}")
-        print(traceback.format_exc())
-        return JsonResponse({"error": str(e)}, status=500)
+    result = drm_ingest.ingest(events, user, identity, ip_address)
+    result["rejected"] += len(raw_events) - len(events)
+    return JsonResponse(dict(result, success=True))
@@ -1,9 +1,16 @@
 from django.contrib import admin
+from django.db.models import Count, Q
 from django.urls import reverse
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
-from .models import Notification, NotificationPreference
+from . import unread
+from .models import (
+    AnnouncementJob,
+    Broadcast,
+    Notification,
+    NotificationPreference,
+)
 
 
 @admin.register(Notification)
@@ -100,6 +107,11 @@ class NotificationAdmin(admin.ModelAdmin):
 
     actions = ["mark_as_read", "mark_as_unread", "delete_selected"]
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # The read flag or recipient may have been edited by hand
+        unread.invalidate([obj.recipient_id, form.initial.get("recipient")])
+
     def mark_as_read(self, request, queryset):
         updated = 0
         for notification in queryset:
@@ -112,7 +124,9 @@ class NotificationAdmin(admin.ModelAdmin):
     mark_as_read.short_description = "Mark selected notifications as read"
 
     def mark_as_unread(self, request, queryset):
-        updated = queryset.filter(is_read=True).update(is_read=False, read_at=None)
+        queryset = queryset.filter(is_read=True)
+        unread.invalidate(queryset.values_list("recipient_id", flat=True))
+        updated = queryset.update(is_read=False, read_at=None)
         self.message_user(request, f"{updated} notification(s) marked as unread.")
 
     mark_as_unread.short_description = "Mark selected notifications as unread"
@@ -225,3 +239,80 @@ class NotificationPreferenceAdmin(admin.ModelAdmin):
         )
 
     app_notifications_summary.short_description = "App Notifications"
+
+
+@admin.register(AnnouncementJob)
+class AnnouncementJobAdmin(admin.ModelAdmin):
+    list_display = [
+        "title",
+        "status",
+        "sent",
+        "total",
+        "progress",
+        "created_by",
+        "created_at",
+        "finished_at",
+    ]
+    list_filter = ["status", "priority"]
+    search_fields = ["title"]
+    list_select_related = ["created_by"]
+    readonly_fields = [
+        "status",
+        "total",
+        "sent",
+        "last_user_id",
+        "error",
+        "created_by",
+        "created_at",
+        "started_at",
+        "heartbeat_at",
+        "finished_at",
+    ]
+
+    def progress(self, obj):
+        return f"{obj.progress_percentage:.0f}%"
+
+    progress.short_description = "Progress"
+
+    def has_add_permission(self, request):
+        # New announcements are Broadcasts; jobs are only left to finish
+        return False
+
+
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = [
+        "title",
+        "audience",
+        "program",
+        "course",
+        "priority",
+        "read_count",
+        "created_by",
+        "created_at",
+    ]
+    list_filter = ["audience", "priority", "created_at"]
+    search_fields = ["title", "message"]
+    list_select_related = ["program", "course", "created_by"]
+    readonly_fields = ["created_by", "created_at"]
+    date_hierarchy = "created_at"
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                read_count=Count("receipts", filter=Q(receipts__read_at__isnull=False))
+            )
+        )
+
+    def read_count(self, obj):
+        return obj.read_count
+
+    read_count.short_description = "Read by"
+    read_count.admin_order_field = "read_count"
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
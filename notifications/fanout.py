@@ -0,0 +1,133 @@
+"""
+Completion of announcement jobs left from the per-user fan-out.
+
+Announcements are stored once as a Broadcast now (see the Broadcast
+admin and ``create_announcement_api``). AnnouncementJobs were queued
+before that, each fanned out to one Notification per student in chunks
+of recipient ids read in id order from the saved cursor. The
+``send_announcements`` management command finishes the jobs that are
+still pending, failed or stalled:
+
+- a job that never started becomes a Broadcast, so it is stored once too
+- a job that stopped half way keeps fanning out from its cursor, since
+  the students before it already have the announcement as a Notification
+  and a Broadcast would show it to them twice. Each chunk inserts its
+  notifications and moves the cursor in the same transaction, so nobody
+  is notified twice.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import AnnouncementJob, Broadcast, create_announcements
+
+
+def get_chunk_size():
+    return getattr(settings, "NOTIFICATION_FANOUT_CHUNK_SIZE", 1000)
+
+
+def get_stale_after():
+    return getattr(settings, "NOTIFICATION_FANOUT_STALE_AFTER", 300)
+
+
+def recipients():
+    from accounts.models import User
+
+    return User.objects.filter(is_student=True)
+
+
+def resumable():
+    """Jobs waiting for a worker: pending, failed or stalled while running"""
+    stale = timezone.now() - timedelta(seconds=get_stale_after())
+    return AnnouncementJob.objects.filter(
+        Q(status__in=[AnnouncementJob.PENDING, AnnouncementJob.FAILED])
+        | Q(status=AnnouncementJob.RUNNING, heartbeat_at__lt=stale)
+    )
+
+
+def claim(job_id):
+    """Mark a resumable job as running; False when another worker has it"""
+    now = timezone.now()
+    return bool(
+        resumable()
+        .filter(pk=job_id)
+        .update(status=AnnouncementJob.RUNNING, heartbeat_at=now, error="")
+    )
+
+
+def run(job_id, chunk_size=None, progress=None):
+    """
+    Fan a job out from its cursor to the end, or store it as a Broadcast
+    when it never started. ``progress`` is called with the job after every
+    chunk. Returns the job, or None when another worker has it.
+    """
+    if not claim(job_id):
+        return None
+
+    chunk_size = chunk_size or get_chunk_size()
+    job = AnnouncementJob.objects.get(pk=job_id)
+    if job.started_at is None:
+        return _broadcast(job)
+
+    try:
+        while True:
+            user_ids = list(
+                recipients()
+                .filter(id__gt=job.last_user_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            now = timezone.now()
+            with transaction.atomic():
+                # Moving the cursor first locks the job row for the chunk
+                moved = AnnouncementJob.objects.filter(
+                    pk=job.pk, last_user_id=job.last_user_id
+                ).update(last_user_id=user_ids[-1], heartbeat_at=now)
+                if not moved:
+                    # Taken over by another worker after we stalled
+                    return None
+                # Recipients who opted out are skipped, so count the rows made
+                created = create_announcements(
+                    user_ids, job.title, job.message, job.priority
+                )
+                AnnouncementJob.objects.filter(pk=job.pk).update(
+                    sent=F("sent") + created
+                )
+            job.last_user_id = user_ids[-1]
+            job.sent += created
+            job.heartbeat_at = now
+            if progress is not None:
+                progress(job)
+    except Exception as e:
+        job.status = AnnouncementJob.FAILED
+        job.error = str(e)
+        job.save(update_fields=["status", "error"])
+        raise
+
+    job.status = AnnouncementJob.COMPLETED
+    job.finished_at = timezone.now()
+    # Students who joined while the job ran are counted too
+    job.total = max(job.total, job.sent)
+    job.save(update_fields=["status", "finished_at", "total"])
+    return job
+
+
+def _broadcast(job):
+    """Store a job nobody was notified of yet once, as a Broadcast"""
+    with transaction.atomic():
+        Broadcast.objects.create(
+            title=job.title,
+            message=job.message,
+            priority=job.priority,
+            created_by=job.created_by,
+        )
+        job.status = AnnouncementJob.COMPLETED
+        job.started_at = job.finished_at = timezone.now()
+        job.save(update_fields=["status", "started_at", "finished_at"])
+    return job
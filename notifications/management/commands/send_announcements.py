@@ -0,0 +1,55 @@
+"""
+Django management command to finish announcement jobs queued before
+broadcasts: pending jobs become a Broadcast, failed or stalled ones resume
+their fan-out. See notifications.fanout.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications import fanout
+from notifications.models import AnnouncementJob
+
+
+class Command(BaseCommand):
+    help = "Finishes pending announcement jobs and resumes failed or stalled ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", type=int, help="Only run this job id")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Recipients per chunk (default: NOTIFICATION_FANOUT_CHUNK_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        jobs = fanout.resumable().order_by("created_at")
+        if options["job"] is not None:
+            if not AnnouncementJob.objects.filter(pk=options["job"]).exists():
+                raise CommandError(f"Announcement job {options['job']} does not exist")
+            jobs = jobs.filter(pk=options["job"])
+
+        job_ids = list(jobs.values_list("id", flat=True))
+        if not job_ids:
+            self.stdout.write("No announcement jobs to run.")
+            return
+
+        for job_id in job_ids:
+            try:
+                job = fanout.run(
+                    job_id, chunk_size=options["chunk_size"], progress=self.report
+                )
+            except Exception as e:
+                self.stderr.write(f"Job {job_id} failed: {e}")
+                continue
+            if job is None:
+                self.stdout.write(f"Job {job_id} is run by another worker.")
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Job {job_id}: sent {job.sent} notifications.")
+                )
+
+    def report(self, job):
+        self.stdout.write(
+            f"Job {job.id}: {job.sent}/{job.total} ({job.progress_percentage:.0f}%)"
+        )
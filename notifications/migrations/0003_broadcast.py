@@ -0,0 +1,61 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import notifications.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0012_drmviolationrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0002_announcementjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], default='medium', max_length=10)),
+                ('audience', models.CharField(choices=[('all', 'All students'), ('program', 'Students of a program'), ('course', 'Students of a course')], default='all', max_length=10)),
+                ('action_url', models.URLField(blank=True, null=True)),
+                ('icon', models.CharField(default='bullhorn', max_length=50)),
+                ('color', models.CharField(default='info', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='broadcasts', to='course.course')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='broadcasts', to=settings.AUTH_USER_MODEL)),
+                ('program', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='broadcasts', to='course.program')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+            bases=(notifications.models.NotificationDisplayMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='BroadcastReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('broadcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='notifications.broadcast')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast_receipts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='broadcastreceipt',
+            constraint=models.UniqueConstraint(fields=('broadcast', 'user'), name='unique_broadcast_receipt'),
+        ),
+        migrations.AddIndex(
+            model_name='broadcast',
+            index=models.Index(fields=['-created_at'], name='notificatio_created_5e6984_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='broadcast',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('audience', 'all'), ('course__isnull', True), ('program__isnull', True)), models.Q(('audience', 'program'), ('course__isnull', True), ('program__isnull', False)), models.Q(('audience', 'course'), ('course__isnull', False), ('program__isnull', True)), _connector='OR'), name='broadcast_audience_target'),
+        ),
+    ]
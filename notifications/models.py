@@ -1,10 +1,14 @@
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from . import preferences, unread
+
 # Notification Types
 PROGRESS_UPDATE = "progress_update"
 COURSE_COMPLETION = "course_completion"
@@ -61,12 +65,84 @@ class NotificationManager(models.Manager):
         """Get notifications by type"""
         return self.filter(notification_type=notification_type)
 
+    def mark_all_read(self, user):
+        """Mark every unread notification and broadcast of a user as read"""
+        updated = self.filter(recipient=user, is_read=False).update(
+            is_read=True, read_at=timezone.now()
+        )
+        unread.removed([user.id] * updated)
+        return updated + Broadcast.objects.mark_all_read(user)
+
+
+class NotificationDisplayMixin:
+    """Presentation helpers shared by personal notifications and broadcasts"""
+
+    @property
+    def time_since_created(self):
+        """Human readable time since creation"""
+        now = timezone.now()
+        diff = now - self.created_at
+
+        if diff.days > 0:
+            return f"{diff.days} day{'s' if diff.days > 1 else ''} ago"
+        elif diff.seconds > 3600:
+            hours = diff.seconds // 3600
+            return f"{hours} hour{'s' if hours > 1 else ''} ago"
+        elif diff.seconds > 60:
+            minutes = diff.seconds // 60
+            return f"{minutes} minute{'s' if minutes > 1 else ''} ago"
+        else:
+            return "Just now"
+
+    @property
+    def priority_badge_class(self):
+        """Get CSS class for priority badge"""
+        priority_classes = {
+            LOW: "badge-secondary",
+            MEDIUM: "badge-primary",
+            HIGH: "badge-warning",
+            URGENT: "badge-danger",
+        }
+        return priority_classes.get(self.priority, "badge-primary")
+
+    @property
+    def type_icon(self):
+        """Get icon based on notification type"""
+        type_icons = {
+            PROGRESS_UPDATE: "chart-line",
+            COURSE_COMPLETION: "graduation-cap",
+            VIDEO_COMPLETION: "play-circle",
+            ACHIEVEMENT: "trophy",
+            ANNOUNCEMENT: "bullhorn",
+            REMINDER: "clock",
+            MILESTONE: "flag",
+            WELCOME: "hand-wave",
+        }
+        return type_icons.get(self.notification_type, self.icon)
+
+    @property
+    def type_color(self):
+        """Get color based on notification type"""
+        type_colors = {
+            PROGRESS_UPDATE: "info",
+            COURSE_COMPLETION: "success",
+            VIDEO_COMPLETION: "primary",
+            ACHIEVEMENT: "warning",
+            ANNOUNCEMENT: "secondary",
+            REMINDER: "warning",
+            MILESTONE: "success",
+            WELCOME: "primary",
+        }
+        return type_colors.get(self.notification_type, self.color)
+
 
-class Notification(models.Model):
+class Notification(NotificationDisplayMixin, models.Model):
     """
     Notification model to handle all types of notifications for students
     """
 
+    kind = "notification"
+
     recipient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -160,7 +236,11 @@ class Notification(models.Model):
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
-            self.save(update_fields=["is_read", "read_at"])
+            # Only the request that flips the row moves the unread counter
+            if Notification.objects.filter(pk=self.pk, is_read=False).update(
+                is_read=True, read_at=self.read_at
+            ):
+                unread.removed([self.recipient_id])
 
     def mark_as_sent(self):
         """Mark notification as sent"""
@@ -169,64 +249,6 @@ class Notification(models.Model):
             self.sent_at = timezone.now()
             self.save(update_fields=["is_sent", "sent_at"])
 
-    @property
-    def time_since_created(self):
-        """Human readable time since creation"""
-        now = timezone.now()
-        diff = now - self.created_at
-
-        if diff.days > 0:
-            return f"{diff.days} day{'s' if diff.days > 1 else ''} ago"
-        elif diff.seconds > 3600:
-            hours = diff.seconds // 3600
-            return f"{hours} hour{'s' if hours > 1 else ''} ago"
-        elif diff.seconds > 60:
-            minutes = diff.seconds // 60
-            return f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-        else:
-            return "Just now"
-
-    @property
-    def priority_badge_class(self):
-        """Get CSS class for priority badge"""
-        priority_classes = {
-            LOW: "badge-secondary",
-            MEDIUM: "badge-primary",
-            HIGH: "badge-warning",
-            URGENT: "badge-danger",
-        }
-        return priority_classes.get(self.priority, "badge-primary")
-
-    @property
-    def type_icon(self):
-        """Get icon based on notification type"""
-        type_icons = {
-            PROGRESS_UPDATE: "chart-line",
-            COURSE_COMPLETION: "graduation-cap",
-            VIDEO_COMPLETION: "play-circle",
-            ACHIEVEMENT: "trophy",
-            ANNOUNCEMENT: "bullhorn",
-            REMINDER: "clock",
-            MILESTONE: "flag",
-            WELCOME: "hand-wave",
-        }
-        return type_icons.get(self.notification_type, self.icon)
-
-    @property
-    def type_color(self):
-        """Get color based on notification type"""
-        type_colors = {
-            PROGRESS_UPDATE: "info",
-            COURSE_COMPLETION: "success",
-            VIDEO_COMPLETION: "primary",
-            ACHIEVEMENT: "warning",
-            ANNOUNCEMENT: "secondary",
-            REMINDER: "warning",
-            MILESTONE: "success",
-            WELCOME: "primary",
-        }
-        return type_colors.get(self.notification_type, self.color)
-
 
 class NotificationPreference(models.Model):
     """
@@ -297,36 +319,305 @@ class NotificationPreference(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Flag field suffix per notification type; other types are always sent
+    TYPE_FLAGS = {
+        PROGRESS_UPDATE: "progress_updates",
+        COURSE_COMPLETION: "course_completion",
+        ACHIEVEMENT: "achievements",
+        ANNOUNCEMENT: "announcements",
+        REMINDER: "reminders",
+    }
+    FLAG_FIELDS = [
+        f"{method}_{flag}"
+        for flag in TYPE_FLAGS.values()
+        for method in ("email", "app")
+    ]
+
     def __str__(self):
         return f"Notification preferences for {self.user.username}"
 
+    @classmethod
+    def flag_field(cls, notification_type, delivery_method="app"):
+        """Name of the flag deciding a type, or None if it is always sent"""
+        flag = cls.TYPE_FLAGS.get(notification_type)
+        if flag is None:
+            return None
+        method = "email" if delivery_method == "email" else "app"
+        return f"{method}_{flag}"
+
     def should_send_notification(self, notification_type, delivery_method="app"):
         """Check if notification should be sent based on preferences"""
-        if delivery_method == "email":
-            email_prefs = {
-                PROGRESS_UPDATE: self.email_progress_updates,
-                COURSE_COMPLETION: self.email_course_completion,
-                ACHIEVEMENT: self.email_achievements,
-                ANNOUNCEMENT: self.email_announcements,
-                REMINDER: self.email_reminders,
-            }
-            return email_prefs.get(notification_type, True)
-        else:  # app notifications
-            app_prefs = {
-                PROGRESS_UPDATE: self.app_progress_updates,
-                COURSE_COMPLETION: self.app_course_completion,
-                ACHIEVEMENT: self.app_achievements,
-                ANNOUNCEMENT: self.app_announcements,
-                REMINDER: self.app_reminders,
-            }
-            return app_prefs.get(notification_type, True)
-
-
-# Signal to create notification preferences for new users
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_notification_preferences(sender, instance, created, **kwargs):
-    if created:
-        NotificationPreference.objects.get_or_create(user=instance)
+        field = self.flag_field(notification_type, delivery_method)
+        return field is None or getattr(self, field)
+
+
+class AnnouncementJob(models.Model):
+    """
+    An announcement queued for the per-user fan-out that preceded
+    Broadcast, see ``notifications.fanout``. Recipients are processed in id
+    order and ``last_user_id`` is saved with each chunk, so an interrupted
+    job resumes where it stopped. No new jobs are created.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (RUNNING, _("Running")),
+        (COMPLETED, _("Completed")),
+        (FAILED, _("Failed")),
+    )
+
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    priority = models.CharField(max_length=10, choices=PRIORITY_LEVELS, default=MEDIUM)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="announcement_jobs",
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total = models.PositiveIntegerField(default=0, help_text=_("Recipients to notify"))
+    sent = models.PositiveIntegerField(default=0, help_text=_("Notifications created"))
+    last_user_id = models.PositiveBigIntegerField(
+        default=0, help_text=_("Recipients up to this user id are done")
+    )
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Moved with every chunk; a running job without heartbeat has died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.title} ({self.get_status_display()}, {self.sent}/{self.total})"
+
+    @property
+    def progress_percentage(self):
+        if self.status == self.COMPLETED:
+            return 100.0
+        if self.total > 0:
+            return min(self.sent / self.total * 100, 100.0)
+        return 0.0
+
+
+class BroadcastManager(models.Manager):
+    def for_user(self, user):
+        """
+        Broadcasts addressed to a user since they joined, minus those they
+        deleted, annotated with ``is_read``. The audience is matched with
+        subqueries so this stays a single query.
+        """
+        from accounts.models import Student
+        from result.models import TakenCourse
+
+        programs = Student.objects.filter(student_id=user.pk).values("program_id")
+        courses = TakenCourse.objects.filter(student__student_id=user.pk).values(
+            "course_id"
+        )
+        audience = Q(audience=Broadcast.PROGRAM, program_id__in=programs) | Q(
+            audience=Broadcast.COURSE, course_id__in=courses
+        )
+        if user.is_student:
+            audience |= Q(audience=Broadcast.ALL)
+        flags = preferences.resolve([user.pk])[user.pk]
+
+        receipts = BroadcastReceipt.objects.filter(
+            broadcast=models.OuterRef("pk"), user_id=user.pk
+        )
+        broadcasts = (
+            self.filter(audience, created_at__gte=user.date_joined)
+            .annotate(
+                is_read=models.Exists(receipts.filter(read_at__isnull=False)),
+                is_deleted=models.Exists(receipts.filter(is_deleted=True)),
+            )
+            .filter(is_deleted=False)
+        )
+        if not preferences.allows(flags, ANNOUNCEMENT):
+            # Keeps the annotations for callers that filter on is_read
+            return broadcasts.none()
+        return broadcasts
+
+    def mark_read(self, user, broadcast_ids):
+        """Mark broadcasts read for a user; returns how many were unread"""
+        now = timezone.now()
+        updated = BroadcastReceipt.objects.filter(
+            user_id=user.pk, broadcast_id__in=broadcast_ids, read_at__isnull=True
+        ).update(read_at=now)
+        existing = set(
+            BroadcastReceipt.objects.filter(
+                user_id=user.pk, broadcast_id__in=broadcast_ids
+            ).values_list("broadcast_id", flat=True)
+        )
+        new_ids = set(broadcast_ids) - existing
+        # Receipts written concurrently by another request are skipped
+        BroadcastReceipt.objects.bulk_create(
+            [
+                BroadcastReceipt(broadcast_id=broadcast_id, user_id=user.pk, read_at=now)
+                for broadcast_id in new_ids
+            ],
+            ignore_conflicts=True,
+        )
+        if updated or new_ids:
+            unread.broadcasts_changed([user.pk])
+        return updated + len(new_ids)
+
+    def mark_all_read(self, user):
+        ids = list(
+            self.for_user(user).filter(is_read=False).values_list("id", flat=True)
+        )
+        return self.mark_read(user, ids) if ids else 0
+
+    def hide(self, user, broadcast):
+        """Delete a broadcast from one user's inbox"""
+        BroadcastReceipt.objects.update_or_create(
+            broadcast=broadcast, user_id=user.pk, defaults={"is_deleted": True}
+        )
+        unread.broadcasts_changed([user.pk])
+
+
+class Broadcast(NotificationDisplayMixin, models.Model):
+    """
+    An announcement stored once for its whole audience. Who has read or
+    deleted it is kept per user in BroadcastReceipt, rows only exist for
+    users who did either.
+    """
+
+    kind = "broadcast"
+    notification_type = ANNOUNCEMENT
+    related_video = None
+
+    ALL = "all"
+    PROGRAM = "program"
+    COURSE = "course"
+    AUDIENCE_CHOICES = (
+        (ALL, _("All students")),
+        (PROGRAM, _("Students of a program")),
+        (COURSE, _("Students of a course")),
+    )
+
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    priority = models.CharField(max_length=10, choices=PRIORITY_LEVELS, default=MEDIUM)
+    audience = models.CharField(max_length=10, choices=AUDIENCE_CHOICES, default=ALL)
+    program = models.ForeignKey(
+        "course.Program",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="broadcasts",
+    )
+    course = models.ForeignKey(
+        "course.Course",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="broadcasts",
+    )
+    action_url = models.URLField(blank=True, null=True)
+    icon = models.CharField(max_length=50, default="bullhorn")
+    color = models.CharField(max_length=20, default="info")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="broadcasts",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BroadcastManager()
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["-created_at"])]
+        constraints = [
+            models.CheckConstraint(
+                check=Q(audience="all", program__isnull=True, course__isnull=True)
+                | Q(audience="program", program__isnull=False, course__isnull=True)
+                | Q(audience="course", program__isnull=True, course__isnull=False),
+                name="broadcast_audience_target",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.get_audience_display()})"
+
+    @property
+    def related_course(self):
+        return self.course
+
+
+class BroadcastReceipt(models.Model):
+    """A user's read or deleted marker for a broadcast"""
+
+    broadcast = models.ForeignKey(
+        Broadcast, on_delete=models.CASCADE, related_name="receipts"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="broadcast_receipts",
+    )
+    read_at = models.DateTimeField(null=True, blank=True)
+    is_deleted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["broadcast", "user"], name="unique_broadcast_receipt"
+            )
+        ]
+
+
+@receiver(post_save, sender=Broadcast)
+@receiver(post_delete, sender=Broadcast)
+def update_unread_counts_on_broadcast_change(sender, instance, **kwargs):
+    unread.broadcasts_changed()
+
+
+# Program and course broadcasts follow the student's program and courses
+@receiver(post_save, sender="accounts.Student")
+@receiver(post_delete, sender="accounts.Student")
+def update_broadcasts_on_program_change(sender, instance, **kwargs):
+    unread.broadcasts_changed([instance.student_id])
+
+
+@receiver(post_save, sender="result.TakenCourse")
+@receiver(post_delete, sender="result.TakenCourse")
+def update_broadcasts_on_enrollment_change(sender, instance, **kwargs):
+    try:
+        user_id = instance.student.student_id
+    except ObjectDoesNotExist:
+        # Deleted along with the student, whose own receiver covers it
+        return
+    unread.broadcasts_changed([user_id])
+
+
+# Users without a preference row get the defaults, see notifications.preferences
+@receiver(post_save, sender=NotificationPreference)
+@receiver(post_delete, sender=NotificationPreference)
+def invalidate_preferences(sender, instance, **kwargs):
+    preferences.invalidate([instance.user_id])
+    # Opting in or out of announcements changes the visible broadcasts
+    unread.broadcasts_changed([instance.user_id])
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        unread.removed([instance.recipient_id])
+    else:
+        unread.changed([instance.recipient_id])
 
 
 # Utility Functions for Creating Notifications
@@ -343,8 +634,11 @@ def create_notification(
     color=None,
 ):
     """
-    Utility function to create notifications
+    Utility function to create notifications. Returns None when the
+    recipient opted out of the notification type.
     """
+    if not preferences.filter_recipients([recipient.pk], notification_type):
+        return None
     notification = Notification.objects.create(
         recipient=recipient,
         title=title,
@@ -357,6 +651,7 @@ def create_notification(
         icon=icon or "bell",
         color=color or "primary",
     )
+    unread.added([notification.recipient_id])
 
     # Mark as sent immediately for in-app notifications
     notification.mark_as_sent()
@@ -443,18 +738,16 @@ def create_welcome_notification(student):
     )
 
 
-def bulk_create_announcement(title, message, users=None, priority=MEDIUM):
-    """Create announcement for multiple users"""
-    if users is None:
-        from accounts.models import User
-
-        users = User.objects.filter(is_student=True)
-
-    notifications = []
-    for user in users:
-        notifications.append(
+def create_announcements(user_ids, title, message, priority=MEDIUM):
+    """
+    Create one announcement per user id with a single INSERT, skipping
+    users who opted out of announcements. Returns the number created.
+    """
+    user_ids = preferences.filter_recipients(user_ids, ANNOUNCEMENT)
+    Notification.objects.bulk_create(
+        [
             Notification(
-                recipient=user,
+                recipient_id=user_id,
                 title=title,
                 message=message,
                 notification_type=ANNOUNCEMENT,
@@ -462,9 +755,30 @@ def bulk_create_announcement(title, message, users=None, priority=MEDIUM):
                 icon="bullhorn",
                 color="info",
             )
-        )
+            for user_id in user_ids
+        ]
+    )
+    unread.added(user_ids)
+    return len(user_ids)
 
-    # Bulk create for efficiency
-    Notification.objects.bulk_create(notifications)
 
-    return len(notifications)
+def bulk_create_announcement(title, message, users, priority=MEDIUM):
+    """
+    Create an announcement for a hand-picked set of users, in chunks of
+    ``NOTIFICATION_FANOUT_CHUNK_SIZE``. Announcements to all students or to
+    a program or course are a single Broadcast instead.
+    """
+    from itertools import islice
+
+    chunk_size = getattr(settings, "NOTIFICATION_FANOUT_CHUNK_SIZE", 1000)
+    if isinstance(users, models.QuerySet):
+        # Stream ids instead of loading every user
+        user_ids = users.order_by().values_list("id", flat=True).iterator(chunk_size)
+    else:
+        user_ids = (user.id for user in users)
+
+    count = 0
+    while chunk := list(islice(user_ids, chunk_size)):
+        with transaction.atomic():
+            count += create_announcements(chunk, title, message, priority)
+    return count
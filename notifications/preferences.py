@@ -0,0 +1,91 @@
+"""
+Bulk resolution of notification preferences.
+
+Every producer checks the recipients' preferences before inserting
+notifications. Asking ``NotificationPreference.should_send_notification``
+per recipient cost a query each, and fan-outs reach thousands of users,
+so the delivery flags of a batch of users are resolved here at once:
+cached users are read with one cache round trip and the rest with one
+query. Users without a preference row get the field defaults, so rows
+are only created once someone edits their preferences. Cached flags are
+dropped when a preference row is saved or deleted.
+"""
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import notifications_cache
+
+
+def get_timeout():
+    return getattr(settings, "NOTIFICATION_PREFERENCE_TIMEOUT", 3600)
+
+
+def _key(user_id):
+    return f"prefs:{user_id}"
+
+
+def _defaults():
+    from .models import NotificationPreference
+
+    return {
+        name: NotificationPreference._meta.get_field(name).default
+        for name in NotificationPreference.FLAG_FIELDS
+    }
+
+
+def resolve(user_ids):
+    """Map each user id to a dict of its delivery flags"""
+    from .models import NotificationPreference
+
+    user_ids = set(user_ids)
+    cached = notifications_cache.get_many([_key(user_id) for user_id in user_ids])
+    flags = {
+        user_id: cached[_key(user_id)]
+        for user_id in user_ids
+        if _key(user_id) in cached
+    }
+    missing = user_ids - flags.keys()
+    if missing:
+        rows = NotificationPreference.objects.filter(user_id__in=missing).values(
+            "user_id", *NotificationPreference.FLAG_FIELDS
+        )
+        for row in rows:
+            flags[row.pop("user_id")] = row
+        defaults = _defaults()
+        for user_id in missing:
+            flags.setdefault(user_id, defaults)
+        notifications_cache.set_many(
+            {_key(user_id): flags[user_id] for user_id in missing}, get_timeout()
+        )
+    return flags
+
+
+def allows(flags, notification_type, delivery_method="app"):
+    """Whether resolved flags accept a notification type"""
+    from .models import NotificationPreference
+
+    field = NotificationPreference.flag_field(notification_type, delivery_method)
+    return field is None or flags.get(field, True)
+
+
+def filter_recipients(user_ids, notification_type, delivery_method="app"):
+    """The given user ids, in order, minus those who opted out of the type"""
+    user_ids = list(user_ids)
+    flags = resolve(user_ids)
+    return [
+        user_id
+        for user_id in user_ids
+        if allows(flags[user_id], notification_type, delivery_method)
+    ]
+
+
+def invalidate(user_ids):
+    """Resolve the given users from the database again after commit"""
+    user_ids = set(user_ids)
+
+    def delete():
+        for user_id in user_ids:
+            notifications_cache.delete(_key(user_id))
+
+    transaction.on_commit(delete)
@@ -0,0 +1,250 @@
+"""
+Change signal for pushing notifications to open pages.
+
+Every user has a version number in the cache that is bumped whenever
+their notifications change (see ``notifications.unread``). Broadcasts are
+shared by many users, so they bump a single ``broadcasts`` version
+instead, and the version of a user combines both.
+
+Bumping a version also wakes the connections waiting for it. Waiters of
+this process are woken directly; with the Redis cache the change is
+published on ``CHANNEL`` and every process keeps one subscription that
+wakes its own waiters, so an idle connection makes no cache or database
+call until something changes. Without Redis the other processes cannot
+be told, so waiters also re-read the version every
+``NOTIFICATION_PUSH_POLL_INTERVAL`` seconds; run a single worker then.
+
+Waiting connections are cheap coroutines under the ASGI server
+(``config.asgi``, run by gunicorn with uvicorn workers in the Procfile and
+render.yaml). Under WSGI every waiting request would hold a worker, so
+the stream is refused and the long-poll answers straight away.
+"""
+
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from core.cache import notifications_cache
+
+try:
+    import redis
+    import redis.asyncio
+except ImportError:  # pragma: no cover - only needed with the Redis cache
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_poll_interval():
+    return getattr(settings, "NOTIFICATION_PUSH_POLL_INTERVAL", 5)
+
+
+def get_stream_timeout():
+    return getattr(settings, "NOTIFICATION_STREAM_TIMEOUT", 300)
+
+
+def get_long_poll_timeout():
+    return getattr(settings, "NOTIFICATION_LONG_POLL_TIMEOUT", 25)
+
+
+# Version group of every broadcast
+BROADCASTS = "broadcasts"
+
+# Redis channel carrying the ids of changed users, or "*" for broadcasts
+CHANNEL = "lms:notifications:push"
+# Seconds before a lost subscription is opened again
+RESUBSCRIBE_DELAY = 5
+
+
+def _group(user_id):
+    return f"user:{user_id}"
+
+
+def get_version(user_id):
+    keys = [f"version:{_group(user_id)}", f"version:{BROADCASTS}"]
+    # One round-trip; a missing version is only created on its first read
+    versions = notifications_cache.get_many(keys)
+    return "{}.{}".format(
+        versions.get(keys[0]) or notifications_cache.get_version(_group(user_id)),
+        versions.get(keys[1]) or notifications_cache.get_version(BROADCASTS),
+    )
+
+
+def _redis_url():
+    """Location of the Redis cache, or None with any other backend"""
+    cache = settings.CACHES["default"]
+    if redis is None or not cache["BACKEND"].endswith(".RedisCache"):
+        return None
+    location = cache["LOCATION"]
+    if isinstance(location, str):
+        location = location.split(",")
+    # The first server is the one Django writes to
+    return location[0].strip()
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def _get_publisher(url):
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None or _publisher[0] != url:
+            _publisher = (url, redis.Redis.from_url(url))
+        return _publisher[1]
+
+
+def _announce(message):
+    """Publish a change to every process, False if that is not possible"""
+    url = _redis_url()
+    if url is None:
+        return False
+    try:
+        _get_publisher(url).publish(CHANNEL, message)
+    except redis.RedisError:
+        # The version is bumped already; subscribers catch up on their
+        # next timeout
+        logger.warning("Could not publish notification change", exc_info=True)
+        return False
+    return True
+
+
+def publish(user_ids):
+    """Wake up the connections of the given users"""
+    user_ids = set(user_ids)
+    for user_id in user_ids:
+        notifications_cache.bump_version(_group(user_id))
+    if user_ids and not _announce(",".join(map(str, user_ids))):
+        _waiters.wake(user_ids)
+
+
+def publish_broadcasts():
+    """Wake up every connection after a broadcast changed"""
+    notifications_cache.bump_version(BROADCASTS)
+    if not _announce("*"):
+        _waiters.wake_all()
+
+
+class _Waiters:
+    """Events of the connections waiting in this process, by user id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+
+    def add(self, user_id, event):
+        with self._lock:
+            self._events.setdefault(user_id, set()).add(event)
+
+    def discard(self, user_id, event):
+        with self._lock:
+            events = self._events.get(user_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self._events[user_id]
+
+    def wake(self, user_ids):
+        with self._lock:
+            events = [
+                event for user_id in user_ids for event in self._events.get(user_id, ())
+            ]
+        self._set(events)
+
+    def wake_all(self):
+        with self._lock:
+            events = [event for events in self._events.values() for event in events]
+        self._set(events)
+
+    @staticmethod
+    def _set(events):
+        # Publishers run in request threads, the waiters in an event loop
+        for loop, event in events:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # The loop of the waiter is closed
+
+
+_waiters = _Waiters()
+
+
+def _handle_message(data):
+    if isinstance(data, bytes):
+        data = data.decode()
+    if data == "*":
+        _waiters.wake_all()
+    else:
+        _waiters.wake({int(user_id) for user_id in data.split(",") if user_id})
+
+
+async def _subscribe(url):
+    """Wake the waiters of this process for every published change"""
+    while True:
+        client = redis.asyncio.Redis.from_url(url)
+        try:
+            async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    _handle_message(message["data"])
+        except redis.RedisError:
+            logger.warning("Notification subscription lost", exc_info=True)
+        finally:
+            await client.aclose()
+        await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+
+_subscriptions = {}
+
+
+def _ensure_subscribed(url):
+    """Start the subscription of the running loop, once"""
+    loop = asyncio.get_running_loop()
+    task = _subscriptions.get(loop)
+    if task is None or task.done():
+        for other in [other for other in _subscriptions if other.is_closed()]:
+            del _subscriptions[other]
+        _subscriptions[loop] = loop.create_task(_subscribe(url))
+
+
+def can_wait(request):
+    """Whether the request is served by the ASGI server"""
+    return isinstance(request, ASGIRequest)
+
+
+async def wait_for_change(user_id, version, timeout):
+    """
+    Wait up to ``timeout`` seconds for the version of a user to differ
+    from ``version``. Returns the current version.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    url = _redis_url()
+    if url is not None:
+        _ensure_subscribed(url)
+    # Without Redis the publisher may be another process
+    interval = timeout if url is not None else get_poll_interval()
+    # Cache lookups do not need the thread of the database connection
+    read_version = sync_to_async(get_version, thread_sensitive=False)
+
+    waiter = (loop, asyncio.Event())
+    # Registered before the first read, so no change can slip in between
+    _waiters.add(user_id, waiter)
+    try:
+        current = await read_version(user_id)
+        while current == version and loop.time() < deadline:
+            try:
+                await asyncio.wait_for(
+                    waiter[1].wait(), min(interval, deadline - loop.time())
+                )
+            except asyncio.TimeoutError:
+                pass
+            waiter[1].clear()
+            current = await read_version(user_id)
+    finally:
+        _waiters.discard(user_id, waiter)
+    return current
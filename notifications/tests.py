@@ -1,2 +1,710 @@
+import asyncio
+import json
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Student
+from config.caches import build_caches
+from core.cache import notifications_cache
+from course.models import Course, Program
+from result.models import TakenCourse
+
+from . import fanout, preferences, push, unread
+from .models import (
+    ANNOUNCEMENT,
+    AnnouncementJob,
+    Broadcast,
+    Notification,
+    NotificationPreference,
+    bulk_create_announcement,
+    create_announcements,
+    create_notification,
+)
+
+User = get_user_model()
+
+
+class NotificationTestMixin:
+    """Tests on clean caches, with users made by ``create_user``"""
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    @staticmethod
+    def create_user(username, **fields):
+        return User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password="password",
+            **fields,
+        )
+
+
+class UnreadCountTests(NotificationTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("student")
+        self.other = self.create_user("other")
+        self.client.force_login(self.user)
+
+    def notify(self, user=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(user or self.user, "Title", "Message")
+
+    def count(self):
+        response = self.client.get(reverse("notifications:notification_count_api"))
+        return response.json()["unread_count"]
+
+    def test_count_polls_do_not_query_notifications(self):
+        self.notify()
+        self.assertEqual(self.count(), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.count(), 1)
+        self.assertFalse(
+            [q for q in queries if "notifications_notification" in q["sql"]]
+        )
+
+    def test_counter_follows_every_mutation(self):
+        self.assertEqual(self.count(), 0)
+        first, second, third = self.notify(), self.notify(), self.notify()
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_create_announcement("News", "Message", users=[self.user, self.other])
+        self.assertEqual(self.count(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("notifications:mark_notification_read", args=[first.id])
+            )
+            # Reading twice does not count twice
+            first.mark_as_read()
+        self.assertEqual(self.count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("notifications:delete_notification", args=[second.id])
+            )
+            self.client.post(
+                reverse("notifications:delete_notification", args=[first.id])
+            )
+        self.assertEqual(self.count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("notifications:mark_all_notifications_read")
+            )
+        self.assertEqual(response.json()["updated_count"], 2)
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(unread.get_count(self.other), 1)
+        third.refresh_from_db()
+        self.assertTrue(third.is_read)
+
+    def test_expired_counter_is_recounted(self):
+        self.assertEqual(self.count(), 0)
+        # A change that bypassed the counter is picked up on expiry
+        Notification.objects.create(recipient=self.user, title="T", message="M")
+        self.assertEqual(self.count(), 0)
+
+        cache.clear()
+        self.assertEqual(self.count(), 1)
+
+    def test_old_counter_is_reconciled_on_the_file_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES=build_caches("file", location)):
+                self.notify()
+                self.assertEqual(self.count(), 1)
+                # A lost race left the counter off; increments keep it cached
+                notifications_cache.incr(unread._key(self.user.id), 5)
+                self.assertEqual(self.count(), 6)
+
+                with mock.patch.object(unread, "time") as clock:
+                    clock.time.return_value = time.time() + unread.get_timeout()
+                    self.assertEqual(self.count(), 1)
+                    with self.assertNumQueries(0):
+                        unread.get_notification_count(self.user.id)
+
+    def test_rolled_back_changes_leave_counter_alone(self):
+        self.assertEqual(self.count(), 0)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            create_notification(self.user, "Title", "Message")
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.count(), 0)
+
+
+@override_settings(NOTIFICATION_PUSH_POLL_INTERVAL=0.01)
+class NotificationPushTests(NotificationTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("student")
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def notify(self, title="Title"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_notification(self.user, title, "Message")
+
+    async def read_stream(self, response):
+        return "".join([chunk.decode() async for chunk in response.streaming_content])
+
+    @override_settings(NOTIFICATION_STREAM_TIMEOUT=0)
+    async def test_stream_resumes_after_last_event_id(self):
+        first = await sync_to_async(self.notify)("First")
+        await sync_to_async(self.notify)("Second")
+
+        response = await self.async_client.get(
+            reverse("notifications:notification_stream"),
+            headers={"Last-Event-ID": str(first.id)},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        body = await self.read_stream(response)
+
+        self.assertEqual(body.count("event: notification"), 1)
+        self.assertIn('"title": "Second"', body)
+        self.assertIn('event: count\ndata: {"unread_count": 2}', body)
+
+    @override_settings(NOTIFICATION_STREAM_TIMEOUT=5)
+    async def test_stream_pushes_new_notifications(self):
+        response = await self.async_client.get(
+            reverse("notifications:notification_stream")
+        )
+        events = aiter(response.streaming_content)
+        self.assertTrue((await anext(events)).startswith(b"retry:"))
+        self.assertIn(b'"unread_count": 0', await anext(events))
+
+        await sync_to_async(self.notify)("Pushed")
+
+        self.assertIn(b'"title": "Pushed"', await anext(events))
+        self.assertIn(b'"unread_count": 1', await anext(events))
+
+    def test_stream_is_refused_under_wsgi(self):
+        response = self.client.get(reverse("notifications:notification_stream"))
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(NOTIFICATION_LONG_POLL_TIMEOUT=0.05)
+    async def test_long_poll_returns_on_change(self):
+        url = reverse("notifications:notification_wait_api")
+        data = (await self.async_client.get(url)).json()
+        self.assertEqual((data["unread_count"], data["retry_after"]), (0, 0))
+
+        response = await self.async_client.get(url, {"since": data["version"]})
+        self.assertFalse(response.json()["changed"])
+
+        await sync_to_async(self.notify)()
+        response = await self.async_client.get(url, {"since": data["version"]})
+        self.assertTrue(response.json()["changed"])
+        self.assertEqual(response.json()["unread_count"], 1)
+
+    @override_settings(NOTIFICATION_PUSH_POLL_INTERVAL=60)
+    async def test_publish_wakes_waiter_without_polling(self):
+        version = await sync_to_async(push.get_version)(self.user.id)
+        waiter = asyncio.ensure_future(push.wait_for_change(self.user.id, version, 30))
+        await asyncio.sleep(0.01)
+
+        await sync_to_async(self.notify)()
+
+        self.assertNotEqual(await asyncio.wait_for(waiter, 5), version)
+
+    @override_settings(NOTIFICATION_PUSH_POLL_INTERVAL=60)
+    async def test_message_from_other_process_wakes_waiter(self):
+        version = await sync_to_async(push.get_version)(self.user.id)
+        waiter = asyncio.ensure_future(push.wait_for_change(self.user.id, version, 30))
+        await asyncio.sleep(0.01)
+
+        # What the subscription sees after another worker published
+        await sync_to_async(notifications_cache.bump_version)(f"user:{self.user.id}")
+        push._handle_message(str(self.user.id).encode())
+
+        self.assertNotEqual(await asyncio.wait_for(waiter, 5), version)
+
+    def test_long_poll_under_wsgi_answers_at_once(self):
+        url = reverse("notifications:notification_wait_api")
+        version = push.get_version(self.user.id)
+        data = self.client.get(url, {"since": version}).json()
+
+        self.assertFalse(data["changed"])
+        self.assertEqual(data["retry_after"], 30)
+
+
+@override_settings(NOTIFICATION_FANOUT_CHUNK_SIZE=2)
+class AnnouncementFanoutTests(NotificationTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [
+            cls.create_user(f"student{i}", is_student=True) for i in range(5)
+        ]
+        cls.staff = cls.create_user("staff", is_staff=True)
+
+    def announcement_counts(self):
+        return [
+            Notification.objects.filter(
+                recipient=student, notification_type=ANNOUNCEMENT
+            ).count()
+            for student in self.students
+        ]
+
+    def started_job(self, **fields):
+        """A job the fan-out was already working on"""
+        return AnnouncementJob.objects.create(
+            title="News", message="Hello", started_at=timezone.now(), total=5, **fields
+        )
+
+    def test_pending_job_becomes_a_broadcast(self):
+        job = AnnouncementJob.objects.create(
+            title="News", message="Hello", created_by=self.staff
+        )
+        call_command("send_announcements", stdout=StringIO())
+
+        self.assertEqual(self.announcement_counts(), [0] * 5)
+        broadcast = Broadcast.objects.get()
+        self.assertEqual((broadcast.title, broadcast.audience), ("News", Broadcast.ALL))
+        self.assertEqual(broadcast.created_by, self.staff)
+        self.client.force_login(self.staff)
+        response = self.client.get(
+            reverse("notifications:announcement_job_api", args=[job.id])
+        )
+        job = response.json()["job"]
+        self.assertEqual((job["status"], job["progress_percentage"]), ("completed", 100))
+
+    def test_admin_cannot_queue_new_jobs(self):
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("admin:notifications_announcementjob_add"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_job_resumes_after_failure_without_duplicates(self):
+        job = self.started_job()
+        calls = []
+
+        def fail_on_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("worker died")
+            return create_announcements(*args, **kwargs)
+
+        with mock.patch.object(fanout, "create_announcements", fail_on_second_chunk):
+            with self.assertRaises(RuntimeError):
+                fanout.run(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnnouncementJob.FAILED)
+        self.assertEqual((job.sent, job.last_user_id), (2, self.students[1].id))
+
+        call_command("send_announcements", stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.sent), (AnnouncementJob.COMPLETED, 5))
+        self.assertEqual(self.announcement_counts(), [1] * 5)
+
+    def test_sent_counts_only_created_notifications(self):
+        NotificationPreference.objects.create(
+            user=self.students[0], app_announcements=False
+        )
+        job = self.started_job()
+
+        job = fanout.run(job.id)
+
+        self.assertEqual(self.announcement_counts(), [0, 1, 1, 1, 1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.sent), (AnnouncementJob.COMPLETED, 4))
+        self.assertEqual(job.progress_percentage, 100)
+
+    def test_running_job_is_only_taken_over_once_stalled(self):
+        job = self.started_job(
+            status=AnnouncementJob.RUNNING, heartbeat_at=timezone.now()
+        )
+        self.assertIsNone(fanout.run(job.id))
+
+        AnnouncementJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(fanout.run(job.id).status, AnnouncementJob.COMPLETED)
+        self.assertEqual(self.announcement_counts(), [1] * 5)
+
+    def test_bulk_create_announcement_streams_ids_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            count = bulk_create_announcement(
+                "News", "Hello", users=User.objects.filter(is_student=True)
+            )
+
+        self.assertEqual(count, 5)
+        self.assertEqual(self.announcement_counts(), [1] * 5)
+        inserts = [
+            query
+            for query in queries
+            if query["sql"].startswith('INSERT INTO "notifications_notification"')
+        ]
+        self.assertEqual(len(inserts), 3)
+
+
+class NotificationListV2Tests(NotificationTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user("student")
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notifications = [
+                create_notification(self.user, f"Title {i}", "Message")
+                for i in range(5)
+            ]
+            self.notifications[0].mark_as_read()
+        self.url = reverse("notifications:notification_list_api_v2")
+
+    def notification_queries(self, queries):
+        return [q for q in queries if "notifications_notification" in q["sql"]]
+
+    def test_keyset_pages_with_counts_on_first_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(self.url, {"per_page": 3}).json()
+        self.assertEqual(len(self.notification_queries(queries)), 2)
+        self.assertEqual((first["total_count"], first["unread_count"]), (5, 4))
+        self.assertTrue(first["has_next"])
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(
+                self.url, {"per_page": 3, "cursor": first["next_cursor"]}
+            ).json()
+        self.assertEqual(len(self.notification_queries(queries)), 1)
+        self.assertNotIn("total_count", second)
+        self.assertFalse(second["has_next"])
+
+        ids = [n["id"] for n in first["notifications"] + second["notifications"]]
+        self.assertEqual(ids, [n.id for n in reversed(self.notifications)])
+
+    def test_filters_apply_to_page_and_total(self):
+        data = self.client.get(self.url, {"unread_only": "true"}).json()
+        self.assertEqual(len(data["notifications"]), 4)
+        self.assertEqual((data["total_count"], data["unread_count"]), (4, 4))
+
+    def test_unchanged_inbox_returns_304(self):
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(self.notification_queries(queries))
+
+        # Deleting a read notification changes the inbox but not the count
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notifications[0].delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class BroadcastTests(NotificationTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.program = Program.objects.create(title="AI Bootcamp")
+        cls.course = Course.objects.create(
+            title="ML", code="ML101", program=cls.program
+        )
+        other_program = Program.objects.create(title="Web Bootcamp")
+        cls.enrolled, cls.other = [
+            cls.create_user(f"student{i}", is_student=True) for i in range(2)
+        ]
+        student = Student.objects.create(student=cls.enrolled, program=cls.program)
+        Student.objects.create(student=cls.other, program=other_program)
+        TakenCourse.objects.create(student=student, course=cls.course)
+        cls.staff = cls.create_user("staff", is_staff=True)
+
+    def broadcast(self, title, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Broadcast.objects.create(title=title, message="Hello", **kwargs)
+
+    def visible(self, user):
+        return sorted(b.title for b in Broadcast.objects.for_user(user))
+
+    def test_audience_decides_visibility(self):
+        self.broadcast("All")
+        self.broadcast("Program", audience=Broadcast.PROGRAM, program=self.program)
+        self.broadcast("Course", audience=Broadcast.COURSE, course=self.course)
+
+        self.assertEqual(self.visible(self.enrolled), ["All", "Course", "Program"])
+        self.assertEqual(self.visible(self.other), ["All"])
+        self.assertEqual(self.visible(self.staff), [])
+
+        # Students only see broadcasts sent since they joined
+        User.objects.filter(pk=self.other.pk).update(
+            date_joined=timezone.now() + timedelta(minutes=1)
+        )
+        self.other.refresh_from_db()
+        self.assertEqual(self.visible(self.other), [])
+
+    def test_announcement_is_one_row_merged_into_every_inbox(self):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("notifications:create_announcement_api"),
+                    json.dumps({"title": "News", "message": "Hello"}),
+                    content_type="application/json",
+                )
+        self.assertEqual(response.status_code, 201)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn("notifications_broadcast", inserts[0]["sql"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(self.enrolled, "Personal", "Message")
+        self.client.force_login(self.enrolled)
+        data = self.client.get(
+            reverse("notifications:notification_list_api_v2")
+        ).json()
+        self.assertEqual(
+            [(n["kind"], n["title"]) for n in data["notifications"]],
+            [("notification", "Personal"), ("broadcast", "News")],
+        )
+        self.assertEqual((data["total_count"], data["unread_count"]), (2, 2))
+
+        data = self.client.get(
+            reverse("notifications:notification_list_api"), {"per_page": 1}
+        ).json()
+        self.assertEqual(data["pagination"]["total_pages"], 2)
+        data = self.client.get(
+            reverse("notifications:notification_list_api"),
+            {"per_page": 1, "page": 2},
+        ).json()
+        self.assertEqual(data["notifications"][0]["kind"], "broadcast")
+        self.assertEqual(data["unread_count"], 2)
+
+    def test_mark_all_read_is_one_insert(self):
+        news = self.broadcast("News")
+        for i in range(5):
+            self.broadcast(f"Old {i}")
+        Broadcast.objects.mark_read(self.enrolled, [news.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(Broadcast.objects.mark_all_read(self.enrolled), 5)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Broadcast.objects.mark_all_read(self.enrolled), 0)
+        self.assertEqual(unread.get_count(self.enrolled), 0)
+
+    def test_reading_and_deleting_only_affects_the_reader(self):
+        news = self.broadcast("News")
+        self.broadcast("Later")
+        self.assertEqual(unread.get_count(self.enrolled), 2)
+        self.client.force_login(self.enrolled)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("notifications:mark_broadcast_read", args=[news.id])
+            )
+        self.assertEqual(unread.get_count(self.enrolled), 1)
+        read = Broadcast.objects.for_user(self.enrolled).get(pk=news.pk)
+        self.assertTrue(read.is_read)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("notifications:delete_broadcast", args=[news.id]))
+        self.assertEqual(self.visible(self.enrolled), ["Later"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("notifications:mark_all_notifications_read")
+            )
+        self.assertEqual(response.json()["updated_count"], 1)
+        self.assertEqual(unread.get_count(self.enrolled), 0)
+
+        self.assertEqual(self.visible(self.other), ["Later", "News"])
+        self.assertEqual(unread.get_count(self.other), 2)
+
+    def test_new_broadcast_changes_every_version(self):
+        version = push.get_version(self.enrolled.id)
+        self.assertEqual(unread.get_count(self.enrolled), 0)
+        self.broadcast("News")
+        self.assertNotEqual(push.get_version(self.enrolled.id), version)
+        self.assertEqual(unread.get_count(self.enrolled), 1)
+
+    def test_enrollment_changes_recount_broadcasts(self):
+        self.broadcast("Course", audience=Broadcast.COURSE, course=self.course)
+        self.broadcast("Program", audience=Broadcast.PROGRAM, program=self.program)
+        self.assertEqual(unread.get_count(self.other), 0)
+        version = push.get_version(self.other.id)
+
+        student = Student.objects.get(student=self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            TakenCourse.objects.create(student=student, course=self.course)
+        self.assertEqual(unread.get_count(self.other), 1)
+        self.assertNotEqual(push.get_version(self.other.id), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.program = self.program
+            student.save()
+        self.assertEqual(unread.get_count(self.other), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TakenCourse.objects.filter(student=student).delete()
+        self.assertEqual(unread.get_count(self.other), 1)
+
+    def test_enrollment_invalidates_the_list_etag(self):
+        self.broadcast("Course", audience=Broadcast.COURSE, course=self.course)
+        self.client.force_login(self.other)
+        url = reverse("notifications:notification_list_api_v2")
+        etag = self.client.get(url)["ETag"]
+
+        student = Student.objects.get(student=self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            TakenCourse.objects.create(student=student, course=self.course)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [n["title"] for n in response.json()["notifications"]], ["Course"]
+        )
+
+    def test_v1_pages_through_the_merged_stream(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                create_notification(self.enrolled, f"Personal {i}", "Message")
+                Broadcast.objects.create(title=f"Broadcast {i}", message="Hello")
+        # Equal timestamps and overlapping ids across both tables
+        moment = timezone.now()
+        Notification.objects.update(created_at=moment)
+        Broadcast.objects.update(created_at=moment)
+        expected = sorted(
+            [(n.id, 0) for n in Notification.objects.all()]
+            + [(b.id, 1) for b in Broadcast.objects.all()],
+            reverse=True,
+        )
+
+        self.client.force_login(self.enrolled)
+        url = reverse("notifications:notification_list_api")
+        seen = []
+        for page in range(1, 4):
+            data = self.client.get(url, {"page": page, "per_page": 2}).json()
+            seen += [
+                (n["id"], int(n["kind"] == "broadcast")) for n in data["notifications"]
+            ]
+        self.assertEqual(seen, expected)
+        self.assertFalse(data["pagination"]["has_next"])
+
+        data = self.client.get(url, {"per_page": 0}).json()
+        self.assertEqual(len(data["notifications"]), 1)
+        data = self.client.get(url, {"per_page": 10000}).json()
+        self.assertEqual(data["pagination"]["total_pages"], 1)
+
+    def test_notifications_page_merges_broadcasts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(
+                self.enrolled, "Personal", "Message", notification_type=ANNOUNCEMENT
+            )
+            Broadcast.objects.create(title="News", message="Hello")
+            for i in range(20):
+                create_notification(
+                    self.enrolled, f"Update {i}", "Message", "progress_update"
+                )
+        self.client.force_login(self.enrolled)
+
+        response = self.client.get(reverse("notifications:notification_list"))
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        self.assertEqual((context["total_count"], context["unread_count"]), (22, 22))
+        types = {t["type"]: t["count"] for t in context["notification_types"]}
+        self.assertEqual(types, {ANNOUNCEMENT: 2, "progress_update": 20})
+
+        response = self.client.get(
+            reverse("notifications:notification_list"), {"page": 2}
+        )
+        self.assertEqual(
+            [n.kind for n in response.context["notifications"]],
+            ["broadcast", "notification"],
+        )
+        self.assertContains(response, "News")
+
+    def test_targeted_announcement_requires_its_target(self):
+        self.client.force_login(self.staff)
+        response = self.client.post(
+            reverse("notifications:create_announcement_api"),
+            json.dumps({"title": "News", "message": "Hello", "audience": "course"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Broadcast.objects.exists())
+
+
+class PreferenceResolverTests(NotificationTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [cls.create_user(f"user{i}", is_student=True) for i in range(3)]
+        cls.muted = cls.users[1]
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preference = NotificationPreference.objects.create(
+                user=self.muted, app_announcements=False
+            )
+
+    def test_new_users_get_defaults_without_a_row(self):
+        self.assertFalse(
+            NotificationPreference.objects.filter(user=self.users[0]).exists()
+        )
+        flags = preferences.resolve([self.users[0].id])[self.users[0].id]
+        self.assertTrue(all(flags.values()))
+
+    def test_batch_is_resolved_with_one_query_then_cached(self):
+        ids = [user.id for user in self.users]
+        with self.assertNumQueries(1):
+            allowed = preferences.filter_recipients(ids, ANNOUNCEMENT)
+        self.assertEqual(allowed, [self.users[0].id, self.users[2].id])
+
+        with self.assertNumQueries(0):
+            preferences.filter_recipients(ids, ANNOUNCEMENT)
+        self.assertEqual(preferences.filter_recipients(ids, "welcome"), ids)
+
+    def test_misses_are_backfilled_with_one_cache_write(self):
+        ids = [user.id for user in self.users]
+        namespace = preferences.notifications_cache
+        with mock.patch.object(namespace, "set_many") as set_many:
+            with mock.patch.object(namespace, "set") as set_:
+                preferences.resolve(ids)
+
+        set_many.assert_called_once()
+        self.assertEqual(len(set_many.call_args.args[0]), 3)
+        set_.assert_not_called()
+
+    def test_producers_skip_opted_out_users(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(
+                bulk_create_announcement(
+                    "News", "Hello", users=User.objects.filter(is_student=True)
+                ),
+                2,
+            )
+            self.assertIsNone(create_notification(self.muted, "News", "Hello"))
+            Broadcast.objects.create(title="Broadcast", message="Hello")
+        self.assertFalse(Notification.objects.filter(recipient=self.muted).exists())
+        self.assertFalse(Broadcast.objects.for_user(self.muted).exists())
+        self.assertEqual(unread.get_count(self.muted), 0)
+        self.assertEqual(unread.get_count(self.users[0]), 2)
+
+    def test_saving_preferences_drops_the_cached_flags(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Broadcast.objects.create(title="Broadcast", message="Hello")
+        self.assertEqual(unread.get_count(self.muted), 0)
+
+        self.preference.app_announcements = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.preference.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNotNone(create_notification(self.muted, "News", "Hello"))
+        self.assertEqual(unread.get_count(self.muted), 2)
@@ -0,0 +1,151 @@
+"""
+Cached unread notification counters.
+
+The navbar polls the unread count on every open page, which used to run
+a COUNT(*) per poll. The count of each user is now kept in the cache:
+it is computed once on a miss and then moved up and down by the code
+that creates, reads and deletes notifications, once the surrounding
+transaction commits. The time of the last count is stored next to the
+counter, and a counter older than ``NOTIFICATION_UNREAD_COUNT_TIMEOUT``
+seconds is recounted from the database on its next read however often
+it was moved since, so drift from lost increments is reconciled on any
+cache backend. Every change also wakes up the user's open pages, see
+``notifications.push``.
+
+Unread broadcasts are counted separately and cached under the version
+of all broadcasts, so publishing or removing one recounts everyone
+lazily while reading or hiding one only drops that user's entry.
+"""
+
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import notifications_cache
+
+from . import push
+
+
+def get_timeout():
+    return getattr(settings, "NOTIFICATION_UNREAD_COUNT_TIMEOUT", 300)
+
+
+def _key(user_id):
+    return f"unread:{user_id}"
+
+
+def _counted_at_key(user_id):
+    return f"unread:{user_id}:counted-at"
+
+
+def _broadcast_key(user_id):
+    return notifications_cache.versioned_key(push.BROADCASTS, f"unread:{user_id}")
+
+
+def get_count(user):
+    """Number of unread notifications and broadcasts of a user"""
+    return get_notification_count(user.pk) + _get_broadcast_count(user)
+
+
+def _get_broadcast_count(user):
+    key = _broadcast_key(user.pk)
+    count = notifications_cache.get(key)
+    if count is None:
+        from .models import Broadcast
+
+        count = Broadcast.objects.for_user(user).filter(is_read=False).count()
+        notifications_cache.set(key, count, get_timeout())
+    return count
+
+
+def get_notification_count(user_id):
+    from .models import Notification
+
+    key, counted_at_key = _key(user_id), _counted_at_key(user_id)
+    cached = notifications_cache.get_many([key, counted_at_key])
+    count = cached.get(key)
+    counted_at = cached.get(counted_at_key)
+    if count is not None and counted_at is not None:
+        if time.time() - counted_at < get_timeout():
+            return max(count, 0)
+
+    now = time.time()
+    fresh = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    # Entries outlive the reconciliation period so an old counter is found
+    timeout = get_timeout() * 2
+    if count is None:
+        # Keep a counter that was set or adjusted in the meantime
+        if not notifications_cache.add(key, fresh, timeout):
+            fresh = notifications_cache.get(key, fresh)
+    else:
+        notifications_cache.set(key, fresh, timeout)
+    notifications_cache.set(counted_at_key, now, timeout)
+    return max(fresh, 0)
+
+
+def adjust(deltas):
+    """
+    Move the counters of several users after the current transaction
+    commits. ``deltas`` maps user ids to the change of their unread count.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def _apply(deltas):
+    for user_id, delta in deltas.items():
+        try:
+            notifications_cache.incr(_key(user_id), delta)
+        except ValueError:
+            # Not cached: the next read counts from the database
+            pass
+    push.publish(deltas)
+
+
+def added(user_ids):
+    """Count new unread notifications, one per occurrence of a user id"""
+    adjust(Counter(user_ids))
+
+
+def removed(user_ids):
+    """Count notifications that were read or deleted while unread"""
+    adjust({user_id: -count for user_id, count in Counter(user_ids).items()})
+
+
+def changed(user_ids):
+    """Signal a change to notifications that leaves the unread counts alone"""
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: push.publish(user_ids))
+
+
+def invalidate(user_ids):
+    """Recount the given users from the database on their next read"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+
+    def delete():
+        for user_id in user_ids:
+            notifications_cache.delete(_key(user_id))
+        push.publish(user_ids)
+
+    transaction.on_commit(delete)
+
+
+def broadcasts_changed(user_ids=None):
+    """
+    Recount unread broadcasts once the current transaction commits, for
+    the given users or, when a broadcast itself changed, for everyone.
+    """
+    if user_ids is None:
+        transaction.on_commit(push.publish_broadcasts)
+        return
+    user_ids = set(user_ids)
+
+    def delete():
+        for user_id in user_ids:
+            notifications_cache.delete(_broadcast_key(user_id))
+        push.publish(user_ids)
+
+    transaction.on_commit(delete)
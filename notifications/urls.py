@@ -7,7 +7,14 @@ app_name = "notifications"
 urlpatterns = [
     # API endpoints
     path("api/list/", views.notification_list_api, name="notification_list_api"),
+    path(
+        "api/v2/list/",
+        views.notification_list_api_v2,
+        name="notification_list_api_v2",
+    ),
     path("api/count/", views.notification_count_api, name="notification_count_api"),
+    path("api/stream/", views.notification_stream, name="notification_stream"),
+    path("api/wait/", views.notification_wait_api, name="notification_wait_api"),
     path(
         "api/mark-read/<int:notification_id>/",
         views.mark_notification_read,
@@ -23,6 +30,16 @@ urlpatterns = [
         views.delete_notification,
         name="delete_notification",
     ),
+    path(
+        "api/broadcasts/<int:broadcast_id>/mark-read/",
+        views.mark_broadcast_read,
+        name="mark_broadcast_read",
+    ),
+    path(
+        "api/broadcasts/<int:broadcast_id>/delete/",
+        views.delete_broadcast,
+        name="delete_broadcast",
+    ),
     # HTML views
     path("", views.NotificationListView.as_view(), name="notification_list"),
     path(
@@ -36,5 +53,10 @@ urlpatterns = [
         views.create_announcement_api,
         name="create_announcement_api",
     ),
+    path(
+        "api/announcements/<int:job_id>/",
+        views.announcement_job_api,
+        name="announcement_job_api",
+    ),
     path("api/test/", views.notification_test_view, name="notification_test"),
 ]
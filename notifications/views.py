@@ -1,99 +1,315 @@
+import asyncio
+import hashlib
 import json
+import math
 
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Count, Max, Q, Value
+from django.http import (
+    HttpResponse,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.generic import ListView
 
+from core.merge import encode_cursor, merge_querysets
+
+from . import push, unread
 from .models import (
+    ANNOUNCEMENT,
+    NOTIFICATION_TYPES,
+    AnnouncementJob,
+    Broadcast,
     Notification,
     NotificationPreference,
-    bulk_create_announcement,
     create_notification,
 )
 
 
+def serialize_list_item(notification):
+    """Lean list entry: clients format the age from ``created_at``"""
+    return {
+        "id": notification.id,
+        "kind": notification.kind,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.notification_type,
+        "priority": notification.priority,
+        "is_read": notification.is_read,
+        "created_at": notification.created_at.isoformat(),
+        "icon": notification.type_icon,
+        "color": notification.type_color,
+        "action_url": notification.action_url,
+        "related_course": (
+            {
+                "id": notification.related_course.id,
+                "title": notification.related_course.title,
+            }
+            if notification.related_course
+            else None
+        ),
+        "related_video": (
+            {
+                "id": notification.related_video.id,
+                "title": notification.related_video.title,
+            }
+            if notification.related_video
+            else None
+        ),
+    }
+
+
+def serialize_notification(notification):
+    """Notification as returned by the JSON APIs"""
+    return dict(
+        serialize_list_item(notification), time_since=notification.time_since_created
+    )
+
+
+# Personal notifications and broadcasts are merged newest first
+LIST_ORDER = ["-created_at", "-id"]
+
+
+def _broadcasts_for(user, unread_only=False, notification_type=None):
+    """Broadcasts to merge into a user's list, None when filtered out"""
+    if notification_type and notification_type != ANNOUNCEMENT:
+        return None
+    broadcasts = Broadcast.objects.for_user(user)
+    if unread_only:
+        broadcasts = broadcasts.filter(is_read=False)
+    return broadcasts
+
+
+def _offset_cursor(sources, offset):
+    """
+    A core.merge cursor positioned after the first ``offset`` merged rows.
+    The database finds the boundary row over a UNION of the sort keys, so
+    deep pages do not load the rows before them.
+    """
+    if not offset:
+        return None
+    keys = [
+        source.order_by()
+        .annotate(source=Value(index))
+        .values("created_at", "id", "source")
+        for index, source in enumerate(sources)
+    ]
+    # Equal keys are merged by descending source index, see core.merge
+    boundary = (
+        keys[0]
+        .union(*keys[1:], all=True)
+        .order_by("-created_at", "-id", "-source")[offset - 1 : offset]
+    )
+    for row in boundary:
+        return encode_cursor([row["created_at"], row["id"]], row["source"])
+    return None
+
+
+class MergedList:
+    """
+    Notifications and broadcasts as one sequence for a Paginator. Only
+    the length and page slices are supported; each slice reads just its
+    page from ``merge_querysets``.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, index.stop
+        return merge_querysets(
+            self.sources,
+            LIST_ORDER,
+            stop - start,
+            cursor=_offset_cursor(self.sources, start),
+            with_count=False,
+        ).items
+
+
 @login_required
 @require_GET
 def notification_list_api(request):
-    """API endpoint to get user's notifications"""
+    """API endpoint to get user's notifications and broadcasts"""
 
     # Get query parameters
-    page = int(request.GET.get("page", 1))
-    per_page = int(request.GET.get("per_page", 10))
+    try:
+        page = int(request.GET.get("page", 1))
+        per_page = min(max(int(request.GET.get("per_page", 10)), 1), LIST_MAX_PER_PAGE)
+    except ValueError:
+        return JsonResponse({"error": "Invalid page"}, status=400)
     unread_only = request.GET.get("unread_only", "false").lower() == "true"
     notification_type = request.GET.get("type", None)
 
-    # Build queryset
-    notifications = Notification.objects.for_user(request.user)
+    # Build querysets
+    notifications = Notification.objects.for_user(request.user).select_related(
+        "related_course", "related_video"
+    )
 
     if unread_only:
-        notifications = notifications.unread()
+        notifications = notifications.filter(is_read=False)
 
     if notification_type:
-        notifications = notifications.by_type(notification_type)
-
-    # Paginate
-    paginator = Paginator(notifications, per_page)
-    page_obj = paginator.get_page(page)
+        notifications = notifications.filter(notification_type=notification_type)
+
+    sources = [notifications]
+    broadcasts = _broadcasts_for(request.user, unread_only, notification_type)
+    if broadcasts is not None:
+        sources.append(broadcasts.select_related("course"))
+
+    # Paginate the merged stream from the row before the page
+    total_count = sum(source.count() for source in sources)
+    total_pages = max(math.ceil(total_count / per_page), 1)
+    page = min(max(page, 1), total_pages)
+    merged = merge_querysets(
+        sources,
+        LIST_ORDER,
+        per_page,
+        cursor=_offset_cursor(sources, (page - 1) * per_page),
+        with_count=False,
+    )
 
-    # Serialize notifications
-    notifications_data = []
-    for notification in page_obj:
-        notifications_data.append(
-            {
-                "id": notification.id,
-                "title": notification.title,
-                "message": notification.message,
-                "type": notification.notification_type,
-                "priority": notification.priority,
-                "is_read": notification.is_read,
-                "created_at": notification.created_at.isoformat(),
-                "time_since": notification.time_since_created,
-                "icon": notification.type_icon,
-                "color": notification.type_color,
-                "action_url": notification.action_url,
-                "related_course": (
-                    {
-                        "id": notification.related_course.id,
-                        "title": notification.related_course.title,
-                    }
-                    if notification.related_course
-                    else None
-                ),
-                "related_video": (
-                    {
-                        "id": notification.related_video.id,
-                        "title": notification.related_video.title,
-                    }
-                    if notification.related_video
-                    else None
-                ),
-            }
-        )
+    notifications_data = [
+        serialize_notification(notification) for notification in merged
+    ]
 
     return JsonResponse(
         {
             "notifications": notifications_data,
             "pagination": {
-                "current_page": page_obj.number,
-                "total_pages": paginator.num_pages,
-                "total_count": paginator.count,
-                "has_next": page_obj.has_next(),
-                "has_previous": page_obj.has_previous(),
+                "current_page": page,
+                "total_pages": total_pages,
+                "total_count": total_count,
+                "has_next": page < total_pages,
+                "has_previous": page > 1,
             },
-            "unread_count": Notification.objects.for_user(request.user)
-            .unread()
-            .count(),
+            "unread_count": unread.get_count(request.user),
         }
     )
 
 
+# Columns read by the v2 list API
+LIST_FIELDS = [
+    "id",
+    "title",
+    "message",
+    "notification_type",
+    "priority",
+    "is_read",
+    "created_at",
+    "action_url",
+    "icon",
+    "color",
+    "related_course__id",
+    "related_course__title",
+    "related_video__id",
+    "related_video__title",
+]
+BROADCAST_LIST_FIELDS = [
+    "id",
+    "title",
+    "message",
+    "priority",
+    "created_at",
+    "action_url",
+    "icon",
+    "color",
+    "course__id",
+    "course__title",
+]
+LIST_MAX_PER_PAGE = 50
+
+
+def notification_list_etag(request):
+    if not request.user.is_authenticated:
+        return None
+    # The version moves with every change to the user's notifications
+    version = push.get_version(request.user.id)
+    key = f"{request.user.id}:{version}:{request.GET.urlencode()}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+@login_required
+@require_GET
+@condition(etag_func=notification_list_etag)
+def notification_list_api_v2(request):
+    """
+    API endpoint to get user's notifications, newest first, one keyset
+    page at a time. Pass ``next_cursor`` back as ``cursor`` for the next
+    page. Counts are only computed for the first page.
+    """
+    try:
+        per_page = min(max(int(request.GET.get("per_page", 10)), 1), LIST_MAX_PER_PAGE)
+    except ValueError:
+        return JsonResponse({"error": "Invalid per_page"}, status=400)
+    cursor = request.GET.get("cursor") or None
+    unread_only = request.GET.get("unread_only", "false").lower() == "true"
+    notification_type = request.GET.get("type")
+
+    filters = Q()
+    if unread_only:
+        filters &= Q(is_read=False)
+    if notification_type:
+        filters &= Q(notification_type=notification_type)
+
+    notifications = (
+        Notification.objects.for_user(request.user)
+        .filter(filters)
+        .select_related("related_course", "related_video")
+        .only(*LIST_FIELDS)
+    )
+    sources = [notifications]
+    broadcasts = _broadcasts_for(request.user, unread_only, notification_type)
+    if broadcasts is not None:
+        sources.append(
+            broadcasts.select_related("course").only(*BROADCAST_LIST_FIELDS)
+        )
+    page = merge_querysets(
+        sources, LIST_ORDER, per_page, cursor=cursor, with_count=False
+    )
+
+    data = {
+        "notifications": [serialize_list_item(n) for n in page],
+        "next_cursor": page.next_cursor,
+        "has_next": page.has_next,
+    }
+    if cursor is None:
+        # Both counts in one query per source
+        counts = Notification.objects.for_user(request.user).aggregate(
+            total_count=Count("id", filter=filters) if filters else Count("id"),
+            unread_count=Count("id", filter=Q(is_read=False)),
+        )
+        broadcast_counts = Broadcast.objects.for_user(request.user).aggregate(
+            total_count=(
+                Count("id", filter=Q(is_read=False)) if unread_only else Count("id")
+            ),
+            unread_count=Count("id", filter=Q(is_read=False)),
+        )
+        if broadcasts is None:
+            broadcast_counts["total_count"] = 0
+        data.update(
+            {name: counts[name] + broadcast_counts[name] for name in counts}
+        )
+    response = JsonResponse(data)
+    # Let the browser revalidate with If-None-Match instead of refetching
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @login_required
 @require_POST
 @csrf_exempt
@@ -121,12 +337,7 @@ def mark_notification_read(request, notification_id):
 def mark_all_notifications_read(request):
     """Mark all user's notifications as read"""
 
-    updated_count = 0
-    unread_notifications = Notification.objects.for_user(request.user).unread()
-
-    for notification in unread_notifications:
-        notification.mark_as_read()
-        updated_count += 1
+    updated_count = Notification.objects.mark_all_read(request.user)
 
     return JsonResponse(
         {
@@ -141,25 +352,171 @@ def mark_all_notifications_read(request):
 @require_GET
 def notification_count_api(request):
     """Get unread notification count for user"""
-    from django.db import connection
-    
     try:
-        # Close stale connection before query to avoid EOF errors
-        connection.close_if_unusable_or_obsolete()
-        
-        unread_count = Notification.objects.filter(
-            recipient=request.user, is_read=False
-        ).count()
-
-        return JsonResponse({"unread_count": unread_count})
+        # Served from the cache, the database is only hit on a miss
+        unread_count = unread.get_count(request.user)
     except Exception as e:
         # Log the error but return a safe response
         import logging
+
         logger = logging.getLogger(__name__)
         logger.error(f"Error fetching notification count: {e}")
-        
+
         # Return 0 count to avoid breaking the UI
-        return JsonResponse({"unread_count": 0})
+        unread_count = 0
+
+    return JsonResponse({"unread_count": unread_count})
+
+
+# Push delivery. Django 4.2 decorators do not wrap async views, so the
+# method and login checks are done by hand.
+
+# Notifications sent per event stream round trip
+STREAM_BATCH_SIZE = 20
+# Comment lines keep proxies from closing an idle stream
+STREAM_HEARTBEAT = 15  # seconds
+STREAM_RECONNECT_MS = 3000
+# How often pages without a push connection ask for the count
+POLL_RETRY_AFTER = 30  # seconds
+
+
+def _release_connection():
+    # Do not hold a database connection while the request waits
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def _authenticated_user(request):
+    try:
+        return request.user if request.user.is_authenticated else None
+    finally:
+        _release_connection()
+
+
+def _latest_notification_id(user_id):
+    try:
+        return (
+            Notification.objects.filter(recipient_id=user_id).aggregate(
+                latest=Max("id")
+            )["latest"]
+            or 0
+        )
+    finally:
+        _release_connection()
+
+
+def _changes_since(user, last_id):
+    """
+    Notifications of a user after ``last_id`` and their unread count.
+    Broadcasts only move the count, pages reload the list when it changes.
+    """
+    try:
+        notifications = [
+            serialize_notification(notification)
+            for notification in Notification.objects.filter(
+                recipient_id=user.id, id__gt=last_id
+            )
+            .select_related("related_course", "related_video")
+            .order_by("id")[:STREAM_BATCH_SIZE]
+        ]
+        return notifications, unread.get_count(user)
+    finally:
+        _release_connection()
+
+
+def _get_unread_count(user):
+    try:
+        return unread.get_count(user)
+    finally:
+        _release_connection()
+
+
+def _sse_message(event, data, event_id):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_events(user, last_id):
+    user_id = user.id
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + push.get_stream_timeout()
+    version = await sync_to_async(push.get_version, thread_sensitive=False)(user_id)
+    if last_id is None:
+        last_id = await sync_to_async(_latest_notification_id)(user_id)
+
+    yield f"retry: {STREAM_RECONNECT_MS}\n\n"
+    changed = True
+    while True:
+        if changed:
+            notifications, count = await sync_to_async(_changes_since)(
+                user, last_id
+            )
+            for notification in notifications:
+                last_id = notification["id"]
+                yield _sse_message("notification", notification, last_id)
+            yield _sse_message("count", {"unread_count": count}, last_id)
+        else:
+            yield ": keep-alive\n\n"
+
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            # The browser reconnects and resumes from the last event id
+            return
+        current = await push.wait_for_change(
+            user_id, version, min(remaining, STREAM_HEARTBEAT)
+        )
+        changed = current != version
+        version = current
+
+
+async def notification_stream(request):
+    """Server-Sent Events stream of new notifications and the unread count"""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user = await sync_to_async(_authenticated_user)(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    if not push.can_wait(request):
+        # EventSource gives up on 204 and the page falls back to polling
+        return HttpResponse(status=204)
+
+    try:
+        last_id = int(request.headers["Last-Event-ID"])
+    except (KeyError, ValueError):
+        last_id = None
+
+    response = StreamingHttpResponse(
+        _stream_events(user, last_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def notification_wait_api(request):
+    """
+    Long-poll for the unread count: waits until the notifications of the
+    user change after the ``since`` version returned by a previous call.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    user = await sync_to_async(_authenticated_user)(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+
+    since = request.GET.get("since") or None
+    can_wait = push.can_wait(request)
+    timeout = push.get_long_poll_timeout() if can_wait and since is not None else 0
+
+    version = await push.wait_for_change(user.id, since, timeout)
+    unread_count = await sync_to_async(_get_unread_count)(user)
+    return JsonResponse(
+        {
+            "unread_count": unread_count,
+            "version": version,
+            "changed": version != since,
+            "retry_after": 0 if can_wait else POLL_RETRY_AFTER,
+        }
+    )
 
 
 @login_required
@@ -179,6 +536,44 @@ def delete_notification(request, notification_id):
     )
 
 
+@login_required
+@require_POST
+@csrf_exempt
+def mark_broadcast_read(request, broadcast_id):
+    """Mark a broadcast as read for the user"""
+
+    broadcast = get_object_or_404(
+        Broadcast.objects.for_user(request.user), id=broadcast_id
+    )
+
+    Broadcast.objects.mark_read(request.user, [broadcast.id])
+
+    return JsonResponse(
+        {
+            "success": True,
+            "message": "Notification marked as read",
+            "notification_id": broadcast_id,
+        }
+    )
+
+
+@login_required
+@require_POST
+@csrf_exempt
+def delete_broadcast(request, broadcast_id):
+    """Remove a broadcast from the user's notifications"""
+
+    broadcast = get_object_or_404(
+        Broadcast.objects.for_user(request.user), id=broadcast_id
+    )
+
+    Broadcast.objects.hide(request.user, broadcast)
+
+    return JsonResponse(
+        {"success": True, "message": "Notification deleted successfully"}
+    )
+
+
 @method_decorator(login_required, name="dispatch")
 class NotificationListView(ListView):
     """HTML view for notifications page"""
@@ -189,25 +584,37 @@ class NotificationListView(ListView):
     paginate_by = 20
 
     def get_queryset(self):
-        return Notification.objects.for_user(self.request.user)
+        return MergedList(
+            [
+                Notification.objects.for_user(self.request.user).select_related(
+                    "related_course", "related_video"
+                ),
+                _broadcasts_for(self.request.user).select_related("course"),
+            ]
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         # Add notification statistics
-        user_notifications = Notification.objects.for_user(self.request.user)
+        user = self.request.user
+        type_counts = dict(
+            Notification.objects.for_user(user)
+            .order_by()
+            .values_list("notification_type")
+            .annotate(count=Count("id"))
+        )
+        broadcasts = Broadcast.objects.for_user(user).count()
+        if broadcasts:
+            type_counts[ANNOUNCEMENT] = type_counts.get(ANNOUNCEMENT, 0) + broadcasts
         context.update(
             {
-                "unread_count": user_notifications.unread().count(),
-                "total_count": user_notifications.count(),
+                "unread_count": unread.get_count(user),
+                "total_count": sum(type_counts.values()),
                 "notification_types": [
-                    {
-                        "type": nt[0],
-                        "label": nt[1],
-                        "count": user_notifications.by_type(nt[0]).count(),
-                    }
-                    for nt in Notification.NOTIFICATION_TYPES
-                    if user_notifications.by_type(nt[0]).exists()
+                    {"type": value, "label": label, "count": type_counts[value]}
+                    for value, label in NOTIFICATION_TYPES
+                    if type_counts.get(value)
                 ],
             }
         )
@@ -219,9 +626,10 @@ class NotificationListView(ListView):
 def notification_preferences_view(request):
     """View and update notification preferences"""
 
-    preferences, created = NotificationPreference.objects.get_or_create(
-        user=request.user
-    )
+    preferences = NotificationPreference.objects.filter(user=request.user).first()
+    if preferences is None:
+        # Defaults until the user saves their preferences for the first time
+        preferences = NotificationPreference(user=request.user)
 
     if request.method == "POST":
         # Update preferences
@@ -281,7 +689,11 @@ def notification_preferences_view(request):
 @require_POST
 @csrf_exempt
 def create_announcement_api(request):
-    """Create announcement for all students (admin only)"""
+    """
+    Broadcast an announcement to all students, or to the students of a
+    ``program`` or ``course`` (admin only). It is stored once and shown
+    to every matching student when they read their notifications.
+    """
 
     if not request.user.is_staff:
         return JsonResponse(
@@ -293,28 +705,43 @@ def create_announcement_api(request):
         title = data.get("title")
         message = data.get("message")
         priority = data.get("priority", "medium")
+        audience = data.get("audience", Broadcast.ALL)
 
         if not title or not message:
             return JsonResponse(
                 {"success": False, "error": "Title and message are required"},
                 status=400,
             )
-
-        # Create announcement for all students
-        from accounts.models import User
-
-        students = User.objects.filter(is_student=True)
-
-        count = bulk_create_announcement(
-            title=title, message=message, users=students, priority=priority
+        if audience not in dict(Broadcast.AUDIENCE_CHOICES):
+            return JsonResponse(
+                {"success": False, "error": "Invalid audience"}, status=400
+            )
+        target = {}
+        if audience != Broadcast.ALL:
+            model = Broadcast._meta.get_field(audience).related_model
+            target[audience] = model.objects.filter(pk=data.get(audience)).first()
+            if target[audience] is None:
+                return JsonResponse(
+                    {"success": False, "error": f"A valid {audience} is required"},
+                    status=400,
+                )
+
+        broadcast = Broadcast.objects.create(
+            title=title,
+            message=message,
+            priority=priority,
+            audience=audience,
+            created_by=request.user,
+            **target,
         )
 
         return JsonResponse(
             {
                 "success": True,
-                "message": f"Announcement sent to {count} students",
-                "count": count,
-            }
+                "message": "Announcement sent",
+                "broadcast_id": broadcast.id,
+            },
+            status=201,
         )
 
     except json.JSONDecodeError:
@@ -325,6 +752,32 @@ def create_announcement_api(request):
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
 
+def serialize_announcement_job(job):
+    return {
+        "id": job.id,
+        "status": job.status,
+        "total": job.total,
+        "sent": job.sent,
+        "progress_percentage": job.progress_percentage,
+        "error": job.error,
+        "url": reverse("notifications:announcement_job_api", args=[job.id]),
+    }
+
+
+@login_required
+@require_GET
+def announcement_job_api(request, job_id):
+    """Progress of an announcement job left from the fan-out (admin only)"""
+
+    if not request.user.is_staff:
+        return JsonResponse(
+            {"success": False, "error": "Permission denied"}, status=403
+        )
+
+    job = get_object_or_404(AnnouncementJob, id=job_id)
+    return JsonResponse({"success": True, "job": serialize_announcement_job(job)})
+
+
 @login_required
 def notification_test_view(request):
     """Test notification creation (for demo purposes)"""
@@ -371,6 +824,9 @@ def notification_test_view(request):
     )
     test_notifications.append(achievement_notif)
 
+    # Types the user opted out of are not created
+    test_notifications = [n for n in test_notifications if n is not None]
+
     return JsonResponse(
         {
             "success": True,
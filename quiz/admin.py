@@ -2,7 +2,17 @@ from django import forms
 from django.contrib import admin
 from django.contrib.admin.widgets import FilteredSelectMultiple
 
-from .models import Choice, EssayQuestion, MCQuestion, Progress, Question, Quiz, Sitting
+from .models import (
+    Choice,
+    EssayQuestion,
+    MCQuestion,
+    Progress,
+    QuizScore,
+    Question,
+    Quiz,
+    Sitting,
+    SittingAnswer,
+)
 
 
 class ChoiceInline(admin.TabularInline):
@@ -64,10 +74,27 @@ class MCQuestionAdmin(admin.ModelAdmin):
 
 
 class ProgressAdmin(admin.ModelAdmin):
-    search_fields = (
-        "user",
-        "score",
-    )
+    search_fields = ("user__username",)
+
+
+class QuizScoreAdmin(admin.ModelAdmin):
+    list_display = ("user", "quiz", "score", "possible", "updated_at")
+    list_select_related = ("user", "quiz")
+    search_fields = ("user__username", "quiz__title")
+    raw_id_fields = ("user", "quiz")
+
+
+class SittingAnswerInline(admin.TabularInline):
+    model = SittingAnswer
+    fields = ("position", "question", "answer", "is_correct", "answered_at")
+    readonly_fields = ("question",)
+    extra = 0
+
+
+class SittingAdmin(admin.ModelAdmin):
+    list_display = ("user", "quiz", "current_score", "complete", "start", "end")
+    list_select_related = ("user", "quiz")
+    inlines = [SittingAnswerInline]
 
 
 class EssayQuestionAdmin(admin.ModelAdmin):
@@ -85,5 +112,6 @@ class EssayQuestionAdmin(admin.ModelAdmin):
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(MCQuestion, MCQuestionAdmin)
 admin.site.register(Progress, ProgressAdmin)
+admin.site.register(QuizScore, QuizScoreAdmin)
 admin.site.register(EssayQuestion, EssayQuestionAdmin)
-admin.site.register(Sitting)
+admin.site.register(Sitting, SittingAdmin)
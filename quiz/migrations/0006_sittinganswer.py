@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_remove_choice_choice_en_remove_choice_choice_es_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SittingAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(verbose_name='Position')),
+                ('answer', models.TextField(blank=True, null=True, verbose_name='Answer')),
+                ('is_correct', models.BooleanField(null=True, verbose_name='Correct')),
+                ('answered_at', models.DateTimeField(blank=True, null=True, verbose_name='Answered at')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz.question', verbose_name='Question')),
+                ('sitting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='quiz.sitting', verbose_name='Sitting')),
+            ],
+            options={
+                'verbose_name': 'Sitting answer',
+                'verbose_name_plural': 'Sitting answers',
+                'ordering': ['sitting', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sittinganswer',
+            constraint=models.UniqueConstraint(fields=('sitting', 'question'), name='unique_sitting_question'),
+        ),
+        migrations.AddConstraint(
+            model_name='sittinganswer',
+            constraint=models.UniqueConstraint(fields=('sitting', 'position'), name='unique_sitting_position'),
+        ),
+    ]
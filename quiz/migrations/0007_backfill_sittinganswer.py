@@ -0,0 +1,76 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:04
+
+import json
+
+from django.db import migrations
+
+
+def parse_ids(value):
+    return [int(n) for n in (value or "").split(",") if n.strip().isdigit()]
+
+
+def backfill_answers(apps, schema_editor):
+    Question = apps.get_model("quiz", "Question")
+    Sitting = apps.get_model("quiz", "Sitting")
+    SittingAnswer = apps.get_model("quiz", "SittingAnswer")
+
+    existing = set(Question.objects.values_list("id", flat=True))
+    rows = []
+    for sitting in Sitting.objects.iterator():
+        pending = set(parse_ids(sitting.question_list))
+        incorrect = set(parse_ids(sitting.incorrect_questions))
+        try:
+            answers = json.loads(sitting.user_answers or "{}")
+        except ValueError:
+            answers = {}
+
+        seen = set()
+        for question_id in parse_ids(sitting.question_order):
+            if question_id not in existing or question_id in seen:
+                continue
+            seen.add(question_id)
+            answered = question_id not in pending or str(question_id) in answers
+            answer = answers.get(str(question_id))
+            rows.append(
+                SittingAnswer(
+                    sitting_id=sitting.id,
+                    question_id=question_id,
+                    position=len(seen) - 1,
+                    answer=None if answer is None else str(answer),
+                    is_correct=(question_id not in incorrect) if answered else None,
+                    answered_at=(sitting.end or sitting.start) if answered else None,
+                )
+            )
+        if len(rows) >= 1000:
+            SittingAnswer.objects.bulk_create(rows)
+            rows = []
+    SittingAnswer.objects.bulk_create(rows)
+
+
+def restore_strings(apps, schema_editor):
+    Sitting = apps.get_model("quiz", "Sitting")
+    SittingAnswer = apps.get_model("quiz", "SittingAnswer")
+
+    for sitting in Sitting.objects.iterator():
+        answers = list(SittingAnswer.objects.filter(sitting=sitting).order_by("position"))
+        order = [str(a.question_id) for a in answers]
+        pending = [str(a.question_id) for a in answers if a.answered_at is None]
+        incorrect = [str(a.question_id) for a in answers if a.is_correct is False]
+        sitting.question_order = ",".join(order) + ("," if order else "")
+        sitting.question_list = ",".join(pending) + ("," if pending else "")
+        sitting.incorrect_questions = ",".join(incorrect)
+        sitting.user_answers = json.dumps(
+            {str(a.question_id): a.answer for a in answers if a.answer is not None}
+        )
+        sitting.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0006_sittinganswer"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_answers, restore_strings),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:04
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_backfill_sittinganswer'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='sitting',
+            name='incorrect_questions',
+        ),
+        migrations.RemoveField(
+            model_name='sitting',
+            name='question_list',
+        ),
+        migrations.RemoveField(
+            model_name='sitting',
+            name='question_order',
+        ),
+        migrations.RemoveField(
+            model_name='sitting',
+            name='user_answers',
+        ),
+    ]
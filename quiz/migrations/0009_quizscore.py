@@ -0,0 +1,35 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quiz', '0008_remove_sitting_question_strings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(default=0, verbose_name='Score')),
+                ('possible', models.PositiveIntegerField(default=0, verbose_name='Possible Score')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='quiz.quiz', verbose_name='Quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_scores', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Quiz Score',
+                'verbose_name_plural': 'Quiz Scores',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='quizscore',
+            constraint=models.UniqueConstraint(fields=('user', 'quiz'), name='unique_quiz_score'),
+        ),
+    ]
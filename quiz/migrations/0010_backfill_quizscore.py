@@ -0,0 +1,80 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:12
+
+import re
+
+from django.db import migrations
+
+# Legacy Progress.score format: "<quiz title>,<score>,<possible>," repeated
+ENTRY_RE = re.compile(r"(?P<title>.*?),(?P<score>\d+),(?P<possible>\d+),", re.S)
+
+
+def backfill_scores(apps, schema_editor):
+    Progress = apps.get_model("quiz", "Progress")
+    Quiz = apps.get_model("quiz", "Quiz")
+    QuizScore = apps.get_model("quiz", "QuizScore")
+    Sitting = apps.get_model("quiz", "Sitting")
+
+    quizzes_by_title = {}
+    for quiz_id, title in Quiz.objects.values_list("id", "title"):
+        quizzes_by_title.setdefault(title, []).append(quiz_id)
+
+    rows = []
+    for progress in Progress.objects.exclude(score="").iterator():
+        totals = {}
+        sat = None
+        for match in ENTRY_RE.finditer(progress.score):
+            candidates = quizzes_by_title.get(match.group("title"), [])
+            if len(candidates) > 1:
+                # Titles are not unique; pick the quiz the user actually sat
+                if sat is None:
+                    sat = set(
+                        Sitting.objects.filter(user_id=progress.user_id).values_list(
+                            "quiz_id", flat=True
+                        )
+                    )
+                candidates = [quiz_id for quiz_id in candidates if quiz_id in sat]
+            if len(candidates) != 1:
+                continue
+            score, possible = totals.get(candidates[0], (0, 0))
+            totals[candidates[0]] = (
+                score + int(match.group("score")),
+                possible + int(match.group("possible")),
+            )
+
+        rows.extend(
+            QuizScore(
+                user_id=progress.user_id, quiz_id=quiz_id, score=score, possible=possible
+            )
+            for quiz_id, (score, possible) in totals.items()
+        )
+        if len(rows) >= 1000:
+            QuizScore.objects.bulk_create(rows, ignore_conflicts=True)
+            rows = []
+    QuizScore.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def restore_scores(apps, schema_editor):
+    Progress = apps.get_model("quiz", "Progress")
+    QuizScore = apps.get_model("quiz", "QuizScore")
+
+    scores = {}
+    for user_id, title, score, possible in QuizScore.objects.values_list(
+        "user_id", "quiz__title", "score", "possible"
+    ):
+        scores.setdefault(user_id, []).append(f"{title},{score},{possible},")
+
+    for user_id, entries in scores.items():
+        Progress.objects.update_or_create(
+            user_id=user_id, defaults={"score": "".join(entries)[:1024]}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0009_quizscore"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_scores, restore_scores),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0010_backfill_quizscore"),
+    ]
+
+    operations = [
+        # A default lets the column be re-added when migrating backwards
+        migrations.AlterField(
+            model_name="progress",
+            name="score",
+            field=models.CharField(default="", max_length=1024, verbose_name="Score"),
+        ),
+        migrations.RemoveField(
+            model_name="progress",
+            name="score",
+        ),
+    ]
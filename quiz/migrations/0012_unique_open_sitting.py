@@ -0,0 +1,47 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:16
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def remove_duplicate_open_sittings(apps, schema_editor):
+    """
+    Keep one open sitting per user, quiz and course: the one with the most
+    answered questions, the oldest on a tie (the one user_sitting used).
+    """
+    Sitting = apps.get_model("quiz", "Sitting")
+
+    duplicates = (
+        Sitting.objects.filter(complete=False)
+        .values("user_id", "quiz_id", "course_id")
+        .annotate(open_count=Count("id"))
+        .filter(open_count__gt=1)
+    )
+    for group in duplicates.iterator():
+        sittings = (
+            Sitting.objects.filter(
+                complete=False,
+                user_id=group["user_id"],
+                quiz_id=group["quiz_id"],
+                course_id=group["course_id"],
+            )
+            .annotate(answered=Count("answers", filter=Q(answers__answered_at__isnull=False)))
+            .order_by("-answered", "id")
+        )
+        keep = sittings[0]
+        Sitting.objects.filter(id__in=[s.id for s in sittings if s.id != keep.id]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_remove_progress_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_open_sittings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='sitting',
+            constraint=models.UniqueConstraint(condition=models.Q(('complete', False)), fields=('user', 'quiz', 'course'), name='unique_open_sitting'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_unique_open_sitting'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sitting',
+            index=models.Index(fields=['complete', 'end'], name='quiz_sitting_complete_end'),
+        ),
+    ]
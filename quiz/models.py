@@ -1,14 +1,12 @@
-import json
-import re
+import random
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ImproperlyConfigured, ValidationError
-from django.core.validators import (
-    MaxValueValidator,
-    validate_comma_separated_integer_list,
-)
-from django.db import models
+from django.core.validators import MaxValueValidator
+from django.db import IntegrityError, connection, models, transaction
 from django.db.models import Q
+from django.db.models.functions import Cast, Coalesce, Least, Round
 from django.db.models.signals import pre_save
 from django.urls import reverse
 from django.utils.timezone import now
@@ -154,7 +152,7 @@ pre_save.connect(quiz_pre_save_receiver, sender=Quiz)
 
 class ProgressManager(models.Manager):
     def new_progress(self, user):
-        new_progress = self.create(user=user, score="")
+        new_progress = self.create(user=user)
         new_progress.save()
         return new_progress
 
@@ -163,11 +161,6 @@ class Progress(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, verbose_name=_("User"), on_delete=models.CASCADE
     )
-    score = models.CharField(
-        max_length=1024,
-        verbose_name=_("Score"),
-        validators=[validate_comma_separated_integer_list],
-    )
 
     objects = ProgressManager()
 
@@ -177,113 +170,217 @@ class Progress(models.Model):
 
     # @property
     def list_all_cat_scores(self):
-        score_before = self.score
-        output = {}
-
-        if len(self.score) > len(score_before):
-            # If a new category has been added, save changes.
-            self.save()
+        return QuizScore.objects.scores_for(self.user)
 
-        return output
+    def update_score(self, quiz, score_to_add=0, possible_to_add=0):
+        QuizScore.objects.add(self.user_id, quiz, score_to_add, possible_to_add)
 
-    def update_score(self, question, score_to_add=0, possible_to_add=0):
-        # category_test = Category.objects.filter(category=question.category).exists()
-
-        if any(
-            [
-                item is False
-                for item in [
-                    score_to_add,
-                    possible_to_add,
-                    isinstance(score_to_add, int),
-                    isinstance(possible_to_add, int),
-                ]
-            ]
-        ):
-            return _("error"), _("category does not exist or invalid score")
+    def show_exams(self):
+        if self.user.is_superuser:
+            return Sitting.objects.filter(complete=True).order_by("-end")
+        else:
+            return Sitting.objects.filter(user=self.user, complete=True).order_by(
+                "-end"
+            )
 
-        to_find = re.escape(str(question.quiz)) + r",(?P<score>\d+),(?P<possible>\d+),"
 
-        match = re.search(to_find, self.score, re.IGNORECASE)
+class QuizScoreManager(models.Manager):
+    def add(self, user_id, quiz, score_to_add=0, possible_to_add=0):
+        """Add points to a user's running totals for a quiz"""
+        quiz_id = getattr(quiz, "pk", quiz)
+        increments = {
+            "score": models.F("score") + abs(score_to_add),
+            "possible": models.F("possible") + abs(possible_to_add),
+        }
+        if self.filter(user_id=user_id, quiz_id=quiz_id).update(**increments):
+            return
 
-        if match:
-            updated_score = int(match.group("score")) + abs(score_to_add)
-            updated_possible = int(match.group("possible")) + abs(possible_to_add)
+        try:
+            with transaction.atomic():
+                self.create(
+                    user_id=user_id,
+                    quiz_id=quiz_id,
+                    score=abs(score_to_add),
+                    possible=abs(possible_to_add),
+                )
+        except IntegrityError:
+            # Created by a concurrent answer in the meantime
+            self.filter(user_id=user_id, quiz_id=quiz_id).update(**increments)
+
+    def scores_for(self, user):
+        """
+        Quiz title mapped to [correct, incorrect, percent] for every quiz the
+        user has answered questions of.
+        """
+        return {
+            title: [score, possible - score, int(round(score / possible * 100))]
+            for title, score, possible in self.filter(user=user, possible__gt=0)
+            .order_by("quiz__title")
+            .values_list("quiz__title", "score", "possible")
+        }
+
+
+class QuizScore(models.Model):
+    """Running totals of a user's answers to the questions of one quiz"""
 
-            new_score = ",".join(
-                [str(question.quiz), str(updated_score), str(updated_possible), ""]
-            )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name=_("User"),
+        related_name="quiz_scores",
+        on_delete=models.CASCADE,
+    )
+    quiz = models.ForeignKey(
+        Quiz, verbose_name=_("Quiz"), related_name="scores", on_delete=models.CASCADE
+    )
+    score = models.PositiveIntegerField(default=0, verbose_name=_("Score"))
+    possible = models.PositiveIntegerField(default=0, verbose_name=_("Possible Score"))
+    updated_at = models.DateTimeField(auto_now=True)
 
-            # swap old score for the new one
-            self.score = self.score.replace(match.group(), new_score)
-            self.save()
+    objects = QuizScoreManager()
 
-        else:
-            #  if not present but existing, add with the points passed in
-            self.score += ",".join(
-                [str(question.quiz), str(score_to_add), str(possible_to_add), ""]
+    class Meta:
+        verbose_name = _("Quiz Score")
+        verbose_name_plural = _("Quiz Scores")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "quiz"], name="unique_quiz_score"
             )
-            self.save()
+        ]
 
-    def show_exams(self):
-        if self.user.is_superuser:
-            return Sitting.objects.filter(complete=True).order_by("-end")
-        else:
-            return Sitting.objects.filter(user=self.user, complete=True).order_by(
-                "-end"
-            )
+    def __str__(self):
+        return f"{self.user} - {self.quiz}: {self.score}/{self.possible}"
 
 
 class SittingManager(models.Manager):
-    def new_sitting(self, user, quiz, course):
-        if quiz.random_order is True:
-            question_set = quiz.question_set.all().select_subclasses().order_by("?")
-        else:
-            question_set = quiz.question_set.all().select_subclasses()
-
-        question_set = [item.id for item in question_set]
+    def question_order(self, quiz):
+        """Question ids for a new sitting, shuffled for random order quizzes"""
+        from .snapshot import get_snapshot
 
-        if len(question_set) == 0:
+        question_ids = list(get_snapshot(quiz.id))
+        if len(question_ids) == 0:
             raise ImproperlyConfigured(
                 _(
                     "Question set of the quiz is empty. Please configure questions properly"
                 )
             )
 
-        # if quiz.max_questions and quiz.max_questions < len(question_set):
-        #     question_set = question_set[:quiz.max_questions]
-
-        questions = ",".join(map(str, question_set)) + ","
-
-        new_sitting = self.create(
-            user=user,
-            quiz=quiz,
-            course=course,
-            question_order=questions,
-            question_list=questions,
-            incorrect_questions="",
-            current_score=0,
-            complete=False,
-            user_answers="{}",
+        if quiz.random_order is True:
+            random.shuffle(question_ids)
+
+        # if quiz.max_questions and quiz.max_questions < len(question_ids):
+        #     question_ids = question_ids[:quiz.max_questions]
+        return question_ids
+
+    def _add_questions(self, sitting, question_ids):
+        SittingAnswer.objects.bulk_create(
+            [
+                SittingAnswer(sitting=sitting, question_id=question_id, position=i)
+                for i, question_id in enumerate(question_ids)
+            ]
         )
+
+    def new_sitting(self, user, quiz, course):
+        question_ids = self.question_order(quiz)
+        with transaction.atomic():
+            new_sitting = self.create(
+                user=user,
+                quiz=quiz,
+                course=course,
+                current_score=0,
+                complete=False,
+            )
+            self._add_questions(new_sitting, question_ids)
         return new_sitting
 
+    def with_scores(self):
+        """
+        Sittings with their user, quiz and course joined and the question
+        count and percent score computed by the database.
+        """
+        question_count = (
+            SittingAnswer.objects.filter(sitting=models.OuterRef("pk"))
+            .order_by()
+            .values("sitting")
+            .annotate(total=models.Count("pk"))
+            .values("total")
+        )
+        return (
+            self.select_related("user", "quiz__course")
+            .annotate(
+                question_count=Coalesce(
+                    models.Subquery(question_count), 0, output_field=models.IntegerField()
+                ),
+                username=models.F("user__username"),
+                quiz_title=models.F("quiz__title"),
+            )
+            .annotate(
+                score_percent=models.Case(
+                    models.When(question_count=0, then=0),
+                    default=Least(
+                        Cast(
+                            Round(
+                                models.F("current_score")
+                                * 100.0
+                                / models.F("question_count")
+                            ),
+                            models.IntegerField(),
+                        ),
+                        100,
+                    ),
+                    output_field=models.IntegerField(),
+                )
+            )
+        )
+
     def user_sitting(self, user, quiz, course):
         if (
             quiz.single_attempt is True
             and self.filter(user=user, quiz=quiz, course=course, complete=True).exists()
         ):
             return False
-        try:
-            sitting = self.get(user=user, quiz=quiz, course=course, complete=False)
-        except Sitting.DoesNotExist:
-            sitting = self.new_sitting(user, quiz, course)
-        except Sitting.MultipleObjectsReturned:
-            sitting = self.filter(user=user, quiz=quiz, course=course, complete=False)[
-                0
-            ]
+        sitting = self._open_sitting(user, quiz, course)
+        if sitting is not None:
+            return sitting
+
+        question_ids = self.question_order(quiz)
+        with transaction.atomic():
+            if course is None or not connection.features.supports_partial_indexes:
+                # unique_open_sitting does not hold here (NULL course, or
+                # MySQL ignoring partial constraints): queue racing
+                # requests on the user row instead.
+                get_user_model().objects.select_for_update().filter(
+                    pk=user.pk
+                ).exists()
+                sitting = self._open_sitting(user, quiz, course)
+                if sitting is not None:
+                    return sitting
+            # Otherwise racing requests meet at unique_open_sitting; the
+            # losers get the winner's row once its transaction, questions
+            # included, has committed.
+            try:
+                with transaction.atomic():
+                    sitting = self.create(
+                        user=user,
+                        quiz=quiz,
+                        course=course,
+                        complete=False,
+                        current_score=0,
+                    )
+                    self._add_questions(sitting, question_ids)
+            except IntegrityError:
+                sitting = self._open_sitting(user, quiz, course)
+                if sitting is None:
+                    raise
         return sitting
 
+    def _open_sitting(self, user, quiz, course):
+        # Oldest first, should duplicates exist from before the constraint
+        return (
+            self.filter(user=user, quiz=quiz, course=course, complete=False)
+            .order_by("pk")
+            .first()
+        )
+
 
 class Sitting(models.Model):
     user = models.ForeignKey(
@@ -294,32 +391,10 @@ class Sitting(models.Model):
         Course, null=True, verbose_name=_("Course"), on_delete=models.CASCADE
     )
 
-    question_order = models.CharField(
-        max_length=1024,
-        verbose_name=_("Question Order"),
-        validators=[validate_comma_separated_integer_list],
-    )
-
-    question_list = models.CharField(
-        max_length=1024,
-        verbose_name=_("Question List"),
-        validators=[validate_comma_separated_integer_list],
-    )
-
-    incorrect_questions = models.CharField(
-        max_length=1024,
-        blank=True,
-        verbose_name=_("Incorrect questions"),
-        validators=[validate_comma_separated_integer_list],
-    )
-
     current_score = models.IntegerField(verbose_name=_("Current Score"))
     complete = models.BooleanField(
         default=False, blank=False, verbose_name=_("Complete")
     )
-    user_answers = models.TextField(
-        blank=True, default="{}", verbose_name=_("User Answers")
-    )
     start = models.DateTimeField(auto_now_add=True, verbose_name=_("Start"))
     end = models.DateTimeField(null=True, blank=True, verbose_name=_("End"))
 
@@ -327,22 +402,59 @@ class Sitting(models.Model):
 
     class Meta:
         permissions = (("view_sittings", _("Can see completed exams.")),)
+        indexes = [
+            models.Index(fields=["complete", "end"], name="quiz_sitting_complete_end"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "quiz", "course"],
+                condition=Q(complete=False),
+                name="unique_open_sitting",
+            )
+        ]
+
+    def _answer_rows(self):
+        """Answer rows of this sitting in question order, loaded once"""
+        rows = getattr(self, "_answer_rows_cache", None)
+        if rows is None:
+            rows = self._answer_rows_cache = list(self.answers.order_by("position"))
+        return rows
+
+    def _update_answer(self, question, **fields):
+        self.answers.filter(question=question).update(**fields)
+        self._answer_rows_cache = None
+
+    def _pending_rows(self):
+        return [row for row in self._answer_rows() if row.answered_at is None]
 
     def get_first_question(self):
-        if not self.question_list:
+        pending = self._pending_rows()
+        if not pending:
             return False
-
-        first, _ = self.question_list.split(",", 1)
-        question_id = int(first)
-        return Question.objects.get_subclass(id=question_id)
+        question_id = pending[0].question_id
+        cached = getattr(self, "_first_question_cache", None)
+        if cached is None or cached.id != question_id:
+            cached = self.get_quiz_snapshot().get(question_id)
+            if cached is None:
+                # No longer part of the quiz
+                cached = Question.objects.get_subclass(id=question_id)
+            self._first_question_cache = cached
+        return cached
+
+    def get_quiz_snapshot(self):
+        """Cached questions of the quiz, see quiz.snapshot"""
+        from . import snapshot
+
+        if getattr(self, "_snapshot_cache", None) is None:
+            self._snapshot_cache = snapshot.get_snapshot(self.quiz_id)
+        return self._snapshot_cache
 
     def remove_first_question(self):
-        if not self.question_list:
+        """Skip the next unanswered question"""
+        pending = self._pending_rows()
+        if not pending:
             return
-
-        _, others = self.question_list.split(",", 1)
-        self.question_list = others
-        self.save()
+        self._update_answer(pending[0].question_id, answered_at=now())
 
     def add_to_score(self, points):
         self.current_score += int(points)
@@ -353,7 +465,7 @@ class Sitting(models.Model):
         return self.current_score
 
     def _question_ids(self):
-        return [int(n) for n in self.question_order.split(",") if n]
+        return [row.question_id for row in self._answer_rows()]
 
     @property
     def get_percent_correct(self):
@@ -378,23 +490,17 @@ class Sitting(models.Model):
         self.save()
 
     def add_incorrect_question(self, question):
-        if len(self.incorrect_questions) > 0:
-            self.incorrect_questions += ","
-        self.incorrect_questions += str(question.id) + ","
+        self._update_answer(question, is_correct=False)
         if self.complete:
             self.add_to_score(-1)
-        self.save()
 
     @property
     def get_incorrect_questions(self):
-        return [int(q) for q in self.incorrect_questions.split(",") if q]
+        return [row.question_id for row in self._answer_rows() if row.is_correct is False]
 
     def remove_incorrect_question(self, question):
-        current = self.get_incorrect_questions
-        current.remove(question.id)
-        self.incorrect_questions = ",".join(map(str, current))
+        self._update_answer(question, is_correct=True)
         self.add_to_score(1)
-        self.save()
 
     @property
     def check_if_passed(self):
@@ -407,23 +513,72 @@ class Sitting(models.Model):
         else:
             return _("You failed this quiz, give it one chance again.")
 
-    def add_user_answer(self, question, guess):
-        current = json.loads(self.user_answers)
-        current[question.id] = guess
-        self.user_answers = json.dumps(current)
-        self.save()
+    def submit_answer(self, question, guess, is_correct):
+        """
+        Record the answer to the current question together with the score
+        change and, for the last question, completion of the sitting. The
+        answer row and the sitting row are each written with one UPDATE.
+
+        Returns False, writing nothing else, when the question was answered
+        already, e.g. by a concurrent submission of the same form.
+        """
+        answered_at = now()
+        pending = self._pending_rows()
+        finishes = [row.question_id for row in pending] == [question.id]
+
+        sitting_fields = {}
+        if is_correct:
+            sitting_fields["current_score"] = models.F("current_score") + 1
+        if finishes:
+            sitting_fields.update(complete=True, end=answered_at)
+
+        with transaction.atomic(savepoint=False):
+            answered = self.answers.filter(
+                question=question, answered_at__isnull=True
+            ).update(answer=str(guess), is_correct=is_correct, answered_at=answered_at)
+            if not answered:
+                # Reload the rows the other submission wrote
+                self._answer_rows_cache = None
+                return False
+            if sitting_fields:
+                Sitting.objects.filter(pk=self.pk).update(**sitting_fields)
+
+        # Mirror the written state so the rest of the request needs no reload
+        for row in pending:
+            if row.question_id == question.id:
+                row.answer, row.is_correct = str(guess), is_correct
+                row.answered_at = answered_at
+        if is_correct:
+            self.current_score += 1
+        if finishes:
+            self.complete, self.end = True, answered_at
+        return True
+
+    def add_user_answer(self, question, guess, is_correct=None):
+        """Record the answer to ``question``, which is then no longer pending"""
+        fields = {"answer": str(guess), "answered_at": now()}
+        if is_correct is not None:
+            fields["is_correct"] = is_correct
+        self._update_answer(question, **fields)
 
     def get_questions(self, with_answers=False):
-        question_ids = self._question_ids()
-        questions = sorted(
-            self.quiz.question_set.filter(id__in=question_ids).select_subclasses(),
-            key=lambda q: question_ids.index(q.id),
-        )
+        rows = self._answer_rows()
+        questions = self.get_quiz_snapshot()
+        missing = [row.question_id for row in rows if row.question_id not in questions]
+        if missing:
+            # Removed from the quiz after the sitting started
+            from .snapshot import load_questions
+
+            questions = {**questions, **load_questions(question_ids=missing)}
+        questions = [
+            questions[row.question_id] for row in rows if row.question_id in questions
+        ]
 
         if with_answers:
-            user_answers = json.loads(self.user_answers)
+            answers = {row.question_id: row for row in rows}
             for question in questions:
-                question.user_answer = user_answers[str(question.id)]
+                question.user_answer = answers[question.id].answer
+                question.user_was_incorrect = answers[question.id].is_correct is False
 
         return questions
 
@@ -436,11 +591,47 @@ class Sitting(models.Model):
         return len(self._question_ids())
 
     def progress(self):
-        answered = len(json.loads(self.user_answers))
         total = self.get_max_score
+        answered = total - len(self._pending_rows())
         return answered, total
 
 
+class SittingAnswer(models.Model):
+    """One question of a sitting, in the order it is asked, and its answer"""
+
+    sitting = models.ForeignKey(
+        Sitting,
+        related_name="answers",
+        verbose_name=_("Sitting"),
+        on_delete=models.CASCADE,
+    )
+    question = models.ForeignKey(
+        "Question", verbose_name=_("Question"), on_delete=models.CASCADE
+    )
+    position = models.PositiveIntegerField(verbose_name=_("Position"))
+    answer = models.TextField(null=True, blank=True, verbose_name=_("Answer"))
+    is_correct = models.BooleanField(null=True, verbose_name=_("Correct"))
+    answered_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Answered at")
+    )
+
+    class Meta:
+        ordering = ["sitting", "position"]
+        verbose_name = _("Sitting answer")
+        verbose_name_plural = _("Sitting answers")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sitting", "question"], name="unique_sitting_question"
+            ),
+            models.UniqueConstraint(
+                fields=["sitting", "position"], name="unique_sitting_position"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sitting_id} #{self.position}: {self.answer}"
+
+
 class Question(models.Model):
     quiz = models.ManyToManyField(Quiz, verbose_name=_("Quiz"), blank=True)
     figure = models.ImageField(
@@ -485,13 +676,31 @@ class MCQuestion(Question):
         verbose_name=_("Choice Order"),
     )
 
+    def _choice_rows(self):
+        """Choices of the question in display order, loaded once"""
+        choices = getattr(self, "_choices_cache", None)
+        if choices is None:
+            choices = self._choices_cache = list(
+                self.order_choices(Choice.objects.filter(question=self))
+            )
+        return choices
+
+    def _find_choice(self, guess):
+        for choice in self._choice_rows():
+            if str(choice.id) == str(guess):
+                return choice
+        return None
+
     def check_if_correct(self, guess):
-        answer = Choice.objects.get(id=guess)
+        from .snapshot import grades_from_snapshot
 
-        if answer.correct is True:
-            return True
-        else:
+        answer = self._find_choice(guess)
+        if answer is None:
             return False
+        if getattr(self, "_from_snapshot", False) and not grades_from_snapshot():
+            # A snapshot in a per-process cache may hold an old answer key
+            return Choice.objects.filter(pk=answer.pk, correct=True).exists()
+        return answer.correct
 
     def order_choices(self, queryset):
         if self.choice_order == "content":
@@ -503,16 +712,14 @@ class MCQuestion(Question):
         return queryset
 
     def get_choices(self):
-        return self.order_choices(Choice.objects.filter(question=self))
+        return self._choice_rows()
 
     def get_choices_list(self):
-        return [
-            (choice.id, choice.choice)
-            for choice in self.order_choices(Choice.objects.filter(question=self))
-        ]
+        return [(choice.id, choice.choice) for choice in self._choice_rows()]
 
     def answer_choice_to_string(self, guess):
-        return Choice.objects.get(id=guess).choice
+        answer = self._find_choice(guess)
+        return answer.choice if answer is not None else ""
 
     class Meta:
         verbose_name = _("Multiple Choice Question")
@@ -553,6 +760,9 @@ class EssayQuestion(Question):
     def get_answers(self):
         return False
 
+    def get_choices(self):
+        return []
+
     def get_answers_list(self):
         return False
 
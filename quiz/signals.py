@@ -0,0 +1,49 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import snapshot
+from .models import Choice, EssayQuestion, MCQuestion, Question, Quiz
+
+
+def _question_quiz_ids(question_id):
+    return Question.quiz.through.objects.filter(question_id=question_id).values_list(
+        "quiz_id", flat=True
+    )
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_snapshot_on_quiz_change(sender, instance, **kwargs):
+    snapshot.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=MCQuestion)
+@receiver(post_save, sender=EssayQuestion)
+@receiver(pre_delete, sender=Question)
+@receiver(pre_delete, sender=MCQuestion)
+@receiver(pre_delete, sender=EssayQuestion)
+def invalidate_snapshot_on_question_change(sender, instance, **kwargs):
+    # Before deletion, while the question is still linked to its quizzes
+    snapshot.invalidate(_question_quiz_ids(instance.pk))
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_snapshot_on_choice_change(sender, instance, **kwargs):
+    snapshot.invalidate(_question_quiz_ids(instance.question_id))
+
+
+@receiver(m2m_changed, sender=Question.quiz.through)
+def invalidate_snapshot_on_quiz_questions_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # quiz.question_set changed
+        snapshot.invalidate([instance.pk])
+    elif action == "pre_clear":
+        snapshot.invalidate(_question_quiz_ids(instance.pk))
+    else:
+        snapshot.invalidate(pk_set)
@@ -0,0 +1,94 @@
+"""
+Cached snapshots of quiz content.
+
+Questions and their choices hardly ever change while students take a
+quiz, yet every step used to load the question through the inheritance
+joins and query its choices again for the form, the check and the
+feedback. A snapshot holds every question of a quiz as its concrete
+subclass, with the choices already attached, and is cached per quiz
+revision. Saving a quiz, question or choice bumps the revision, see
+``quiz.signals``.
+
+Answers are graded from the snapshot only when the cache is shared by
+every worker (see ``grades_from_snapshot``): a saved choice then bumps the
+revision for all of them. With the per-process locmem cache the other
+workers would keep the old answer key until their snapshot expires, so
+the ``correct`` flag is read from the database instead. Changes that
+bypass the model signals, such as ``QuerySet.update``, need
+``invalidate`` to be called.
+"""
+
+import random
+
+from django.conf import settings
+
+from core.cache import is_shared, quiz_cache
+
+
+def get_snapshot_timeout():
+    return getattr(settings, "QUIZ_SNAPSHOT_TIMEOUT", 3600)
+
+
+def _version_group(quiz_id):
+    return f"quiz:{quiz_id}"
+
+
+def load_questions(question_ids=None, quiz_id=None):
+    """
+    Questions by id, as their concrete subclass and with choices attached,
+    in two queries. Loads either the given questions or those of a quiz.
+    """
+    from .models import Choice, MCQuestion, Question, Quiz
+
+    if quiz_id is not None:
+        # In the quiz's own question_set order
+        queryset = Quiz(pk=quiz_id).question_set.all()
+    else:
+        queryset = Question.objects.order_by("id")
+    if question_ids is not None:
+        queryset = queryset.filter(id__in=question_ids)
+    questions = {question.id: question for question in queryset.select_subclasses()}
+
+    choices = {}
+    for choice in Choice.objects.filter(question_id__in=questions).order_by("id"):
+        choices.setdefault(choice.question_id, []).append(choice)
+
+    for question in questions.values():
+        if isinstance(question, MCQuestion):
+            rows = choices.get(question.id, [])
+            if question.choice_order == "content":
+                rows.sort(key=lambda choice: choice.choice)
+            question._choices_cache = rows
+    return questions
+
+
+def grades_from_snapshot():
+    """Whether a snapshot's answer key is current in every worker"""
+    return is_shared()
+
+
+def build_snapshot(quiz_id):
+    """Questions of a quiz in quiz order, keyed by id, with choices loaded"""
+    questions = load_questions(quiz_id=quiz_id)
+    for question in questions.values():
+        question._from_snapshot = True
+    return questions
+
+
+def get_snapshot(quiz_id):
+    """The cached snapshot of a quiz, built on the first request"""
+    key = quiz_cache.versioned_key(_version_group(quiz_id), "snapshot")
+    questions = quiz_cache.get_or_set(
+        key, lambda: build_snapshot(quiz_id), get_snapshot_timeout()
+    )
+
+    # The order of random choices is not part of the snapshot
+    for question in questions.values():
+        if getattr(question, "choice_order", None) == "random":
+            random.shuffle(question._choices_cache)
+    return questions
+
+
+def invalidate(quiz_ids):
+    for quiz_id in set(quiz_ids):
+        quiz_cache.bump_version(_version_group(quiz_id))
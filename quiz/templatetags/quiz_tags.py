@@ -10,11 +10,10 @@ def correct_answer_for_all(context, question):
     if the answer is incorrect, informs the user
     """
     answers = question.get_choices()
-    incorrect_list = context.get("incorrect_questions", [])
-    if question.id in incorrect_list:
-        user_was_incorrect = True
-    else:
-        user_was_incorrect = False
+    # Set on questions loaded by Sitting.get_questions(with_answers=True)
+    user_was_incorrect = getattr(question, "user_was_incorrect", None)
+    if user_was_incorrect is None:
+        user_was_incorrect = question.id in context.get("incorrect_questions", [])
 
     return {"previous": {"answers": answers}, "user_was_incorrect": user_was_incorrect}
 
@@ -1,2 +1,566 @@
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from course.models import Course, CourseAllocation, Program
+
+from . import snapshot
+from .models import Choice, MCQuestion, Quiz, QuizScore, Sitting, SittingAnswer
+from .views import QuizMarkingList
+
+User = get_user_model()
+
+
+class QuizTestMixin:
+    question_count = 3
+
+    def setUp(self):
+        self.student = User.objects.create_user(
+            username="student",
+            email="student@example.com",
+            password="password",
+            is_student=True,
+        )
+        program = Program.objects.create(title="AI Bootcamp")
+        self.course = Course.objects.create(title="ML", code="ML101", program=program)
+        self.quiz = Quiz.objects.create(
+            title="Basics",
+            course=self.course,
+            category="exam",
+            answers_at_end=True,
+            exam_paper=True,
+        )
+        self.questions = []
+        self.correct_choices = {}
+        for i in range(self.question_count):
+            question = MCQuestion.objects.create(content=f"Question {i}")
+            question.quiz.add(self.quiz)
+            self.correct_choices[question.id] = Choice.objects.create(
+                question=question, choice="Right", correct=True
+            )
+            Choice.objects.create(question=question, choice="Wrong", correct=False)
+            self.questions.append(question)
+
+    def take_url(self):
+        return reverse("quiz_take", kwargs={"pk": self.course.pk, "slug": self.quiz.slug})
+
+    def answer(self, correct=True):
+        return self.client.post(self.take_url(), {"answers": self.next_choice(correct)})
+
+    def next_choice(self, correct=True):
+        sitting = Sitting.objects.get(user=self.student, quiz=self.quiz, complete=False)
+        question = sitting.get_first_question()
+        return Choice.objects.get(question=question, correct=correct).id
+
+
+class SittingAnswerTests(QuizTestMixin, TestCase):
+    def test_new_sitting_creates_one_row_per_question(self):
+        sitting = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+
+        rows = list(sitting.answers.all())
+        self.assertEqual([row.position for row in rows], [0, 1, 2])
+        self.assertEqual(
+            {row.question_id for row in rows}, {q.id for q in self.questions}
+        )
+        self.assertEqual(sitting.progress(), (0, 3))
+        self.assertEqual(sitting.get_max_score, 3)
+
+    def test_answers_are_recorded_in_order(self):
+        sitting = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        first = sitting.get_first_question()
+        sitting.add_user_answer(first, "7", is_correct=False)
+
+        self.assertNotEqual(sitting.get_first_question(), first)
+        self.assertEqual(sitting.progress(), (1, 3))
+        self.assertEqual(sitting.get_incorrect_questions, [first.id])
+
+        questions = sitting.get_questions(with_answers=True)
+        self.assertEqual([q.id for q in questions], sitting._question_ids())
+        self.assertEqual(questions[0].user_answer, "7")
+        self.assertIsNone(questions[1].user_answer)
+
+    def test_taking_a_quiz(self):
+        self.client.force_login(self.student)
+        self.client.get(self.take_url())
+        self.answer(correct=True)
+        self.answer(correct=False)
+        response = self.answer(correct=True)
+
+        self.assertEqual(response.context["score"], 2)
+        self.assertEqual(response.context["max_score"], 3)
+        sitting = Sitting.objects.get(user=self.student, quiz=self.quiz)
+        self.assertTrue(sitting.complete)
+        self.assertEqual(len(sitting.get_incorrect_questions), 1)
+        self.assertEqual(
+            SittingAnswer.objects.filter(sitting=sitting, is_correct=True).count(), 2
+        )
+
+    def test_marking_toggles_correctness(self):
+        sitting = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        question = self.questions[0]
+        sitting.add_user_answer(question, "1", is_correct=True)
+        sitting.add_to_score(1)
+        sitting.mark_quiz_complete()
+
+        sitting.add_incorrect_question(question)
+        self.assertEqual(sitting.get_incorrect_questions, [question.id])
+        self.assertEqual(sitting.current_score, 0)
+
+        sitting.remove_incorrect_question(question)
+        self.assertEqual(sitting.get_incorrect_questions, [])
+        self.assertEqual(sitting.current_score, 1)
+
+
+class AnswerSubmissionTests(QuizTestMixin, TestCase):
+    def writes(self, correct):
+        choice = self.next_choice(correct)
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(self.take_url(), {"answers": choice})
+        return [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")
+        ]
+
+    def test_one_update_per_row(self):
+        self.client.force_login(self.student)
+        self.client.get(self.take_url())
+        self.answer(correct=True)
+
+        # Incorrect answer: the answer row and the progress row
+        self.assertEqual(len(self.writes(correct=False)), 2)
+        # Last, correct answer: the sitting also gets its score and completion
+        writes = self.writes(correct=True)
+        self.assertEqual(len(writes), 3)
+        self.assertTrue(all(sql.startswith("UPDATE") for sql in writes))
+
+        sitting = Sitting.objects.get(user=self.student, quiz=self.quiz)
+        self.assertTrue(sitting.complete)
+        self.assertIsNotNone(sitting.end)
+        self.assertEqual(sitting.current_score, 2)
+
+    def test_submit_answer_keeps_sitting_in_sync(self):
+        sitting = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        for question in sitting.get_questions():
+            sitting.submit_answer(question, self.correct_choices[question.id].id, True)
+
+        self.assertEqual(sitting.progress(), (3, 3))
+        self.assertTrue(sitting.complete)
+        self.assertFalse(sitting.get_first_question())
+        stored = Sitting.objects.get(pk=sitting.pk)
+        self.assertEqual(stored.current_score, sitting.current_score)
+        self.assertTrue(stored.complete)
+
+    def test_submit_answer_query_count(self):
+        sitting = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        first, second, last = sitting.get_questions()
+        wrong = Choice.objects.get(question=first, correct=False)
+
+        # The answer row alone
+        with self.assertNumQueries(1):
+            sitting.submit_answer(first, wrong.id, False)
+        # Plus the score of the sitting
+        with self.assertNumQueries(2):
+            sitting.submit_answer(second, self.correct_choices[second.id].id, True)
+        # Score and completion in the same sitting UPDATE
+        with self.assertNumQueries(2):
+            sitting.submit_answer(last, self.correct_choices[last.id].id, True)
+        self.assertTrue(sitting.complete)
+
+
+    def test_answer_is_counted_once(self):
+        sitting = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        # A second request that also read the question as pending
+        other = Sitting.objects.get(pk=sitting.pk)
+        question = sitting.get_first_question()
+        other.get_first_question()
+        choice = self.correct_choices[question.id].id
+
+        self.assertTrue(sitting.submit_answer(question, choice, True))
+        with self.assertNumQueries(1):
+            self.assertFalse(other.submit_answer(question, choice, True))
+
+        self.assertEqual(Sitting.objects.get(pk=sitting.pk).current_score, 1)
+        self.assertEqual(other.progress(), (1, 3))
+
+    def test_lost_race_leaves_score_alone(self):
+        self.client.force_login(self.student)
+        self.client.get(self.take_url())
+
+        with mock.patch.object(Sitting, "submit_answer", return_value=False):
+            self.answer(correct=True)
+
+        self.assertFalse(QuizScore.objects.filter(user=self.student).exists())
+
+
+class QuizScoreTests(QuizTestMixin, TestCase):
+    def test_scores_are_kept_per_quiz(self):
+        # Titles that prefix each other used to share a legacy score entry
+        other = Quiz.objects.create(title="Basics 2", course=self.course)
+        QuizScore.objects.add(self.student.id, self.quiz, 1, 1)
+        QuizScore.objects.add(self.student.id, self.quiz, 0, 1)
+        QuizScore.objects.add(self.student.id, other, 1, 1)
+
+        self.assertEqual(
+            QuizScore.objects.scores_for(self.student),
+            {"Basics": [1, 1, 50], "Basics 2": [1, 0, 100]},
+        )
+
+    def test_answering_updates_score(self):
+        self.client.force_login(self.student)
+        self.client.get(self.take_url())
+        self.answer(correct=True)
+        self.answer(correct=False)
+
+        score = QuizScore.objects.get(user=self.student, quiz=self.quiz)
+        self.assertEqual((score.score, score.possible), (1, 2))
+
+    def test_progress_page(self):
+        QuizScore.objects.add(self.student.id, self.quiz, 2, 3)
+        self.client.force_login(self.student)
+        response = self.client.get(reverse("quiz_progress"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cat_scores"], {"Basics": [2, 1, 67]})
+
+
+class QuizSnapshotTests(QuizTestMixin, TestCase):
+    def test_snapshot_holds_questions_with_choices(self):
+        questions = snapshot.get_snapshot(self.quiz.id)
+
+        self.assertEqual(list(questions), [q.id for q in self.questions])
+        question = questions[self.questions[0].id]
+        self.assertIsInstance(question, MCQuestion)
+        with self.assertNumQueries(0):
+            snapshot.get_snapshot(self.quiz.id)
+            self.assertEqual(len(question.get_choices_list()), 2)
+
+    @mock.patch.object(snapshot, "grades_from_snapshot", return_value=True)
+    def test_grading_follows_the_snapshot_revision(self, _shared):
+        question = snapshot.get_snapshot(self.quiz.id)[self.questions[0].id]
+        right = self.correct_choices[question.id]
+        with self.assertNumQueries(0):
+            self.assertTrue(question.check_if_correct(right.id))
+            self.assertFalse(question.check_if_correct("not a choice"))
+
+        # Saving the key bumps the shared revision, so the next snapshot
+        # a worker loads grades with the new key
+        right.correct = False
+        right.save()
+        question = snapshot.get_snapshot(self.quiz.id)[question.id]
+        self.assertFalse(question.check_if_correct(right.id))
+
+    def test_per_process_cache_grades_from_database(self):
+        question = snapshot.get_snapshot(self.quiz.id)[self.questions[0].id]
+        right = self.correct_choices[question.id]
+        # Another worker corrected the key; this one's snapshot is stale
+        Choice.objects.filter(pk=right.pk).update(correct=False)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(question.check_if_correct(right.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(question.check_if_correct("not a choice"))
+
+    @mock.patch.object(snapshot, "grades_from_snapshot", return_value=True)
+    def test_answering_does_not_query_quiz_content(self, _shared):
+        self.client.force_login(self.student)
+        self.client.get(self.take_url())
+        self.answer(correct=True)
+
+        choice = self.next_choice(correct=False)
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(self.take_url(), {"answers": choice})
+        tables = {"quiz_question", "quiz_mcquestion", "quiz_choice"}
+        queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if any(f'FROM "{table}"' in query["sql"] for table in tables)
+        ]
+        self.assertEqual(queries, [])
+
+    def test_content_changes_invalidate_snapshot(self):
+        question = self.questions[0]
+        snapshot.get_snapshot(self.quiz.id)
+
+        choice = self.correct_choices[question.id]
+        choice.choice = "Changed"
+        choice.save()
+        questions = snapshot.get_snapshot(self.quiz.id)
+        self.assertIn("Changed", [c.choice for c in questions[question.id].get_choices()])
+
+        question.quiz.remove(self.quiz)
+        self.assertNotIn(question.id, snapshot.get_snapshot(self.quiz.id))
+
+        added = MCQuestion.objects.create(content="New")
+        self.quiz.question_set.add(added)
+        self.assertIn(added.id, snapshot.get_snapshot(self.quiz.id))
+
+        added.delete()
+        self.assertNotIn(added.id, snapshot.get_snapshot(self.quiz.id))
+
+
+class ResultReviewTests(QuizTestMixin, TestCase):
+    question_count = 20
+
+    def setUp(self):
+        super().setUp()
+        sitting = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        for i, question in enumerate(sitting.get_questions()):
+            choice = self.correct_choices[question.id]
+            sitting.submit_answer(question, choice.id, i % 2 == 0)
+        self.sitting_id = sitting.id
+
+    def review(self):
+        sitting = Sitting.objects.select_related("quiz").get(id=self.sitting_id)
+        questions = sitting.get_questions(with_answers=True)
+        return [
+            (q.answer_choice_to_string(q.user_answer), q.user_was_incorrect)
+            for q in questions
+        ]
+
+    def test_review_needs_constant_queries(self):
+        snapshot.get_snapshot(self.quiz.id)
+        with self.assertNumQueries(2):
+            review = self.review()
+
+        self.assertEqual(len(review), 20)
+        self.assertEqual(review[0], ("Right", False))
+        self.assertEqual(review[1], ("Right", True))
+
+    def test_review_includes_questions_removed_from_quiz(self):
+        self.questions[0].quiz.remove(self.quiz)
+        snapshot.get_snapshot(self.quiz.id)
+        with self.assertNumQueries(4):
+            review = self.review()
+        self.assertEqual(len(review), 20)
+
+
+class SittingAllocationTests(QuizTestMixin, TestCase):
+    question_count = 5
+
+    def test_open_sitting_is_reused(self):
+        first = Sitting.objects.user_sitting(self.student, self.quiz, self.course)
+        second = Sitting.objects.user_sitting(self.student, self.quiz, self.course)
+
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(second.get_max_score, 5)
+
+    def test_only_one_open_sitting(self):
+        Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        with self.assertRaises(IntegrityError):
+            Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+
+    def test_duplicate_open_sittings_resolve_to_the_oldest(self):
+        # The constraint does not cover sittings without a course
+        first = Sitting.objects.new_sitting(self.student, self.quiz, None)
+        Sitting.objects.new_sitting(self.student, self.quiz, None)
+
+        sitting = Sitting.objects.user_sitting(self.student, self.quiz, None)
+        self.assertEqual(sitting.id, first.id)
+
+    def without_partial_indexes(self):
+        # As on MySQL, which ignores the condition of unique_open_sitting
+        return mock.patch.object(
+            type(connection.features), "supports_partial_indexes", False
+        )
+
+    def test_user_row_is_locked_without_partial_indexes(self):
+        with self.without_partial_indexes(), CaptureQueriesContext(
+            connection
+        ) as context:
+            sitting = Sitting.objects.user_sitting(self.student, self.quiz, self.course)
+
+        locks = [
+            query["sql"]
+            for query in context.captured_queries
+            if User._meta.db_table in query["sql"]
+        ]
+        self.assertEqual(len(locks), 1)
+        if connection.features.has_select_for_update:
+            self.assertIn("FOR UPDATE", locks[0])
+        with self.without_partial_indexes():
+            again = Sitting.objects.user_sitting(self.student, self.quiz, self.course)
+        self.assertEqual(again.id, sitting.id)
+        self.assertEqual(SittingAnswer.objects.count(), self.question_count)
+
+    def test_sitting_started_while_waiting_for_the_lock_is_reused(self):
+        started = Sitting.objects.new_sitting(self.student, self.quiz, self.course)
+        # Not there when checked first, created by the request holding the lock
+        with self.without_partial_indexes(), mock.patch.object(
+            Sitting.objects, "_open_sitting", side_effect=[None, started]
+        ):
+            sitting = Sitting.objects.user_sitting(self.student, self.quiz, self.course)
+
+        self.assertEqual(sitting.id, started.id)
+        self.assertEqual(Sitting.objects.count(), 1)
+
+    def test_random_order_is_shuffled_in_python(self):
+        self.quiz.random_order = True
+        self.quiz.save()
+        Sitting.objects.question_order(self.quiz)
+        orders = set()
+        for _ in range(20):
+            with self.assertNumQueries(0):
+                orders.add(tuple(Sitting.objects.question_order(self.quiz)))
+        self.assertGreater(len(orders), 1)
+        self.assertEqual(
+            {frozenset(order) for order in orders},
+            {frozenset(question.id for question in self.questions)},
+        )
+
+
+@unittest.skipIf(
+    connection.vendor == "sqlite", "SQLite does not allow concurrent writers"
+)
+class ConcurrentExamStartTests(QuizTestMixin, TransactionTestCase):
+    """Students starting the same exam at once each get exactly one sitting"""
+
+    starters = 8
+
+    def test_concurrent_starters(self):
+        students = [self.student] + [
+            User.objects.create_user(
+                username=f"student{i}",
+                email=f"student{i}@example.com",
+                password="password",
+                is_student=True,
+            )
+            for i in range(self.starters - 1)
+        ]
+        barrier = threading.Barrier(self.starters * 2)
+        sittings, errors = [], []
+
+        def start(student):
+            try:
+                barrier.wait()
+                sittings.append(
+                    Sitting.objects.user_sitting(student, self.quiz, self.course).id
+                )
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        # Every student opens the exam twice, all at the same moment
+        threads = [
+            threading.Thread(target=start, args=(student,))
+            for student in students * 2
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(sittings)), self.starters)
+        self.assertEqual(Sitting.objects.filter(complete=False).count(), self.starters)
+        self.assertEqual(
+            SittingAnswer.objects.count(), self.starters * self.question_count
+        )
+
+    def test_concurrent_starters_without_partial_indexes(self):
+        # The user row lock alone has to keep the sittings unique
+        with mock.patch.object(
+            type(connection.features), "supports_partial_indexes", False
+        ):
+            self.test_concurrent_starters()
+
+
+class QuizMarkingListTests(QuizTestMixin, TestCase):
+    question_count = 4
+
+    def setUp(self):
+        super().setUp()
+        self.lecturer = User.objects.create_user(
+            username="lecturer",
+            email="lecturer@example.com",
+            password="password",
+            is_lecturer=True,
+        )
+        allocation = CourseAllocation.objects.create(lecturer=self.lecturer)
+        allocation.courses.add(self.course)
+        # Allocated twice, which used to duplicate the sittings in the list
+        CourseAllocation.objects.create(lecturer=self.lecturer).courses.add(self.course)
+
+        self.learners = []
+        for i, score in enumerate([4, 1, 3, 2, 0]):
+            student = User.objects.create_user(
+                username=f"learner{i}",
+                email=f"learner{i}@example.com",
+                password="password",
+                is_student=True,
+            )
+            self.learners.append(student.username)
+            sitting = Sitting.objects.new_sitting(student, self.quiz, self.course)
+            sitting.current_score = score
+            sitting.mark_quiz_complete()
+        self.client.force_login(self.lecturer)
+
+    def get(self, **params):
+        return self.client.get(reverse("quiz_marking"), params)
+
+    def test_scores_are_annotated(self):
+        response = self.get(sort="-score")
+        sittings = response.context["sitting_list"]
+
+        self.assertEqual(response.context["count"], 5)
+        self.assertEqual([s.score_percent for s in sittings], [100, 75, 50, 25, 0])
+        self.assertEqual([s.question_count for s in sittings], [4] * 5)
+
+    def test_query_count_does_not_grow_with_sittings(self):
+        with CaptureQueriesContext(connection) as context:
+            self.get()
+        baseline = len(context.captured_queries)
+
+        for i in range(5):
+            student = User.objects.create_user(
+                username=f"extra{i}",
+                email=f"extra{i}@example.com",
+                password="password",
+                is_student=True,
+            )
+            Sitting.objects.new_sitting(
+                student, self.quiz, self.course
+            ).mark_quiz_complete()
+        with CaptureQueriesContext(connection) as context:
+            self.get()
+        self.assertEqual(len(context.captured_queries), baseline)
+
+    @mock.patch.object(QuizMarkingList, "paginate_by", 2)
+    def test_keyset_pages(self):
+        names, cursor = [], None
+        while True:
+            params = {"sort": "user"}
+            if cursor:
+                params["after"] = cursor
+            response = self.get(**params)
+            self.assertLessEqual(len(response.context["sitting_list"]), 2)
+            names += [s.user.username for s in response.context["sitting_list"]]
+            cursor = response.context["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(names, sorted(self.learners))
+        self.assertContains(response, "First page")
+
+        # And back again from the last page
+        back = []
+        while cursor := response.context["previous_cursor"]:
+            response = self.get(sort="user", before=cursor)
+            back = [s.user.username for s in response.context["sitting_list"]] + back
+        self.assertEqual(back + names[-1:], sorted(self.learners))
+        self.assertNotContains(response, "Previous")
+
+    def test_filters_and_unknown_sort(self):
+        response = self.get(user_filter=self.learners[3], sort="bogus")
+        self.assertEqual(response.context["sort"], "-end")
+        self.assertEqual(
+            [s.user.username for s in response.context["sitting_list"]],
+            [self.learners[3]],
+        )
@@ -13,7 +13,9 @@ from django.views.generic import (
 )
 
 from accounts.decorators import lecturer_required
+from core.merge import merge_querysets
 
+from . import snapshot
 from .forms import (
     EssayForm,
     MCQuestionForm,
@@ -21,7 +23,16 @@ from .forms import (
     QuestionForm,
     QuizAddForm,
 )
-from .models import Course, EssayQuestion, MCQuestion, Progress, Question, Quiz, Sitting
+from .models import (
+    Course,
+    EssayQuestion,
+    MCQuestion,
+    Progress,
+    Question,
+    Quiz,
+    QuizScore,
+    Sitting,
+)
 
 
 @method_decorator([login_required, lecturer_required], name="dispatch")
@@ -175,32 +186,58 @@ class QuizUserProgressView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super(QuizUserProgressView, self).get_context_data(**kwargs)
         progress, _ = Progress.objects.get_or_create(user=self.request.user)
-        context["cat_scores"] = progress.list_all_cat_scores
-        context["exams"] = progress.show_exams()
-        context["exams_counter"] = progress.show_exams().count()
+        context["cat_scores"] = progress.list_all_cat_scores()
+        context["exams"] = progress.show_exams().select_related("quiz")
+        context["exams_counter"] = len(context["exams"])
         return context
 
 
 @method_decorator([login_required, lecturer_required], name="dispatch")
 class QuizMarkingList(QuizMarkerMixin, SittingFilterTitleMixin, ListView):
-    model = Sitting
+    queryset = Sitting.objects.with_scores()
+    template_name = "quiz/sitting_list.html"
+    context_object_name = "sitting_list"
+    paginate_by = 50
+
+    # Sort options of the table, each ending with the primary key so the
+    # keyset cursor is unique
+    sort_fields = {
+        "end": ["end", "pk"],
+        "user": ["username", "pk"],
+        "quiz": ["quiz_title", "pk"],
+        "score": ["score_percent", "pk"],
+    }
+    default_sort = "-end"
+
+    def get_sort(self):
+        sort = self.request.GET.get("sort", self.default_sort)
+        if sort.lstrip("-") not in self.sort_fields:
+            sort = self.default_sort
+        return sort
+
+    def get_paginate_by(self, queryset):
+        # The page is already cut by its cursor in get_queryset
+        return None
+
+    def get_context_data(self, **kwargs):
+        context = super(QuizMarkingList, self).get_context_data(**kwargs)
+        context["count"] = self.page.count
+        context["next_cursor"] = self.page.next_cursor
+        context["previous_cursor"] = self.page.previous_cursor
+        context["sort"] = self.get_sort()
+        return context
 
-    # def get_context_data(self, **kwargs):
-    #     context = super(QuizMarkingList, self).get_context_data(**kwargs)
-    #     context['queryset_counter'] = super(QuizMarkingList, self).get_queryset().filter(complete=True).filter(course__allocated_course__lecturer__pk=self.request.user.id).count()
-    #     context['marking_list'] = super(QuizMarkingList, self).get_queryset().filter(complete=True).filter(course__allocated_course__lecturer__pk=self.request.user.id)
-    #     return context
     def get_queryset(self):
-        if self.request.user.is_superuser:
-            queryset = super(QuizMarkingList, self).get_queryset().filter(complete=True)
-        else:
-            queryset = (
-                super(QuizMarkingList, self)
-                .get_queryset()
-                .filter(
-                    quiz__course__allocated_course__lecturer__pk=self.request.user.id
+        queryset = (
+            super(QuizMarkingList, self)
+            .get_queryset()
+            .filter(complete=True, end__isnull=False)
+        )
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(
+                quiz__course__in=Course.objects.filter(
+                    allocated_course__lecturer__pk=self.request.user.id
                 )
-                .filter(complete=True)
             )
 
         # search by user
@@ -208,7 +245,16 @@ class QuizMarkingList(QuizMarkerMixin, SittingFilterTitleMixin, ListView):
         if user_filter:
             queryset = queryset.filter(user__username__icontains=user_filter)
 
-        return queryset
+        sort = self.get_sort()
+        prefix = "-" if sort.startswith("-") else ""
+        self.page = merge_querysets(
+            [queryset],
+            order_by=[prefix + field for field in self.sort_fields[sort.lstrip("-")]],
+            page_size=self.paginate_by,
+            cursor=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+        )
+        return self.page.items
 
 
 @method_decorator([login_required, lecturer_required], name="dispatch")
@@ -244,10 +290,10 @@ class QuizTake(FormView):
 
     def dispatch(self, request, *args, **kwargs):
         self.quiz = get_object_or_404(Quiz, slug=self.kwargs["slug"])
-        self.course = get_object_or_404(Course, pk=self.kwargs["pk"])
-        quizQuestions = Question.objects.filter(quiz=self.quiz).count()
-
-        if quizQuestions <= 0:
+        self.course = get_object_or_404(
+            Course.objects.select_related("program"), pk=self.kwargs["pk"]
+        )
+        if not snapshot.get_snapshot(self.quiz.id):
             messages.warning(request, "Question set of the quiz is empty. try later!")
             return redirect("quiz_index", self.course.slug)
 
@@ -297,7 +343,7 @@ class QuizTake(FormView):
         context = super(QuizTake, self).get_context_data(**kwargs)
         context["question"] = self.question
         context["quiz"] = self.quiz
-        context["course"] = get_object_or_404(Course, pk=self.kwargs["pk"])
+        context["course"] = self.course
         if hasattr(self, "previous"):
             context["previous"] = self.previous
         if hasattr(self, "progress"):
@@ -305,18 +351,21 @@ class QuizTake(FormView):
         return context
 
     def form_valid_user(self, form):
-        progress, _ = Progress.objects.get_or_create(user=self.request.user)
         guess = form.cleaned_data["answers"]
         is_correct = self.question.check_if_correct(guess)
 
-        if is_correct is True:
-            self.sitting.add_to_score(1)
-            progress.update_score(self.question, 1, 1)
-        else:
-            self.sitting.add_incorrect_question(self.question)
-            progress.update_score(self.question, 0, 1)
+        # Every write of an answer happens together, one UPDATE per row
+        with transaction.atomic():
+            recorded = self.sitting.submit_answer(
+                self.question, guess, is_correct is True
+            )
+            # A repeated submission of the question counts only once
+            if recorded:
+                QuizScore.objects.add(
+                    self.request.user.id, self.quiz, 1 if is_correct else 0, 1
+                )
 
-        if self.quiz.answers_at_end is not True:
+        if recorded and self.quiz.answers_at_end is not True:
             self.previous = {
                 "previous_answer": guess,
                 "previous_outcome": is_correct,
@@ -327,12 +376,9 @@ class QuizTake(FormView):
         else:
             self.previous = {}
 
-        self.sitting.add_user_answer(self.question, guess)
-        self.sitting.remove_first_question()
-
     def final_result_user(self):
         results = {
-            "course": get_object_or_404(Course, pk=self.kwargs["pk"]),
+            "course": self.course,
             "quiz": self.quiz,
             "score": self.sitting.get_current_score,
             "max_score": self.sitting.get_max_score,
@@ -342,7 +388,8 @@ class QuizTake(FormView):
             # removed duplicate "course" key
         }
 
-        self.sitting.mark_quiz_complete()
+        if not self.sitting.complete:
+            self.sitting.mark_quiz_complete()
 
         if self.quiz.answers_at_end:
             results["questions"] = self.sitting.get_questions(with_answers=True)
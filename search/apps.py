@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class SearchConfig(AppConfig):
     name = "search"
+
+    def ready(self):
+        # Import signal handlers - they are connected via @receiver decorator
+        from . import signals  # noqa: F401
@@ -0,0 +1,202 @@
+"""
+Full-text search over SearchDocument.
+
+Each indexed model contributes a title and a body. Matching and ranking
+run in the database: PostgreSQL uses a weighted tsvector with a GIN
+expression index, SQLite an FTS5 table kept in sync by triggers. Other
+databases have no index and search() returns None so callers can fall
+back to the model managers.
+"""
+
+import re
+from functools import lru_cache
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import SearchDocument
+
+FTS_TABLE = "search_searchdocument_fts"
+
+
+def _pg_vector():
+    # Same expression as the GIN index of migration 0001, so the index is used
+    return SearchVector("title", weight="A", config="english") + SearchVector(
+        "body", weight="B", config="english"
+    )
+
+
+def _news_and_events(obj):
+    return obj.title, [obj.summary, obj.posted_as]
+
+
+def _program(obj):
+    return obj.title, [obj.summary]
+
+
+def _course(obj):
+    return obj.title, [obj.code, obj.summary, obj.slug]
+
+
+def _quiz(obj):
+    return obj.title, [obj.description, obj.category, obj.slug]
+
+
+# Indexed models: label -> (document fields, related objects shown in results)
+INDEXED_MODELS = {
+    "core.NewsAndEvents": (_news_and_events, []),
+    "course.Program": (_program, []),
+    "course.Course": (_course, ["program"]),
+    "quiz.Quiz": (_quiz, ["course"]),
+}
+
+
+def is_indexed(model):
+    return model._meta.label in INDEXED_MODELS
+
+
+def build_document(instance):
+    """Unsaved SearchDocument holding the searchable text of ``instance``"""
+    fields, _ = INDEXED_MODELS[instance._meta.label]
+    title, body = fields(instance)
+    return SearchDocument(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+        title=(title or "")[:255],
+        body="\n".join(str(part) for part in body if part),
+    )
+
+
+def index_object(instance):
+    document = build_document(instance)
+    SearchDocument.objects.update_or_create(
+        content_type=document.content_type,
+        object_id=document.object_id,
+        defaults={"title": document.title, "body": document.body},
+    )
+
+
+def remove_object(instance):
+    SearchDocument.objects.filter(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_id=instance.pk,
+    ).delete()
+
+
+def rebuild_index(batch_size=500):
+    """
+    Recreate every search document. Returns the number indexed. Runs in one
+    transaction, so searches see the old index until the new one is complete.
+    """
+    count = 0
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        for label in INDEXED_MODELS:
+            model = apps.get_model(label)
+            batch = []
+            for instance in model._default_manager.order_by("pk").iterator(
+                chunk_size=batch_size
+            ):
+                batch.append(build_document(instance))
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+            SearchDocument.objects.bulk_create(batch)
+            count += len(batch)
+
+        if get_backend() == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('rebuild')"
+                )
+    return count
+
+
+@lru_cache(maxsize=None)
+def _has_fts_table(alias):
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def get_backend():
+    """'postgres', 'sqlite' or None when the database has no search index"""
+    if connection.vendor == "postgresql":
+        return "postgres"
+    if connection.vendor == "sqlite" and _has_fts_table(connection.alias):
+        return "sqlite"
+    return None
+
+
+def tokenize(query):
+    return re.findall(r"\w+", query.lower())
+
+
+def search(query):
+    """
+    SearchDocuments matching every word of ``query`` (as a prefix), best
+    match first. Returns None when full-text search is unavailable.
+    """
+    backend = get_backend()
+    if backend is None:
+        return None
+
+    tokens = tokenize(query)
+    if not tokens:
+        return SearchDocument.objects.none()
+
+    if backend == "postgres":
+        tsquery = SearchQuery(
+            " & ".join(f"{token}:*" for token in tokens),
+            config="english",
+            search_type="raw",
+        )
+        vector = _pg_vector()
+        return (
+            SearchDocument.objects.alias(document=vector)
+            .filter(document=tsquery)
+            .annotate(rank=SearchRank(vector, tsquery))
+            .order_by("-rank", "-pk")
+        )
+
+    # FTS5: quoted tokens cannot be read as query syntax, bm25 is lower
+    # for better matches and weighs title hits ten times body hits
+    match = " ".join('"{}"*'.format(token.replace('"', "")) for token in tokens)
+    matches = RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+    )
+    rank = RawSQL(
+        f"SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE}"
+        f" WHERE {FTS_TABLE} MATCH %s AND rowid = search_searchdocument.id",
+        [match],
+    )
+    return (
+        SearchDocument.objects.filter(pk__in=matches)
+        .annotate(rank=rank)
+        .order_by("rank", "-pk")
+    )
+
+
+def hydrate(documents):
+    """Indexed objects of ``documents``, in the same order, one query per model"""
+    by_type = {}
+    for document in documents:
+        by_type.setdefault(document.content_type_id, []).append(document.object_id)
+
+    objects = {}
+    for content_type_id, ids in by_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None or not is_indexed(model):
+            continue
+        _, related = INDEXED_MODELS[model._meta.label]
+        queryset = model._default_manager.select_related(*related)
+        for pk, instance in queryset.in_bulk(ids).items():
+            objects[(content_type_id, pk)] = instance
+
+    return [
+        objects[(document.content_type_id, document.object_id)]
+        for document in documents
+        if (document.content_type_id, document.object_id) in objects
+    ]
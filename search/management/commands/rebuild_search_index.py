@@ -0,0 +1,23 @@
+"""
+Django management command to rebuild the full-text search index.
+"""
+
+from django.core.management.base import BaseCommand
+
+from search.index import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search documents of programs, courses, quizzes and news"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of documents written per query (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} documents."))
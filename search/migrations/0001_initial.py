@@ -0,0 +1,118 @@
+# Generated by Django 4.2.16 on 2026-10-18 14:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+PG_INDEX_SQL = (
+    "CREATE INDEX search_searchdocument_fts ON search_searchdocument USING gin "
+    "((setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A')"
+    " || setweight(to_tsvector('english'::regconfig, coalesce(body, '')), 'B')))"
+)
+
+SQLITE_FTS_SQL = [
+    "CREATE VIRTUAL TABLE search_searchdocument_fts USING fts5("
+    "title, body, content='search_searchdocument', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER search_searchdocument_ai AFTER INSERT ON search_searchdocument BEGIN "
+    "INSERT INTO search_searchdocument_fts(rowid, title, body) "
+    "VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER search_searchdocument_ad AFTER DELETE ON search_searchdocument BEGIN "
+    "INSERT INTO search_searchdocument_fts(search_searchdocument_fts, rowid, title, body) "
+    "VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER search_searchdocument_au AFTER UPDATE ON search_searchdocument BEGIN "
+    "INSERT INTO search_searchdocument_fts(search_searchdocument_fts, rowid, title, body) "
+    "VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO search_searchdocument_fts(rowid, title, body) "
+    "VALUES (new.id, new.title, new.body); END",
+]
+
+
+def sqlite_has_fts5(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(content)")
+        cursor.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            cursor.execute(PG_INDEX_SQL)
+        elif vendor == "sqlite" and sqlite_has_fts5(cursor):
+            for statement in SQLITE_FTS_SQL:
+                cursor.execute(statement)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS search_searchdocument_fts")
+        elif vendor == "sqlite":
+            for trigger in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS search_searchdocument_{trigger}")
+            cursor.execute("DROP TABLE IF EXISTS search_searchdocument_fts")
+
+
+def backfill_documents(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    SearchDocument = apps.get_model("search", "SearchDocument")
+
+    sources = [
+        ("core", "NewsAndEvents", lambda o: (o.title, [o.summary, o.posted_as])),
+        ("course", "Program", lambda o: (o.title, [o.summary])),
+        ("course", "Course", lambda o: (o.title, [o.code, o.summary, o.slug])),
+        ("quiz", "Quiz", lambda o: (o.title, [o.description, o.category, o.slug])),
+    ]
+    for app_label, model_name, fields in sources:
+        model = apps.get_model(app_label, model_name)
+        content_type, _ = ContentType.objects.get_or_create(
+            app_label=app_label, model=model_name.lower()
+        )
+        documents = []
+        for instance in model.objects.iterator():
+            title, body = fields(instance)
+            documents.append(
+                SearchDocument(
+                    content_type=content_type,
+                    object_id=instance.pk,
+                    title=(title or "")[:255],
+                    body="\n".join(str(part) for part in body if part),
+                )
+            )
+        SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0004_remove_newsandevents_summary_en_and_more'),
+        ('course', '0006_alter_course_options_alter_program_options_and_more'),
+        ('quiz', '0005_remove_choice_choice_en_remove_choice_choice_es_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchdocument',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_search_document'),
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
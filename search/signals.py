@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .index import index_object, is_indexed, remove_object
+
+
+@receiver(post_save)
+def update_search_document(sender, instance, raw=False, **kwargs):
+    # Fixture loading indexes nothing, run rebuild_search_index afterwards
+    if raw or not is_indexed(sender):
+        return
+    index_object(instance)
+
+
+@receiver(post_delete)
+def delete_search_document(sender, instance, **kwargs):
+    if is_indexed(sender):
+        remove_object(instance)
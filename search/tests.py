@@ -1,2 +1,121 @@
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from core.models import NewsAndEvents
+from course.models import Course, Program
+from quiz.models import Quiz
+
+from . import index
+from .models import SearchDocument
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.program = Program.objects.create(
+            title="AI Bootcamp", summary="Machine learning from scratch"
+        )
+        self.course = Course.objects.create(
+            title="Machine Learning", code="ML101", program=self.program
+        )
+        self.quiz = Quiz.objects.create(
+            title="Regression quiz", description="Linear models", course=self.course
+        )
+        self.news = NewsAndEvents.objects.create(
+            title="Demo day", summary="Projects on deep learning", posted_as="News"
+        )
+
+    def results(self, query):
+        return index.hydrate(list(index.search(query)))
+
+    def test_saves_are_indexed(self):
+        self.assertEqual(SearchDocument.objects.count(), 4)
+        self.assertEqual(self.results("regres"), [self.quiz])
+
+        self.course.code = "DS200"
+        self.course.save()
+        self.assertEqual(self.results("ML101"), [])
+        self.assertEqual(self.results("DS200"), [self.course])
+
+    def test_deletes_are_removed(self):
+        self.news.delete()
+        self.assertEqual(self.results("demo"), [])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.results("machine"), [self.course, self.program])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.results("deep learning"), [self.news])
+        # Query syntax is treated as plain words
+        self.assertEqual(self.results('learning" NOT* demo'), [])
+        self.assertEqual(self.results('(learning" demo'), [self.news])
+
+    def test_rebuild(self):
+        SearchDocument.objects.all().delete()
+        call_command("rebuild_search_index", stdout=open("/dev/null", "w"))
+        self.assertEqual(self.results("ML101"), [self.course])
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        documents = [index.build_document(self.course), RuntimeError]
+        # The first document is inserted before the second one fails
+        with mock.patch.object(
+            index, "build_document", side_effect=documents
+        ), self.assertRaises(RuntimeError):
+            index.rebuild_index(batch_size=1)
+        self.assertEqual(SearchDocument.objects.count(), 4)
+        self.assertEqual(self.results("ML101"), [self.course])
+
+
+class SearchViewTests(TestCase):
+    def setUp(self):
+        program = Program.objects.create(title="AI Bootcamp")
+        for i in range(25):
+            Course.objects.create(
+                title=f"Python part {i}", code=f"PY{i}", program=program
+            )
+
+    def test_results_are_paginated_in_the_database(self):
+        response = self.client.get(reverse("query"), {"q": "python"})
+        self.assertEqual(response.context["count"], 25)
+        self.assertEqual(len(response.context["object_list"]), 20)
+        self.assertTrue(
+            all(isinstance(obj, Course) for obj in response.context["object_list"])
+        )
+
+        response = self.client.get(reverse("query"), {"q": "python", "page": 2})
+        self.assertEqual(len(response.context["object_list"]), 5)
+
+
+@mock.patch("search.index.get_backend", return_value=None)
+class SearchFallbackTests(TestCase):
+    def setUp(self):
+        program = Program.objects.create(title="AI Bootcamp")
+        for i in range(15):
+            Course.objects.create(title=f"Course {i}", code=f"C{i}", program=program)
+            NewsAndEvents.objects.create(title=f"News {i}", posted_as="News")
+
+    def test_results_are_merged_page_by_page(self, get_backend):
+        response = self.client.get(reverse("query"), {"q": "s"})
+        first = response.context["object_list"]
+        self.assertEqual(response.context["count"], 30)
+        self.assertEqual(len(first), 20)
+
+        response = self.client.get(
+            reverse("query"), {"q": "s", "after": response.context["next_cursor"]}
+        )
+        second = response.context["object_list"]
+        self.assertEqual(len(second), 10)
+        self.assertIsNone(response.context["next_cursor"])
+        self.assertFalse(
+            {(type(obj), obj.pk) for obj in first}
+            & {(type(obj), obj.pk) for obj in second}
+        )
+
+        response = self.client.get(
+            reverse("query"),
+            {"q": "s", "before": response.context["previous_cursor"]},
+        )
+        self.assertEqual(list(response.context["object_list"]), list(first))
+        self.assertContains(response, "after=")
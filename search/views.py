@@ -1,40 +1,71 @@
-from itertools import chain
-
 from django.views.generic import ListView
 
+from core.merge import merge_querysets
 from core.models import NewsAndEvents
 from course.models import Course, Program
 from quiz.models import Quiz
 
+from . import index
+
 
 class SearchView(ListView):
     template_name = "search/search_view.html"
     paginate_by = 20
     count = 0
+    indexed = False
+    next_cursor = None
+    previous_cursor = None
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
         context["count"] = self.count or 0
         context["query"] = self.request.GET.get("q")
+        context["next_cursor"] = self.next_cursor
+        context["previous_cursor"] = self.previous_cursor
         return context
 
+    def get_paginate_by(self, queryset):
+        # Merged results are already cut to one page by their cursor
+        if isinstance(queryset, list):
+            return None
+        return super().get_paginate_by(queryset)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super().paginate_queryset(
+            queryset, page_size
+        )
+        if self.indexed:
+            self.count = paginator.count
+            # Only the documents of the current page are turned into objects
+            page.object_list = object_list = index.hydrate(list(object_list))
+        return paginator, page, object_list, is_paginated
+
     def get_queryset(self):
         request = self.request
         query = request.GET.get("q", None)
 
         if query is not None:
-            news_events_results = NewsAndEvents.objects.search(query)
-            program_results = Program.objects.search(query)
-            course_results = Course.objects.search(query)
-            quiz_results = Quiz.objects.search(query)
-
-            # combine querysets
-            queryset_chain = chain(
-                news_events_results, program_results, course_results, quiz_results
-            )
-            queryset = sorted(
-                queryset_chain, key=lambda instance: instance.pk, reverse=True
+            documents = index.search(query)
+            if documents is not None:
+                self.indexed = True
+                return documents
+
+            # No full-text index on this database, merge the newest matches
+            # of each model page by page
+            page = merge_querysets(
+                [
+                    NewsAndEvents.objects.search(query),
+                    Program.objects.search(query),
+                    Course.objects.search(query).select_related("program"),
+                    Quiz.objects.search(query).select_related("course"),
+                ],
+                order_by=["-pk"],
+                page_size=self.paginate_by,
+                cursor=request.GET.get("after"),
+                before=request.GET.get("before"),
             )
-            self.count = len(queryset)  # since queryset is actually a list
-            return queryset
+            self.count = page.count
+            self.next_cursor = page.next_cursor
+            self.previous_cursor = page.previous_cursor
+            return page.items
         return NewsAndEvents.objects.none()  # just an empty queryset as default